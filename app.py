@@ -1,13 +1,270 @@
 import streamlit as st
-import random
+import streamlit.components.v1 as components
+import atexit
+import functools
+import os
+import struct
 import time
-import copy
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from archive import GameArchive, fastest_wins, game_count, open_archive, totals_by_difficulty, totals_by_twists, twist_names
+from engine import (
+    PLAYER_X, PLAYER_O, EMPTY_CELL, BOARD_SIZE, TWIST_NAMES, WIN, BLOCKED, DEFAULT_BOT_TIME_BUDGET_MS,
+    MoveLog, OpeningBook, Rules, TranspositionTable, choose_basic_move, choose_smart_move,
+)
+from gamerecord import (
+    PLACE, UNDO_MARK, SWAP, BLOCK, REMOVE, TIMEOUT, ACTION_NAMES,
+    GameRecord, GameRecordWriter, apply_action, block_rng, read_records,
+)
+from mcts import DRAW, MCTSBot, choose_mcts_move
+from metrics import Metrics, SessionMetrics, timed
+from multiplayer import GAME_EXPIRED_MESSAGE, GameStore
+
+# Selectable board shapes: label -> (rows, columns, marks in a row needed to win)
+BOARD_LAYOUTS = {
+    "3x3 (3 in a row)": (BOARD_SIZE, BOARD_SIZE, BOARD_SIZE),
+    "4x4 (3 in a row)": (4, 4, 3),
+    "5x5 (4 in a row)": (5, 5, 4),
+    "7x6 (4 in a row)": (6, 7, 4), # 7 columns by 6 rows, best played with Gravity
+}
+DEFAULT_BOARD_LAYOUT = "3x3 (3 in a row)"
+MOVE_HISTORY_LIMIT = 256 # Turns kept in each session's move log; older ones are dropped
+BOT_MIN_DISPLAY_DELAY = 0.5 # Seconds the bot's "thinking" state is shown at least; 0 plays moves as soon as they are found
+BOT_POLL_INTERVAL = 0.1 # Seconds between checks for a finished bot move
+BOT_WORKERS = 4 # Bot searches running at once across all sessions
+DEFAULT_TURN_TIME_LIMIT = 10 # Seconds per turn for 'Sudden Death Tic-Tac-Toe'
+TURN_TIME_LIMIT_RANGE = (3, 60) # Selectable seconds per turn
+DEADLINE_CHECK_SLACK = 0.2 # Seconds after a turn's deadline at which the server checks it
+# Packed game between reruns: turn deadline and the lengths of the packed state and game record,
+# followed by the state (Rules.pack_state), the record (GameRecord.to_bytes, if any) and the
+# move log (MoveLog.pack)
+PACKED_GAME_HEADER_FORMAT = "<dHH"
+PACKED_GAME_HEADER_SIZE = struct.calcsize(PACKED_GAME_HEADER_FORMAT)
+
+# Countdown shown under 'Sudden Death': ticks in the browser, so the server is not polled every second
+COUNTDOWN_HTML = """
+<div id="countdown" style="font-family: 'Source Sans Pro', sans-serif; font-weight: 700; font-size: 1rem;"></div>
+<script>
+    const deadline = Date.now() + {remaining_ms}; // Relative to the browser's clock, so clock skew doesn't matter
+    const label = document.getElementById("countdown");
+    function tick() {{
+        const remaining = Math.max(0, Math.ceil((deadline - Date.now()) / 1000));
+        label.textContent = "Time: " + remaining + "s";
+        if (remaining > 0) setTimeout(tick, 250);
+    }}
+    tick();
+</script>
+"""
+
+# Custom CSS for button styling (size, shape, colors), emitted once per full script run
+BOARD_CSS = """
+<style>
+    /* General button styling */
+    .stButton > button {
+        font-size: 2em; /* Slightly smaller font for better mobile fit */
+        width: 100%; /* Occupy full column width */
+        aspect-ratio: 1 / 1; /* Maintain square shape */
+        /* Removed max-width here to let columns dictate width more freely */
+        border-radius: 10px; /* Rounded corners */
+        background-color: #ECEFF1; /* Light gray background */
+        color: #212121; /* Default dark gray text */
+        border: 2px solid #90A4AE; /* Border color */
+        margin: 1px; /* Even smaller margin for tighter grid */
+        padding: 0; /* No internal padding for buttons themselves */
+        box-sizing: border-box; /* Include padding and border in the element's total width and height */
+        display: flex; /* Use flexbox for centering content */
+        justify-content: center; /* Center horizontally */
+        align-items: center; /* Center vertically */
+        cursor: pointer; /* Pointer cursor for clickable cells */
+        transition: background-color 0.2s ease, transform 0.1s ease; /* Smooth hover and click effects */
+        box-shadow: 2px 2px 5px rgba(0,0,0,0.1); /* Subtle shadow for depth */
+    }
+    /* Hover effect for clickable buttons */
+    .stButton > button:hover:not(:disabled) {
+        background-color: #CFD8DC; /* Slightly darker gray on hover */
+        transform: translateY(-2px); /* Slight lift on hover */
+    }
+    /* Active (clicked) state */
+    .stButton > button:active:not(:disabled) {
+        transform: translateY(0); /* Press down effect */
+        box-shadow: 1px 1px 3px rgba(0,0,0,0.2) inset; /* Inset shadow */
+    }
+    /* Style for disabled buttons */
+    .stButton > button:disabled {
+        opacity: 0.6; /* Dim disabled buttons */
+        cursor: not-allowed; /* No-go cursor */
+        background-color: #E0E0E0; /* Slightly darker disabled background */
+        color: #757575; /* Lighter text for disabled */
+    }
+    /* Specific colors for X and O marks */
+    .x-mark { color: #E91E63; } /* Red-ish for X */
+    .o-mark { color: #2196F3; } /* Blue-ish for O */
+
+    /* Style for ability buttons and control buttons */
+    .stButton > button[key*="ability_"], .stButton > button[key*="button_"] {
+        font-size: 1.2em !important; /* Smaller font for control/ability buttons */
+        max-width: none; /* Allow them to take more width */
+        height: auto; /* Auto height based on content */
+        padding: 10px 15px; /* Add padding */
+    }
+
+    /* Streamlit radio button and checkbox alignment */
+    div[data-baseweb="radio"], div[data-baseweb="checkbox"] {
+        display: flex;
+        align-items: center;
+    }
+    div[data-baseweb="radio"] label, div[data-baseweb="checkbox"] label {
+        margin-right: 15px; /* Spacing between options */
+    }
+
+    /* Targeting Streamlit columns to ensure equal distribution and minimal padding */
+    /* This targets the horizontal block that contains the three columns for a row */
+    div[data-testid="stVerticalBlock"] > div[data-testid="stHorizontalBlock"] {
+        display: flex;
+        flex-direction: row; /* Ensure items are in a row */
+        flex-wrap: nowrap; /* Prevent wrapping unless explicitly necessary */
+        justify-content: space-around; /* Distribute space around items */
+        align-items: center; /* Center items vertically */
+        width: 100%; /* Ensure the row takes full width */
+        margin: 0 !important; /* Remove any default margins */
+        padding: 0 !important; /* Remove any default padding */
+    }
+    /* This targets the individual st.column elements within the row */
+    div[data-testid="stColumn"] {
+        flex: 1 1 30%; /* Allow columns to grow/shrink, with a base of ~30% each */
+        max-width: 33.33%; /* Ensure columns don't exceed 1/3 of the row */
+        display: flex; /* Use flexbox for columns themselves */
+        justify-content: center; /* Center content within each column */
+        align-items: center; /* Align items vertically */
+        padding: 0px !important; /* Extremely important: Remove any default padding inside columns */
+        min-width: 0; /* Allow columns to shrink as much as needed */
+    }
+</style>
+"""
+
+OPENING_BOOK_PATH = None # Set to a file path to warm-start the opening book from it and save it as it grows
+ONLINE_POLL_INTERVAL = 1.0 # Seconds between checks of an online game's version for the other player's changes
+GAME_RECORDS_PATH = "game_records.bin" # Every finished game is appended here; None turns recording off
+REPLAY_LIST_LIMIT = 20 # Most recent records offered for replay
+GAME_ARCHIVE_PATH = "games.sqlite3" # Every finished game is also stored in this SQLite archive for statistics; None turns it off
+STATISTICS_CACHE_TTL = 10 # Seconds the statistics shown are reused before the archive is read again
+METRICS_PATH = None # Set to a file path to collect performance metrics from every session and write them there as JSON
+METRICS_FLUSH_INTERVAL = 30 # Seconds between writes of the metrics file
+DEBUG_QUERY_PARAM = "debug" # Opening the app with ?debug=1 shows this session's performance panel in the sidebar
+# Mode radio labels -> game_mode values
+GAME_MODES = {"Play with Friend": "friend", "Play with Computer": "bot", "Play Online": "online"}
+# Difficulty radio labels -> bot_difficulty values
+BOT_DIFFICULTIES = {"Basic Bot": "basic", "Smart Bot": "smart", "MCTS Bot": "mcts"}
+
+@st.cache_resource
+def get_bot_executor():
+    """Process-wide thread pool that runs bot searches off the sessions' script threads."""
+    return ThreadPoolExecutor(max_workers=BOT_WORKERS, thread_name_prefix="bot-move")
+
+@st.cache_resource
+def get_opening_book():
+    """Process-wide Smart Bot opening book, shared by every session."""
+    book = OpeningBook(path=OPENING_BOOK_PATH)
+    if OPENING_BOOK_PATH is not None:
+        book.load()
+    return book
+
+def compute_bot_move(rules, state, difficulty, table, mcts_bot, time_budget_ms, stats=None):
+    """
+    Runs in the bot executor on a private copy of the state. Returns the bot's move as a bit, or 0.
+    If a `stats` dict is given, it is filled in with the search's figures for the performance metrics.
+    """
+    start = time.perf_counter()
+    if difficulty == "basic":
+        bit = choose_basic_move(rules, state)
+        if stats is not None:
+            stats["source"] = "basic"
+    elif difficulty == "mcts":
+        mcts_bot.time_budget_ms = time_budget_ms
+        bit = choose_mcts_move(rules, state, mcts_bot)
+        if stats is not None:
+            stats.update(source="mcts", iterations=mcts_bot.iterations, reused_visits=mcts_bot.reused_visits)
+    else:
+        bit = choose_smart_move(rules, state, table, time_budget_ms, book=get_opening_book(), stats=stats)
+    if stats is not None:
+        stats["seconds"] = time.perf_counter() - start
+    return bit
+
+@st.cache_resource
+def get_metrics():
+    """Process-wide performance metrics written to METRICS_PATH, or None when that is not set."""
+    if METRICS_PATH is None:
+        return None
+    metrics = Metrics(METRICS_PATH, METRICS_FLUSH_INTERVAL)
+    atexit.register(metrics.flush)
+    return metrics
+
+def timed_phase(phase):
+    """
+    Decorator timing each call into the session's and the process-wide metrics. With both off
+    (the default) it costs two session state lookups and a shared no-op context manager.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timed(phase, st.session_state.get("session_metrics"), st.session_state.get("metrics")):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+@st.cache_resource
+def get_game_record_writer():
+    """Process-wide writer of finished games, shared by every session; a partial batch is written at exit."""
+    writer = GameRecordWriter(GAME_RECORDS_PATH)
+    atexit.register(writer.flush)
+    return writer
+
+@st.cache_data(max_entries=4)
+def load_recent_records(source, version=None):
+    """
+    The last REPLAY_LIST_LIMIT records of a records file (a path or the file's bytes) as bytes,
+    newest first. `version` (e.g. the file's size) makes the cache reread a file that has grown.
+    """
+    recent = [record.to_bytes() for record in read_records(source)][-REPLAY_LIST_LIMIT:]
+    return recent[::-1]
+
+@st.cache_resource
+def get_game_archive():
+    """Process-wide archive of finished games, written in the background; games still queued are written at exit."""
+    archive = GameArchive(GAME_ARCHIVE_PATH)
+    atexit.register(archive.close)
+    return archive
+
+@st.cache_data(ttl=STATISTICS_CACHE_TTL)
+def load_game_statistics(path):
+    """Results per twist combination and bot difficulty, and the quickest wins against each bot, from the archive."""
+    connection = open_archive(path)
+    try:
+        return {"games": game_count(connection), "twists": totals_by_twists(connection),
+                "difficulties": totals_by_difficulty(connection),
+                "fastest_wins": {difficulty: fastest_wins(connection, difficulty) for difficulty in BOT_DIFFICULTIES.values()}}
+    finally:
+        connection.close()
+
+@st.cache_resource
+def get_game_store():
+    """Process-wide store of online games, shared by every session."""
+    return GameStore()
+
+@st.fragment(run_every=ONLINE_POLL_INTERVAL)
+def _await_online_change():
+    """Reruns the app once the other player has changed the online game (a version check, no rendering)."""
+    game = get_game_store().get(st.session_state.online_code or "")
+    if game is None or game.version != st.session_state.online_version:
+        st.rerun()
 
-# Constants for game elements
-PLAYER_X = 'X'
-PLAYER_O = 'O'
-EMPTY_CELL = ''
-BOARD_SIZE = 3
+@st.fragment(run_every=BOT_POLL_INTERVAL)
+def _await_bot_move():
+    """Polls the session's bot job without blocking and reruns the app once its move can be shown."""
+    job = st.session_state.bot_job
+    if job is None or (job["future"].done() and time.time() >= job["ready_at"]):
+        st.rerun()
 
 class TwistedTicTacToeStreamlit:
     def __init__(self):
@@ -19,45 +276,103 @@ class TwistedTicTacToeStreamlit:
 
     def _initialize_session_state(self):
         """Initializes all necessary Streamlit session state variables to their default values."""
+        self._cancel_bot_job() # A search still running for the previous state is no longer wanted
+        self._leave_online_game()
+        st.session_state.session_id = uuid.uuid4().hex # Identifies this session's bot jobs
+        st.session_state.game_number = 0 # Incremented for every new game
+        st.session_state.turn_number = 0 # Incremented at the end of every turn
         st.session_state.current_screen = "twist_selection" # Controls which UI screen is displayed
-        st.session_state.board = [[EMPTY_CELL for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)] # The game board
-        st.session_state.current_player = PLAYER_X # 'X' always starts
+        st.session_state.selected_twists = self._get_default_twists() # Dictionary of selected twists
+        st.session_state.board_layout = DEFAULT_BOARD_LAYOUT # Key of BOARD_LAYOUTS
+        # Engine rules for the selected twists and board shape
+        st.session_state.rules = Rules(st.session_state.selected_twists, *BOARD_LAYOUTS[st.session_state.board_layout])
+        # Board, evolve levels, current player ('X' always starts), ability uses, blocked line
+        # and 'Board Shift' bookkeeping all live in the engine's GameState
+        st.session_state.game_state = st.session_state.rules.new_state()
         st.session_state.game_active = False # True when a game is in progress
         st.session_state.undo_mode = False # For 'Tic-Tac-Undo' twist
-        st.session_state.evolve_marks = {} # Stores mark levels for 'Evolve Tic-Tac-Toe': {(row, col): level}
-        st.session_state.player_abilities = { # Stores remaining ability uses for 'Tic-Tac-Toe with Abilities'
-            PLAYER_X: {'swap': 1, 'block': 1, 'remove': 1},
-            PLAYER_O: {'swap': 1, 'block': 1, 'remove': 1}
-        }
-        st.session_state.blocked_line = None # Stores a blocked winning line for 'Block' ability
-        st.session_state.last_placed_mark_coords = None # For 'Memory Challenge' (not fully implemented in Streamlit)
-        st.session_state.turn_time_limit = 10 # Seconds for 'Sudden Death Tic-Tac-Toe'
-        st.session_state.turn_start_time = 0 # Timestamp when current turn started
-        st.session_state.selected_twists = self._get_default_twists() # Dictionary of selected twists
-        st.session_state.game_mode = "friend" # "friend" or "bot"
-        st.session_state.bot_difficulty = "basic" # "basic" or "smart"
+        st.session_state.turn_time_limit = DEFAULT_TURN_TIME_LIMIT # Seconds per turn for 'Sudden Death Tic-Tac-Toe'
+        st.session_state.turn_deadline = 0 # Timestamp at which the current player runs out of time
+        st.session_state.game_mode = "friend" # "friend", "bot" or "online"
+        st.session_state.bot_difficulty = "basic" # "basic", "smart" or "mcts"
         st.session_state.bot_enabled = False # True if playing against the bot
         st.session_state.ability_mode = None # Stores the active ability type if any ('swap', 'block', 'remove')
         st.session_state.swap_first_click = None # Stores first selected cell for 'Swap' ability
-        # board_history stores tuples: (board_state, evolve_marks_state) just before a player's move
-        st.session_state.board_history = []
+        # Reversible log of the turns played (mark, evolve, swap, shift and ability changes as deltas)
+        st.session_state.move_log = MoveLog(MOVE_HISTORY_LIMIT)
         st.session_state.game_message = "" # Message displayed to the user
         # For 'Memory Challenge': True means all marks are revealed, False means opponent's marks are hidden
         st.session_state.reveal_all_memory_marks = False
-        st.session_state.last_board_shift_turn = 0 # Tracks turns for 'Board Shift Tic-Tac-Toe'
         st.session_state.bot_move_pending = False # Flag to trigger bot move on next Streamlit rerun
+        # Background bot search for the current turn: {"key", "future", "stats", "ready_at"} or None
+        st.session_state.bot_job = None
+        # Bot caches, created on the first bot move that needs one and dropped when the game ends:
+        # the Smart Bot's search cache (up to 50k entries) and the MCTS Bot with its search tree
+        st.session_state.transposition_table = None
+        st.session_state.mcts_bot = None
+        st.session_state.bot_time_budget_ms = DEFAULT_BOT_TIME_BUDGET_MS # Wall-clock budget per Smart Bot move
+        # 'Play Online': join code of the shared game, the side this session plays, and the game
+        # version last drawn (the rules, state and move log above then point at the shared ones)
+        st.session_state.online_code = None
+        st.session_state.online_player = None
+        st.session_state.online_version = -1
+        # Between reruns the game state, move log and turn deadline are kept only as these bytes
+        # (see _unpacked_game); None while they are unpacked or shared with an online game
+        st.session_state.packed_game = None
+        st.session_state.game_unpacked = False
+        st.session_state.game_record = None # GameRecord of the current game: settings, seed and turns
+        # Replay of a recorded game: the record's bytes and the number of turns shown, or None
+        st.session_state.replay_record = None
+        st.session_state.replay_step = 0
+
+    # --- Packed Session State ---
+    @contextmanager
+    def _unpacked_game(self):
+        """
+        Decodes the session's packed game into game_state, move_log and turn_deadline for the length
+        of a script or fragment run, and packs it back afterwards (also when the run ends in a
+        rerun), so idle sessions hold a few dozen bytes instead of the objects. Online games keep
+        their shared objects. Nested uses (fragments within a full run) do nothing.
+        """
+        if st.session_state.game_unpacked:
+            yield
+            return
+        if st.session_state.packed_game is not None:
+            self._unpack_game()
+        st.session_state.game_unpacked = True
+        try:
+            yield
+        finally:
+            st.session_state.game_unpacked = False
+            if st.session_state.online_code is None:
+                self._pack_game()
+
+    def _pack_game(self):
+        rules = st.session_state.rules
+        packed_state = rules.pack_state(st.session_state.game_state)
+        record = st.session_state.game_record
+        packed_record = record.to_bytes() if record is not None else b""
+        st.session_state.packed_game = (
+            struct.pack(PACKED_GAME_HEADER_FORMAT, st.session_state.turn_deadline, len(packed_state), len(packed_record))
+            + packed_state + packed_record + st.session_state.move_log.pack(rules))
+        del st.session_state.game_state, st.session_state.move_log, st.session_state.turn_deadline
+        del st.session_state.game_record
+
+    def _unpack_game(self):
+        rules = st.session_state.rules
+        data = st.session_state.packed_game
+        turn_deadline, state_size, record_size = struct.unpack_from(PACKED_GAME_HEADER_FORMAT, data)
+        state_end = PACKED_GAME_HEADER_SIZE + state_size
+        record_end = state_end + record_size
+        st.session_state.turn_deadline = turn_deadline
+        st.session_state.game_state = rules.unpack_state(data[PACKED_GAME_HEADER_SIZE:state_end])
+        st.session_state.game_record = GameRecord.from_bytes(data[state_end:record_end]) if record_size else None
+        st.session_state.move_log = MoveLog.unpack(rules, data[record_end:], MOVE_HISTORY_LIMIT)
+        st.session_state.packed_game = None
 
     def _get_default_twists(self):
         """Returns a dictionary of all possible twists with their default (off) state."""
-        return {
-            "Tic-Tac-Undo": False,
-            "Gravity Tic-Tac-Toe": False,
-            "Sudden Death Tic-Tac-Toe": False,
-            "Evolve Tic-Tac-Toe": False,
-            "Tic-Tac-Toe with Abilities": False,
-            "Board Shift Tic-Tac-Toe": False,
-            "Memory Challenge": False
-        }
+        return {twist_name: False for twist_name in TWIST_NAMES}
 
     def set_current_screen(self, screen_name):
         """Sets the current screen to be displayed."""
@@ -69,19 +384,41 @@ class TwistedTicTacToeStreamlit:
         st.header("Select Game Mode:")
 
         # Game Mode selection using radio buttons
-        current_game_mode_index = 0 if st.session_state.game_mode == "friend" else 1
-        new_game_mode_label = st.radio("Mode", ["Play with Friend", "Play with Computer"],
+        current_game_mode_index = list(GAME_MODES.values()).index(st.session_state.game_mode)
+        new_game_mode_label = st.radio("Mode", list(GAME_MODES),
                                        index=current_game_mode_index, horizontal=True, key="game_mode_radio_main")
-        st.session_state.game_mode = "friend" if new_game_mode_label == "Play with Friend" else "bot"
+        st.session_state.game_mode = GAME_MODES[new_game_mode_label]
+
+        # Online games are created with "Start Game" below, or joined here with the host's code
+        if st.session_state.game_mode == "online":
+            join_code = st.text_input("Game code", key="join_code_input",
+                                      help="Enter the code your friend got when starting an online game.")
+            if st.button("Join Game", key="join_game_button", help="Join a friend's online game as Player O."):
+                if self._join_online_game(join_code):
+                    self.set_current_screen("game_board")
+                    st.rerun()
+                st.error("There is no open game with that code.")
 
         # Difficulty selection is shown only if "Play with Computer" is selected
         if st.session_state.game_mode == "bot":
             st.subheader("Select Difficulty:")
-            current_bot_difficulty_index = 0 if st.session_state.bot_difficulty == "basic" else 1
-            new_bot_difficulty_label = st.radio("Difficulty", ["Basic Bot", "Smart Bot"],
+            current_bot_difficulty_index = list(BOT_DIFFICULTIES.values()).index(st.session_state.bot_difficulty)
+            new_bot_difficulty_label = st.radio("Difficulty", list(BOT_DIFFICULTIES),
                                                 index=current_bot_difficulty_index, horizontal=True, key="bot_difficulty_radio_main")
-            st.session_state.bot_difficulty = "basic" if new_bot_difficulty_label == "Basic Bot" else "smart"
+            st.session_state.bot_difficulty = BOT_DIFFICULTIES[new_bot_difficulty_label]
+            if st.session_state.bot_difficulty != "basic":
+                st.session_state.bot_time_budget_ms = st.slider(
+                    "Bot thinking time (ms)", min_value=50, max_value=2000, step=50,
+                    value=st.session_state.bot_time_budget_ms, key="bot_time_budget_slider",
+                    help="Upper bound on how long the Smart or MCTS Bot searches before committing to its best move so far.")
         
+        st.markdown("---")
+        st.header("Select Board:")
+        layout_labels = list(BOARD_LAYOUTS)
+        st.session_state.board_layout = st.selectbox(
+            "Board size", layout_labels, index=layout_labels.index(st.session_state.board_layout),
+            key="board_layout_select", help="Larger boards need more marks in a row to win.")
+
         st.markdown("---")
         st.header("Select Game Twists:")
 
@@ -103,6 +440,45 @@ class TwistedTicTacToeStreamlit:
                 value=st.session_state.selected_twists[twist_name], # Use current session state value
                 key=f"twist_checkbox_{twist_name}" # Unique key for each checkbox
             )
+        if st.session_state.selected_twists["Sudden Death Tic-Tac-Toe"]:
+            st.session_state.turn_time_limit = st.slider(
+                "Seconds per turn", min_value=TURN_TIME_LIMIT_RANGE[0], max_value=TURN_TIME_LIMIT_RANGE[1],
+                value=st.session_state.turn_time_limit, key="turn_time_limit_slider",
+                help="Time each player has to move under Sudden Death.")
+
+        st.markdown("---")
+        with st.expander("Replay a Recorded Game"):
+            uploaded_records = st.file_uploader(
+                "Game records file", key="game_records_uploader",
+                help="A downloaded game record or a records file. Without one, this server's recent games are listed.")
+            records, unreadable = [], False
+            try:
+                if uploaded_records is not None:
+                    records = [GameRecord.from_bytes(data) for data in load_recent_records(uploaded_records.getvalue())]
+                    if not records:
+                        raise ValueError("no complete game record in it")
+                    for record in records:
+                        for _ in record.replay(): # Turns that cannot be played mean the file is damaged
+                            pass
+                elif GAME_RECORDS_PATH is not None:
+                    get_game_record_writer().flush() # Include the games finished since the last batch was written
+                    if os.path.exists(GAME_RECORDS_PATH):
+                        records = [GameRecord.from_bytes(data) for data in
+                                   load_recent_records(GAME_RECORDS_PATH, os.path.getsize(GAME_RECORDS_PATH))]
+            except (struct.error, ValueError, IndexError, KeyError) as error:
+                st.error(f"This is not a readable game records file ({error}).")
+                records, unreadable = [], True
+            if records:
+                choice = st.selectbox("Game", range(len(records)), key="replay_record_select",
+                                      format_func=lambda index: self._record_label(records[index]))
+                if st.button("Replay", key="replay_record_button", help="Step through the game turn by turn."):
+                    self._start_replay(records[choice])
+                    st.rerun()
+            elif not unreadable:
+                st.caption("No recorded games yet.")
+        if GAME_ARCHIVE_PATH is not None:
+            with st.expander("Game Statistics"):
+                self._display_statistics()
 
         st.markdown("---")
         # Start Game button
@@ -118,66 +494,215 @@ class TwistedTicTacToeStreamlit:
         self._reset_game_state_for_new_game() # Reset board, player, etc.
         st.session_state.game_active = True
         st.session_state.bot_enabled = (st.session_state.game_mode == "bot")
-        st.session_state.game_message = f"Player {st.session_state.current_player}'s turn."
+        st.session_state.game_message = f"Player {st.session_state.game_state.current_player}'s turn."
 
-        if st.session_state.selected_twists["Sudden Death Tic-Tac-Toe"]:
-            st.session_state.turn_time_limit = 10 # Default to 10 seconds per turn
-            st.session_state.turn_start_time = time.time() # Start timer for the first turn
+        if st.session_state.rules.sudden_death:
+            st.session_state.turn_deadline = time.time() + st.session_state.turn_time_limit # Start timer for the first turn
         
         # If bot is enabled and it's Player O's turn (as X starts), flag for bot move
-        if st.session_state.bot_enabled and st.session_state.current_player == PLAYER_O:
+        if st.session_state.bot_enabled and st.session_state.game_state.current_player == PLAYER_O:
             st.session_state.bot_move_pending = True # Trigger bot move on the next rerun
 
+        if st.session_state.game_mode == "online":
+            self._host_online_game()
+
     def _reset_game_state_for_new_game(self):
         """Resets specific game state variables for a fresh game round."""
-        st.session_state.board = [[EMPTY_CELL for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        st.session_state.current_player = PLAYER_X
+        self._cancel_bot_job()
+        st.session_state.game_number += 1
+        st.session_state.turn_number = 0
+        # Configure the rules once per game
+        st.session_state.rules = Rules(st.session_state.selected_twists, *BOARD_LAYOUTS[st.session_state.board_layout])
+        st.session_state.game_state = st.session_state.rules.new_state()
         st.session_state.game_active = True
         st.session_state.undo_mode = False
-        st.session_state.evolve_marks = {}
-        st.session_state.player_abilities = {
-            PLAYER_X: {'swap': 1, 'block': 1, 'remove': 1},
-            PLAYER_O: {'swap': 1, 'block': 1, 'remove': 1}
-        }
-        st.session_state.blocked_line = None
-        st.session_state.last_placed_mark_coords = None
-        st.session_state.turn_time_limit = 10
-        st.session_state.turn_start_time = time.time()
+        st.session_state.turn_deadline = time.time() + st.session_state.turn_time_limit
         st.session_state.game_message = ""
         st.session_state.ability_mode = None
         st.session_state.swap_first_click = None
-        st.session_state.board_history = [] # Clear history for a new game
+        st.session_state.move_log = MoveLog(MOVE_HISTORY_LIMIT) # Clear history for a new game
+        opponent = st.session_state.bot_difficulty if st.session_state.game_mode == "bot" else st.session_state.game_mode
+        st.session_state.game_record = GameRecord(
+            st.session_state.selected_twists, *BOARD_LAYOUTS[st.session_state.board_layout], opponent=opponent,
+            bot_time_budget_ms=st.session_state.bot_time_budget_ms if st.session_state.game_mode == "bot" else 0)
         st.session_state.reveal_all_memory_marks = True # Reveal all marks briefly at the start of a new game
-        st.session_state.last_board_shift_turn = 0
         st.session_state.bot_move_pending = False
+        # An online game restarts for both players
+        game = self._online_game()
+        if game is not None:
+            with game.lock:
+                st.session_state.game_message = f"Player {st.session_state.game_state.current_player}'s turn."
+                self._publish_online_game(game)
+
+    # --- 'Play Online' Shared Games ---
+    def _online_game(self):
+        """Returns the shared game this session plays online, or None."""
+        code = st.session_state.get("online_code")
+        return get_game_store().get(code) if code else None
+
+    def _host_online_game(self):
+        """Registers the freshly started game in the shared store, with this session as Player X."""
+        settings = {"selected_twists": dict(st.session_state.selected_twists),
+                    "board_layout": st.session_state.board_layout,
+                    "turn_time_limit": st.session_state.turn_time_limit}
+        game = get_game_store().create(st.session_state.session_id, settings, st.session_state.rules,
+                                       st.session_state.game_state, st.session_state.move_log)
+        st.session_state.online_code = game.code
+        st.session_state.online_player = PLAYER_X
+        st.session_state.game_message = f"Share the code {game.code} with your friend. Waiting for Player O to join..."
+        st.session_state.turn_deadline = 0 # The clock starts when Player O joins
+        with game.lock:
+            self._publish_online_game(game)
+
+    def _join_online_game(self, code):
+        """Takes Player O's seat in the game with this code. Returns False if there is no open game with it."""
+        seated_game = get_game_store().get(code)
+        rejoining = seated_game is not None and seated_game.player_of(st.session_state.session_id) is not None
+        game, player = get_game_store().join(code, st.session_state.session_id)
+        if game is None:
+            return False
+        # Play with the host's settings, so 'Reset Game' from either side recreates the same game
+        st.session_state.selected_twists = dict(game.settings["selected_twists"])
+        st.session_state.board_layout = game.settings["board_layout"]
+        st.session_state.turn_time_limit = game.settings["turn_time_limit"]
+        st.session_state.game_mode = "online"
+        st.session_state.bot_enabled = False
+        st.session_state.online_code = game.code
+        st.session_state.online_player = player
+        with game.lock:
+            if game.rules.sudden_death and game.active and not rejoining:
+                game.publish(turn_deadline=time.time() + st.session_state.turn_time_limit) # The clock (re)starts once both are in
+            self._sync_online_game(force=True)
+        return True
+
+    def _leave_online_game(self):
+        """Gives up this session's seat in its online game, if any."""
+        code = st.session_state.get("online_code")
+        if code:
+            get_game_store().leave(code, st.session_state.session_id)
+            st.session_state.online_code = None
+
+    def _sync_online_game(self, force=False):
+        """
+        Points the session at the shared game's current rules, state and outcome if the other player
+        changed it. A game the store no longer has (evicted while idle) ends here, as a local game.
+        """
+        game = self._online_game()
+        if game is None:
+            if st.session_state.online_code is not None:
+                st.session_state.online_code = st.session_state.online_player = None
+                st.session_state.game_active = False
+                st.session_state.game_message = GAME_EXPIRED_MESSAGE
+            return
+        if not force and game.version == st.session_state.online_version:
+            return
+        with game.lock:
+            st.session_state.rules = game.rules
+            st.session_state.game_state = game.state
+            st.session_state.move_log = game.move_log
+            st.session_state.game_record = game.record
+            st.session_state.game_active = game.active
+            st.session_state.game_message = game.message
+            st.session_state.turn_deadline = game.turn_deadline
+            st.session_state.online_version = game.version
+
+    def _publish_online_game(self, game):
+        """Publishes this session's view of the game to the other player. Call with the game's lock held."""
+        game.publish(rules=st.session_state.rules, state=st.session_state.game_state,
+                     move_log=st.session_state.move_log, record=st.session_state.game_record,
+                     active=st.session_state.game_active,
+                     message=st.session_state.game_message, turn_deadline=st.session_state.turn_deadline)
+        st.session_state.online_version = game.version
+
+    @contextmanager
+    def _shared_game_update(self):
+        """
+        Holds the online game's lock around a change, starting from its latest version, and publishes
+        the result to the other player afterwards (even if the change ends in a rerun). Clicks that
+        change nothing shared (a rejected move, picking an ability) stay local. A no-op offline.
+        """
+        game = self._online_game()
+        if game is None:
+            yield
+            return
+        with game.lock:
+            self._sync_online_game()
+            before = (game.state.snapshot(), game.active)
+            try:
+                yield
+            finally:
+                if (st.session_state.game_state is not game.state
+                        or (st.session_state.game_state.snapshot(), st.session_state.game_active) != before):
+                    self._publish_online_game(game)
+
+    def _awaiting_opponent(self):
+        """True while this session's online game has an empty seat; the turn clock stands still until it is taken."""
+        if st.session_state.online_code is None:
+            return False
+        game = self._online_game()
+        return game is not None and not all(game.players.values())
+
+    def _is_local_turn(self):
+        """False while the bot or the online opponent is to move (or has not joined yet): this browser must wait."""
+        current_player = st.session_state.game_state.current_player
+        if st.session_state.bot_enabled and current_player == PLAYER_O:
+            return False
+        if st.session_state.online_code is not None:
+            game = self._online_game()
+            return game is not None and all(game.players.values()) and current_player == st.session_state.online_player
+        return True
 
     def display_game_board_screen(self):
         """Renders the main game board screen."""
         st.title("Twisted Tic-Tac-Toe Game")
+        # The style sheet sits outside the board fragment, so moves (fragment reruns) don't resend it
+        st.markdown(BOARD_CSS, unsafe_allow_html=True)
+
+        if st.session_state.replay_record is not None:
+            self._display_replay()
+            return
 
-        # Handle pending bot moves. This pattern ensures bot moves are processed after UI updates
-        # and before the user can interact again.
-        if st.session_state.bot_enabled and st.session_state.current_player == PLAYER_O and st.session_state.game_active and st.session_state.bot_move_pending:
+        # Online games: pick up the other player's changes and rerun when the next one arrives
+        if st.session_state.online_code is not None:
+            self._sync_online_game()
+            st.caption(f"Game code: {st.session_state.online_code} - you are Player {st.session_state.online_player}")
+            _await_online_change()
+
+        # Handle pending bot moves. The search runs in the background: until its move is ready the
+        # board renders in a "thinking" state and a fragment polls for the result.
+        if st.session_state.bot_enabled and st.session_state.game_state.current_player == PLAYER_O and st.session_state.game_active and st.session_state.bot_move_pending:
+            if self._bot_move():
+                st.rerun() # Force a rerun to display the board after bot's move
             st.session_state.game_message = "Bot is thinking..."
             st.info("Bot is thinking...") # Provide immediate visual feedback
-            time.sleep(0.5) # Simulate thinking time for bot
-            self._bot_move() # Execute bot's move
-            st.session_state.bot_move_pending = False # Reset the flag
-            st.rerun() # Force a rerun to display the board after bot's move
+            _await_bot_move()
+
+        # Under 'Sudden Death' the server checks the turn's deadline once, when it falls due
+        if st.session_state.rules.sudden_death and st.session_state.game_active and not self._awaiting_opponent():
+            remaining_time = max(0.0, st.session_state.turn_deadline - time.time())
+            st.fragment(self._enforce_turn_deadline, run_every=remaining_time + DEADLINE_CHECK_SLACK)()
+
+        self._render_game_area()
+
+    @st.fragment
+    def _render_game_area(self):
+        """
+        Renders the part of the screen a move changes: status, timer, board, control and ability
+        buttons. Runs as a fragment, so a click reruns only this region instead of the whole script.
+        """
+        with self._unpacked_game():
+            self._render_game_area_contents()
 
+    @timed_phase("game_area")
+    def _render_game_area_contents(self):
         # Placeholder for dynamic status messages
         status_message_placeholder = st.empty()
         status_message_placeholder.markdown(f"**{st.session_state.game_message}**")
 
-        # Display timer for Sudden Death twist
-        if st.session_state.selected_twists["Sudden Death Tic-Tac-Toe"] and st.session_state.game_active:
-            elapsed_time = time.time() - st.session_state.turn_start_time
-            remaining_time = max(0, int(st.session_state.turn_time_limit - elapsed_time))
-            st.markdown(f"**Time: {remaining_time}s**") # Make timer more prominent
-            # Check for timeout and end game if time runs out
-            if remaining_time <= 0 and st.session_state.game_active:
-                self._end_game(f"Player {st.session_state.current_player} ran out of time! Player {PLAYER_O if st.session_state.current_player == PLAYER_X else PLAYER_X} wins!")
-                st.rerun()
+        # Display timer for Sudden Death twist, counting down in the browser
+        if st.session_state.rules.sudden_death and st.session_state.game_active and not self._awaiting_opponent():
+            remaining_ms = max(0, int((st.session_state.turn_deadline - time.time()) * 1000))
+            components.html(COUNTDOWN_HTML.format(remaining_ms=remaining_ms), height=30)
 
         # Render the Tic-Tac-Toe board
         self._render_board()
@@ -186,129 +711,66 @@ class TwistedTicTacToeStreamlit:
         self._render_control_buttons()
         # Render ability buttons (Swap, Block, Remove)
         self._render_ability_buttons()
-        
 
+    def _enforce_turn_deadline(self):
+        """Scheduled (as a fragment) for when the current turn's time runs out; ends the game if it has."""
+        with self._unpacked_game(), self._shared_game_update():
+            timed_out = self._turn_timed_out()
+        if timed_out:
+            st.rerun()
+
+    def _turn_timed_out(self):
+        """Ends the game if the current player has run out of time under 'Sudden Death'. Returns True if so."""
+        if not (st.session_state.rules.sudden_death and st.session_state.game_active) or self._awaiting_opponent():
+            return False
+        if time.time() < st.session_state.turn_deadline:
+            return False
+        state = st.session_state.game_state
+        self._record_turn(TIMEOUT)
+        self._end_game(f"Player {state.current_player} ran out of time! Player {state.opponent} wins!", state.opponent)
+        return True
+
+    def _rerun_board(self):
+        """
+        Reruns just the game area fragment after a click, or the whole app when the bot moves next
+        (its search and result polling live outside the fragment) or under 'Sudden Death' (the
+        deadline check is scheduled outside it, once per turn).
+        """
+        full_rerun = st.session_state.bot_move_pending or st.session_state.rules.sudden_death
+        st.rerun(scope="app" if full_rerun else "fragment")
+
+    @timed_phase("render_board")
     def _render_board(self):
         """Renders the Tic-Tac-Toe board using Streamlit columns and buttons, applying custom CSS."""
         with st.container():
-            # Inject custom CSS for button styling (size, shape, colors)
-            st.markdown("""
-            <style>
-                /* General button styling */
-                .stButton > button {
-                    font-size: 2em; /* Slightly smaller font for better mobile fit */
-                    width: 100%; /* Occupy full column width */
-                    aspect-ratio: 1 / 1; /* Maintain square shape */
-                    /* Removed max-width here to let columns dictate width more freely */
-                    border-radius: 10px; /* Rounded corners */
-                    background-color: #ECEFF1; /* Light gray background */
-                    color: #212121; /* Default dark gray text */
-                    border: 2px solid #90A4AE; /* Border color */
-                    margin: 1px; /* Even smaller margin for tighter grid */
-                    padding: 0; /* No internal padding for buttons themselves */
-                    box-sizing: border-box; /* Include padding and border in the element's total width and height */
-                    display: flex; /* Use flexbox for centering content */
-                    justify-content: center; /* Center horizontally */
-                    align-items: center; /* Center vertically */
-                    cursor: pointer; /* Pointer cursor for clickable cells */
-                    transition: background-color 0.2s ease, transform 0.1s ease; /* Smooth hover and click effects */
-                    box-shadow: 2px 2px 5px rgba(0,0,0,0.1); /* Subtle shadow for depth */
-                }
-                /* Hover effect for clickable buttons */
-                .stButton > button:hover:not(:disabled) {
-                    background-color: #CFD8DC; /* Slightly darker gray on hover */
-                    transform: translateY(-2px); /* Slight lift on hover */
-                }
-                /* Active (clicked) state */
-                .stButton > button:active:not(:disabled) {
-                    transform: translateY(0); /* Press down effect */
-                    box-shadow: 1px 1px 3px rgba(0,0,0,0.2) inset; /* Inset shadow */
-                }
-                /* Style for disabled buttons */
-                .stButton > button:disabled {
-                    opacity: 0.6; /* Dim disabled buttons */
-                    cursor: not-allowed; /* No-go cursor */
-                    background-color: #E0E0E0; /* Slightly darker disabled background */
-                    color: #757575; /* Lighter text for disabled */
-                }
-                /* Specific colors for X and O marks */
-                .x-mark { color: #E91E63; } /* Red-ish for X */
-                .o-mark { color: #2196F3; } /* Blue-ish for O */
-
-                /* Style for ability buttons and control buttons */
-                .stButton > button[key*="ability_"], .stButton > button[key*="button_"] {
-                    font-size: 1.2em !important; /* Smaller font for control/ability buttons */
-                    max-width: none; /* Allow them to take more width */
-                    height: auto; /* Auto height based on content */
-                    padding: 10px 15px; /* Add padding */
-                }
-
-                /* Streamlit radio button and checkbox alignment */
-                div[data-baseweb="radio"], div[data-baseweb="checkbox"] {
-                    display: flex;
-                    align-items: center;
-                }
-                div[data-baseweb="radio"] label, div[data-baseweb="checkbox"] label {
-                    margin-right: 15px; /* Spacing between options */
-                }
-
-                /* Targeting Streamlit columns to ensure equal distribution and minimal padding */
-                /* This targets the horizontal block that contains the three columns for a row */
-                div[data-testid="stVerticalBlock"] > div[data-testid="stHorizontalBlock"] {
-                    display: flex;
-                    flex-direction: row; /* Ensure items are in a row */
-                    flex-wrap: nowrap; /* Prevent wrapping unless explicitly necessary */
-                    justify-content: space-around; /* Distribute space around items */
-                    align-items: center; /* Center items vertically */
-                    width: 100%; /* Ensure the row takes full width */
-                    margin: 0 !important; /* Remove any default margins */
-                    padding: 0 !important; /* Remove any default padding */
-                }
-                /* This targets the individual st.column elements within the row */
-                div[data-testid="stColumn"] {
-                    flex: 1 1 30%; /* Allow columns to grow/shrink, with a base of ~30% each */
-                    max-width: 33.33%; /* Ensure columns don't exceed 1/3 of the row */
-                    display: flex; /* Use flexbox for columns themselves */
-                    justify-content: center; /* Center content within each column */
-                    align-items: center; /* Align items vertically */
-                    padding: 0px !important; /* Extremely important: Remove any default padding inside columns */
-                    min-width: 0; /* Allow columns to shrink as much as needed */
-                }
-            </style>
-            """, unsafe_allow_html=True) # Allow Streamlit to render custom HTML/CSS
-
+            rules = st.session_state.rules
+            state = st.session_state.game_state
+            # Whose marks stay visible under 'Memory Challenge': the player to move, or this browser's player online
+            viewer = st.session_state.online_player or state.current_player
+            local_turn = self._is_local_turn()
             # Removed the outermost st.columns to fix nesting error
-            for r in range(BOARD_SIZE):
-                board_row_cols = st.columns(BOARD_SIZE) # Create columns for each row
-                for c in range(BOARD_SIZE):
+            for r in range(rules.geometry.rows):
+                board_row_cols = st.columns(rules.geometry.cols) # Create columns for each row
+                for c in range(rules.geometry.cols):
                     with board_row_cols[c]: # Place content within each column
-                            mark_on_board = st.session_state.board[r][c]
+                            mark_on_board = state.mark_at(r, c)
                             mark_display = str(mark_on_board) # Ensure mark_display is a string from the start
-                            
+                            evolve_level = state.level_at(r, c)
+
                             # Apply 'Evolve Tic-Tac-Toe' display logic
-                            if st.session_state.selected_twists["Evolve Tic-Tac-Toe"] and (r,c) in st.session_state.evolve_marks:
+                            if rules.evolve and evolve_level > 0:
                                 if mark_on_board != EMPTY_CELL: # Only show level if a mark exists
-                                    evolve_level = st.session_state.evolve_marks[(r,c)]
-                                    if isinstance(evolve_level, int): # Defensive check
-                                        mark_display += str(evolve_level)
-                                    else:
-                                        # Fallback if evolve_level is not an integer (e.g., None)
-                                        mark_display += "" # Do not display level if type is wrong
+                                    mark_display += str(evolve_level)
 
 
                             # Apply 'Memory Challenge' visibility logic
-                            if st.session_state.selected_twists["Memory Challenge"]:
+                            if rules.memory:
                                 # If not set to reveal all and it's an opponent's mark, hide it
-                                if not st.session_state.reveal_all_memory_marks and mark_on_board != st.session_state.current_player:
+                                if not st.session_state.reveal_all_memory_marks and mark_on_board != viewer:
                                     mark_display = "" # Hide opponent's mark
                                 # If it's the current player's mark and Evolve is on, ensure level is shown
-                                elif mark_on_board == st.session_state.current_player and st.session_state.selected_twists["Evolve Tic-Tac-Toe"] and (r,c) in st.session_state.evolve_marks:
-                                    evolve_level = st.session_state.evolve_marks[(r,c)]
-                                    if isinstance(evolve_level, int): # Defensive check
-                                        mark_display = str(mark_on_board) + str(evolve_level)
-                                    else:
-                                        # Fallback if evolve_level is not an integer (e.g., None)
-                                        mark_display = str(mark_on_board) # Display just the mark, no level
+                                elif mark_on_board == viewer and rules.evolve and evolve_level > 0:
+                                    mark_display = str(mark_on_board) + str(evolve_level)
 
 
                             # Ensure button has text, even if empty, to maintain size
@@ -317,8 +779,8 @@ class TwistedTicTacToeStreamlit:
                             
                             # Determine if the button should be disabled
                             button_disabled = not st.session_state.game_active # Disable if game not active
-                            # Disable human clicks during bot's turn
-                            if st.session_state.bot_enabled and st.session_state.current_player == PLAYER_O:
+                            # Disable human clicks during the bot's or the online opponent's turn
+                            if not local_turn:
                                 button_disabled = True
                             
                             # Special handling for ability mode clicks: enable all cells temporarily
@@ -328,7 +790,7 @@ class TwistedTicTacToeStreamlit:
                                 if st.session_state.ability_mode == 'swap' and st.session_state.swap_first_click == (r,c):
                                     button_disabled = True
                                 # For remove, disable clicking an empty cell
-                                if st.session_state.ability_mode == 'remove' and st.session_state.board[r][c] == EMPTY_CELL:
+                                if st.session_state.ability_mode == 'remove' and mark_on_board == EMPTY_CELL:
                                     button_disabled = True
                                 # For block, any cell is valid, logic handles if no lines to block
 
@@ -345,8 +807,9 @@ class TwistedTicTacToeStreamlit:
                             try:
                                 if st.button(button_label, key=f"cell_{r}_{c}",
                                              use_container_width=True, disabled=button_disabled): # unsafe_allow_html=True removed
-                                    self._handle_click(r, c) # Handle the click event
-                                    st.rerun() # Force a rerun to update the UI
+                                    with self._shared_game_update():
+                                        self._handle_click(r, c) # Handle the click event
+                                    self._rerun_board() # Force a rerun to update the UI
                             except Exception as e:
                                 st.error(f"Error rendering button at ({r},{c}): {e}")
                                 # Print more context to the console for debugging
@@ -363,21 +826,21 @@ class TwistedTicTacToeStreamlit:
         control_cols = st.columns(3) # Create three columns for the buttons
         with control_cols[0]:
             # 'Tic-Tac-Undo' button logic
-            if st.session_state.selected_twists["Tic-Tac-Undo"]:
+            if st.session_state.rules.undo:
                 button_text = "Toggle Undo Mode (Active)" if st.session_state.undo_mode else "Toggle Undo Mode (Inactive)"
                 # Disable undo button if it's bot's turn or an ability is active
-                undo_disabled = (st.session_state.bot_enabled and st.session_state.current_player == PLAYER_O) or \
+                undo_disabled = not self._is_local_turn() or \
                                 st.session_state.ability_mode is not None
                 if st.button(button_text, key="undo_button", help="Toggle undo mode to remove your mark.",
                              disabled=undo_disabled):
                     self._toggle_undo_mode() # Toggle undo mode
-                    st.rerun() # Force rerun to update UI
+                    self._rerun_board() # Force rerun to update UI
 
         with control_cols[1]:
             # 'Reset Game' button
             if st.button("Reset Game", key="reset_game_button", help="Start a new game with the same twists."):
                 self._reset_game_state_for_new_game() # Reset game state to start a new round
-                st.rerun() # Force rerun
+                self._rerun_board() # Force rerun
 
         with control_cols[2]:
             # 'Change Twists' button
@@ -386,9 +849,22 @@ class TwistedTicTacToeStreamlit:
                 self._initialize_session_state() # Fully re-initialize all session state
                 st.rerun() # Force rerun
 
+        # A finished game can be replayed turn by turn, or downloaded to be replayed elsewhere
+        record = st.session_state.game_record
+        if not st.session_state.game_active and record is not None and record.result is not None:
+            replay_cols = st.columns(2)
+            with replay_cols[0]:
+                if st.button("Replay Game", key="replay_game_button", help="Step through this game turn by turn."):
+                    self._start_replay(record)
+                    st.rerun()
+            with replay_cols[1]:
+                st.download_button("Download Game Record", record.frame(), file_name=f"game-{record.started}.ttr",
+                                   key="download_game_record_button",
+                                   help="Save this game's record, e.g. to report how the bot played.")
+
     def _render_ability_buttons(self):
         """Renders ability buttons (Swap, Block, Remove) if the 'Abilities' twist is active."""
-        if st.session_state.selected_twists["Tic-Tac-Toe with Abilities"]:
+        if st.session_state.rules.abilities:
             st.markdown("---")
             st.subheader("Abilities:")
             ability_cols = st.columns(3) # Create three columns for ability buttons
@@ -397,18 +873,18 @@ class TwistedTicTacToeStreamlit:
             }
             for i, (ability_type, btn_text) in enumerate(abilities_info.items()):
                 with ability_cols[i]:
-                    count = st.session_state.player_abilities[st.session_state.current_player][ability_type] # Get remaining uses
+                    count = st.session_state.game_state.abilities[st.session_state.game_state.current_player][ability_type] # Get remaining uses
                     button_label = f"{btn_text} ({count})"
                     
                     # Disable ability button if no uses left, game not active, or another ability is active
                     button_disabled = (count <= 0 or not st.session_state.game_active or st.session_state.ability_mode is not None)
-                    # Disable human abilities during bot's turn
-                    if st.session_state.bot_enabled and st.session_state.current_player == PLAYER_O:
+                    # Disable human abilities during the bot's or the online opponent's turn
+                    if not self._is_local_turn():
                         button_disabled = True
 
                     if st.button(button_label, key=f"ability_{ability_type}_btn", disabled=button_disabled):
                         self._use_ability(ability_type) # Initiate ability use
-                        st.rerun() # Force rerun to update status and enable ability clicks
+                        self._rerun_board() # Force rerun to update status and enable ability clicks
 
     def _reset_game(self):
         """Resets the entire application to the twist selection screen by re-initializing session state."""
@@ -421,10 +897,10 @@ class TwistedTicTacToeStreamlit:
         if st.session_state.undo_mode:
             st.session_state.game_message = "Undo Mode Active: Click on your mark to remove it."
         else:
-            st.session_state.game_message = f"Player {st.session_state.current_player}'s turn."
+            st.session_state.game_message = f"Player {st.session_state.game_state.current_player}'s turn."
 
         # If Memory Challenge is on and no ability is active, hide opponent's marks
-        if st.session_state.selected_twists["Memory Challenge"] and st.session_state.ability_mode is None:
+        if st.session_state.rules.memory and st.session_state.ability_mode is None:
             st.session_state.reveal_all_memory_marks = False
 
     def _handle_click(self, r, c):
@@ -432,9 +908,16 @@ class TwistedTicTacToeStreamlit:
         if not st.session_state.game_active:
             st.session_state.game_message = "Game is not active. Start a new game."
             return
+        if self._turn_timed_out(): # A click that arrives after the deadline loses the game instead
+            return
+        if not self._is_local_turn(): # e.g. a click from a page that had not yet seen the opponent's move
+            st.session_state.game_message = "Wait for your turn."
+            return
 
+        rules = st.session_state.rules
+        state = st.session_state.game_state
         # If Memory Challenge is on, temporarily reveal all marks for the human player's decision
-        if st.session_state.selected_twists["Memory Challenge"]:
+        if rules.memory:
             st.session_state.reveal_all_memory_marks = True
         
         # If an ability is active, delegate to the ability-specific handler
@@ -443,156 +926,88 @@ class TwistedTicTacToeStreamlit:
             return # Rerun will be handled by _handle_ability_click
 
         # Handle 'Tic-Tac-Undo' mode logic
-        if st.session_state.selected_twists["Tic-Tac-Undo"] and st.session_state.undo_mode:
+        if rules.undo and st.session_state.undo_mode:
             # Allow removing any of the current player's marks
-            if st.session_state.board[r][c] == st.session_state.current_player:
-                # Store current board state in history before modification for future undo
-                history_entry = (copy.deepcopy(st.session_state.board), copy.deepcopy(st.session_state.evolve_marks))
-                st.session_state.board_history.append(history_entry)
-
-                st.session_state.board[r][c] = EMPTY_CELL # Remove the mark
-                # Remove evolve mark data if it exists
-                if (r,c) in st.session_state.evolve_marks:
-                    del st.session_state.evolve_marks[(r,c)]
+            if state.mark_at(r, c) == state.current_player:
+                before = state.snapshot() # Logged as a delta once the turn is over
+                rules.remove_mark(state, rules.geometry.cell_bit(r, c)) # Remove the mark and its evolve level
+                self._record_turn(UNDO_MARK, rules.geometry.cell_bit(r, c))
                 st.session_state.game_message = "Mark removed!"
                 self._switch_player_and_end_turn_actions() # Switch player and handle end-turn actions
+                st.session_state.move_log.record(before, state)
             else:
                 st.session_state.game_message = "You can only undo your own marks in undo mode!"
         else: # Handle regular mark placement (includes 'Gravity Tic-Tac-Toe')
-            if st.session_state.selected_twists["Gravity Tic-Tac-Toe"]:
-                actual_row = self._get_gravity_placement(st.session_state.board, c)
-                if actual_row is not None:
-                    # Store current board state in history before modification
-                    history_entry = (copy.deepcopy(st.session_state.board), copy.deepcopy(st.session_state.evolve_marks))
-                    st.session_state.board_history.append(history_entry)
-                    self._place_mark(actual_row, c) # Place mark at the lowest available row
-                else:
-                    st.session_state.game_message = "Column is full! Try another."
-            else: # Standard Tic-Tac-Toe placement
-                if st.session_state.board[r][c] == EMPTY_CELL:
-                    # Store current board state in history before modification
-                    history_entry = (copy.deepcopy(st.session_state.board), copy.deepcopy(st.session_state.evolve_marks))
-                    st.session_state.board_history.append(history_entry)
-                    self._place_mark(r, c) # Place mark at the clicked cell
-                else:
-                    st.session_state.game_message = "This spot is already taken! Choose an empty one."
+            # Under 'Gravity' the mark lands in the lowest empty row of the clicked column
+            bit = rules.target_cell(state, r, c)
+            if bit:
+                before = state.snapshot()
+                self._place_mark(*rules.geometry.bit_to_coords(bit))
+                st.session_state.move_log.record(before, state)
+            elif rules.gravity:
+                st.session_state.game_message = "Column is full! Try another."
+            else:
+                st.session_state.game_message = "This spot is already taken! Choose an empty one."
         
         # A rerun is generally triggered by the button click itself, or by _place_mark/_switch_player_and_end_turn_actions
 
     def _place_mark(self, r, c):
         """Places a mark on the board at the specified (r, c) coordinates, applying 'Evolve' twist if active."""
-        if st.session_state.selected_twists["Evolve Tic-Tac-Toe"]:
-            current_level = st.session_state.evolve_marks.get((r,c), 0) # Get current level, default to 0
-            if current_level >= 3: # Max evolution level is 3
-                st.session_state.game_message = "This spot has reached max evolution level!"
-                return # Do not place mark if max level reached
-            new_level = current_level + 1
-            st.session_state.board[r][c] = st.session_state.current_player
-            st.session_state.evolve_marks[(r,c)] = new_level
-        else:
-            st.session_state.board[r][c] = st.session_state.current_player
-        
-        st.session_state.last_placed_mark_coords = (r, c) # Record for Memory Challenge (if active)
+        rules = st.session_state.rules
+        state = st.session_state.game_state
+        if not rules.place_mark(state, rules.geometry.cell_bit(r, c)):
+            st.session_state.game_message = "This spot has reached max evolution level!"
+            return # Do not place mark if max level reached
+        self._record_turn(PLACE, rules.geometry.cell_bit(r, c))
 
         # Check for win or draw after placing the mark
-        if self._check_win(st.session_state.board, st.session_state.evolve_marks, st.session_state.current_player):
-            self._end_game(f"Player {st.session_state.current_player} wins!")
-        elif self._check_draw(st.session_state.board):
-            self._end_game("It's a draw!")
+        if self._check_win(state.current_player):
+            self._end_game(f"Player {state.current_player} wins!", state.current_player)
+        elif rules.is_draw(state):
+            self._end_game("It's a draw!", DRAW)
         else:
             self._switch_player_and_end_turn_actions() # Proceed to next player's turn and end-turn actions
 
     def _switch_player_and_end_turn_actions(self):
         """Handles switching players and other actions that occur at the end of a turn (e.g., board shift, memory hide)."""
         # If 'Memory Challenge' is active, hide opponent's marks for the next player's turn
-        if st.session_state.selected_twists["Memory Challenge"]:
+        if st.session_state.rules.memory:
             st.session_state.reveal_all_memory_marks = False
 
-        self._switch_player() # Switch the current player
-
-        # Apply 'Board Shift Tic-Tac-Toe' twist logic
-        if st.session_state.selected_twists["Board Shift Tic-Tac-Toe"]:
-            filled_cells = sum(1 for row in st.session_state.board for cell in row if cell != EMPTY_CELL)
-            # Shift board every 5 moves (after 5th, 10th, 15th move, etc.)
-            if filled_cells > 0 and (filled_cells - st.session_state.last_board_shift_turn) % 5 == 0:
-                self._shift_board()
-                st.session_state.last_board_shift_turn = filled_cells # Update last shift turn
-                st.session_state.game_message += "\nBoard has shifted!" # Add message to current status
+        # Switch the current player; the engine also applies 'Board Shift Tic-Tac-Toe' every 5 moves
+        shifted = st.session_state.rules.end_turn(st.session_state.game_state)
+        st.session_state.turn_number += 1
+        self._start_turn()
+        if shifted:
+            st.session_state.game_message = "The board is shifting!\nBoard has shifted!"
 
         # If bot is enabled and it's the bot's turn, set flag to trigger bot move on next rerun
-        if st.session_state.bot_enabled and st.session_state.current_player == PLAYER_O:
+        if st.session_state.bot_enabled and st.session_state.game_state.current_player == PLAYER_O:
             st.session_state.bot_move_pending = True
 
-    def _get_gravity_placement(self, board_state, col):
+    def _check_win(self, player):
         """
-        Finds the lowest empty row in a given column for 'Gravity Tic-Tac-Toe' twist.
-        Operates on a given board_state, not necessarily the session_state.board.
+        Checks the live game for a win by `player`, adapting for 'Evolve Tic-Tac-Toe' and 'Block' ability.
+        A win on the blocked line is cancelled and uses up the block.
         """
-        for r in range(BOARD_SIZE - 1, -1, -1): # Check from bottom row upwards
-            if board_state[r][col] == EMPTY_CELL:
-                return r # Return the row index
-        return None # Column is full
+        result = st.session_state.rules.check_win(st.session_state.game_state, player)
+        if result == BLOCKED:
+            st.session_state.game_message = f"Player {player}'s winning line was blocked!"
+        return result == WIN
 
-    def _check_win(self, board_state, evolve_marks_state, player):
+    def _end_game(self, message, winner):
         """
-        Checks for win conditions for a given player on a given board state,
-        adapting for 'Evolve Tic-Tac-Toe' and 'Block' ability.
+        Ends the game (won by `winner`, or DRAW), records it, displays a final message, and provides
+        options to play again or change twists.
         """
-        winning_lines_found = []
-
-        # Check rows for 3 in a row
-        for r in range(BOARD_SIZE):
-            if all(board_state[r][c] == player for c in range(BOARD_SIZE)):
-                winning_lines_found.append(((r,0),(r,1),(r,2)))
-        # Check columns for 3 in a row
-        for c in range(BOARD_SIZE):
-            if all(board_state[r][c] == player for r in range(BOARD_SIZE)):
-                winning_lines_found.append(((0,c),(1,c),(2,c)))
-        # Check main diagonal
-        if all(board_state[i][i] == player for i in range(BOARD_SIZE)):
-            winning_lines_found.append(((0,0),(1,1),(2,2)))
-        # Check anti-diagonal
-        if all(board_state[i][BOARD_SIZE-1-i] == player for i in range(BOARD_SIZE)):
-            winning_lines_found.append(((0,2),(1,1),(2,0)))
-
-        # If 'Evolve Tic-Tac-Toe' is active, filter winning lines to ensure marks are evolved
-        if st.session_state.selected_twists["Evolve Tic-Tac-Toe"]:
-            evolved_winning_lines = []
-            for line in winning_lines_found:
-                # All marks in the line must have an evolved level (> 0) to count as a win
-                if all(evolve_marks_state.get(coord, 0) > 0 for coord in line):
-                    evolved_winning_lines.append(line)
-            winning_lines_found = evolved_winning_lines # Only consider evolved lines as wins
-
-        # If 'Block' ability is active, check if the winning line is currently blocked
-        # This check applies only to the *actual* game board, not during minimax simulations.
-        is_actual_game_board = (board_state is st.session_state.board)
-        if st.session_state.selected_twists["Tic-Tac-Toe with Abilities"] and st.session_state.blocked_line and is_actual_game_board:
-            for line in winning_lines_found:
-                # Convert line coordinates to sets for order-independent comparison
-                if set(line) == set(st.session_state.blocked_line):
-                    st.session_state.game_message = f"Player {player}'s winning line was blocked!"
-                    st.session_state.blocked_line = None # Clear the block after it's used
-                    return False # No win this turn due to block
-        
-        return len(winning_lines_found) > 0 # Return True if any valid winning line exists
-
-    def _check_draw(self, board_state):
-        """Checks if the game is a draw on a given board state (no empty cells)."""
-        for r in range(BOARD_SIZE):
-            for c in range(BOARD_SIZE):
-                if board_state[r][c] == EMPTY_CELL:
-                    return False # Found an empty spot, not a draw yet
-        return True # Board is full, it's a draw
-
-    def _end_game(self, message):
-        """Ends the game, displays a final message, and provides options to play again or change twists."""
         st.session_state.game_active = False # Deactivate the game
+        self._finish_game_record(winner)
         st.session_state.game_message = message # Set final message
         st.session_state.ability_mode = None # Clear any active ability mode
         st.session_state.swap_first_click = None # Clear any pending swap selections
         st.session_state.reveal_all_memory_marks = True # Reveal all marks at game end for full view
         st.session_state.bot_move_pending = False # Stop any pending bot moves
+        self._release_bot_caches() # Nothing more to search in this game
 
         # Display game over options
         st.subheader("Game Over!")
@@ -608,35 +1023,19 @@ class TwistedTicTacToeStreamlit:
                 self._initialize_session_state() # Fully reset all session state
                 st.rerun() # Force rerun
 
-    def _switch_player(self):
-        """Switches the current player and resets the turn timer for 'Sudden Death'."""
-        st.session_state.current_player = PLAYER_O if st.session_state.current_player == PLAYER_X else PLAYER_X
-        st.session_state.game_message = f"Player {st.session_state.current_player}'s turn."
-        if st.session_state.selected_twists["Sudden Death Tic-Tac-Toe"]:
-            st.session_state.turn_start_time = time.time() # Reset timer for the new player
-
-    # --- 'Board Shift' Twist Implementation ---
-    def _shift_board(self):
-        """Shifts the board content (rows move up, top row is lost, new empty row at bottom)."""
-        st.session_state.game_message = "The board is shifting!" # This message will be appended
-        new_board = [[EMPTY_CELL for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        new_evolve_marks = {} # Also shift evolve marks accordingly
-
-        # Shift all rows up by one. The top row is lost, and a new empty row appears at the bottom.
-        for r in range(1, BOARD_SIZE): # Start from the second row (index 1)
-            for c in range(BOARD_SIZE):
-                new_board[r-1][c] = st.session_state.board[r][c] # Move current row 'r' to 'r-1'
-                if (r,c) in st.session_state.evolve_marks:
-                    new_evolve_marks[(r-1,c)] = st.session_state.evolve_marks[(r,c)] # Move evolve mark
-
-        st.session_state.board = new_board # Update the main board
-        st.session_state.evolve_marks = new_evolve_marks # Update evolve marks
-        # Streamlit will automatically re-render the board on the next rerun
+    def _start_turn(self):
+        """Announces the new current player and resets the turn timer for 'Sudden Death'."""
+        st.session_state.game_message = f"Player {st.session_state.game_state.current_player}'s turn."
+        if st.session_state.rules.sudden_death:
+            st.session_state.turn_deadline = time.time() + st.session_state.turn_time_limit # Reset timer for the new player
 
     # --- 'Abilities' Twist Implementation ---
     def _use_ability(self, ability_type):
         """Initiates the use of a player ability (e.g., 'swap', 'block', 'remove')."""
-        if st.session_state.player_abilities[st.session_state.current_player][ability_type] <= 0:
+        state = st.session_state.game_state
+        if self._turn_timed_out():
+            return
+        if state.abilities[state.current_player][ability_type] <= 0:
             st.session_state.game_message = "You don't have any uses left for this ability!"
             return
 
@@ -644,13 +1043,16 @@ class TwistedTicTacToeStreamlit:
         st.session_state.game_message = f"Ability Mode: Click on the board to use '{ability_type.capitalize()}' ability!"
         
         # If 'Memory Challenge' is active, reveal all marks for strategic ability use
-        if st.session_state.selected_twists["Memory Challenge"]:
+        if st.session_state.rules.memory:
             st.session_state.reveal_all_memory_marks = True
 
     def _handle_ability_click(self, r, c):
         """Handles a click on the board when an ability is active."""
+        rules = st.session_state.rules
+        state = st.session_state.game_state
         ability_type = st.session_state.ability_mode
         performed_action = False # Flag to indicate if an ability action was successfully performed
+        before = state.snapshot() # Logged as a delta if the ability is used
 
         if ability_type == 'swap':
             if st.session_state.swap_first_click is None:
@@ -665,52 +1067,32 @@ class TwistedTicTacToeStreamlit:
                     self._reset_ability_mode() # Reset ability mode and exit
                     return
 
-                # Store current state in history before performing the swap
-                history_entry = (copy.deepcopy(st.session_state.board), copy.deepcopy(st.session_state.evolve_marks))
-                st.session_state.board_history.append(history_entry)
-
                 # Perform the actual swap of marks and evolve levels
-                temp_mark = st.session_state.board[r1][c1]
-                temp_evolve = st.session_state.evolve_marks.get((r1,c1), None)
-
-                st.session_state.board[r1][c1] = st.session_state.board[r2][c2]
-                st.session_state.evolve_marks[(r1,c1)] = st.session_state.evolve_marks.get((r2,c2), None)
-                # Clean up evolve_marks if a cell becomes empty or loses its evolve status
-                if (r1,c1) in st.session_state.evolve_marks and st.session_state.evolve_marks[(r1,c1)] is None:
-                    del st.session_state.evolve_marks[(r1,c1)]
-
-                st.session_state.board[r2][c2] = temp_mark
-                st.session_state.evolve_marks[(r2,c2)] = temp_evolve
-                if (r2,c2) in st.session_state.evolve_marks and st.session_state.evolve_marks[(r2,c2)] is None:
-                    del st.session_state.evolve_marks[(r2,c2)]
-
-                st.session_state.player_abilities[st.session_state.current_player]['swap'] -= 1 # Decrement ability use
+                rules.swap_cells(state, rules.geometry.cell_bit(r1, c1), rules.geometry.cell_bit(r2, c2))
+                rules.spend_ability(state, 'swap') # Decrement ability use
+                self._record_turn(SWAP, rules.geometry.cell_bit(r1, c1), rules.geometry.cell_bit(r2, c2))
                 st.session_state.game_message = "Marks swapped!"
                 performed_action = True
 
         elif ability_type == 'block':
-            st.session_state.player_abilities[st.session_state.current_player]['block'] -= 1
-            opponent = PLAYER_O if st.session_state.current_player == PLAYER_X else PLAYER_X
-            potential_lines = self._get_all_potential_winning_lines(opponent) # Get all potential winning lines for opponent
-            if potential_lines:
-                st.session_state.blocked_line = random.choice(potential_lines) # Randomly block one line
-                st.session_state.game_message = f"Player {st.session_state.current_player} blocked a random line for the next turn!"
+            rules.spend_ability(state, 'block')
+            # Randomly block one of the opponent's potential winning lines, drawn from the game's seed
+            # and the turn number so that the game record replays the same block
+            record = st.session_state.game_record
+            blocked_line = rules.block_random_line(state, block_rng(record.seed, record.turn_count()))
+            self._record_turn(BLOCK)
+            if blocked_line is not None:
+                st.session_state.game_message = f"Player {state.current_player} blocked a random line for the next turn!"
             else:
-                st.session_state.game_message = f"Player {st.session_state.current_player} used Block, but no immediate lines to block."
+                st.session_state.game_message = f"Player {state.current_player} used Block, but no immediate lines to block."
             performed_action = True
 
         elif ability_type == 'remove':
-            if st.session_state.board[r][c] != EMPTY_CELL: # Can only remove a non-empty spot
-                # Store current state in history before performing removal
-                history_entry = (copy.deepcopy(st.session_state.board), copy.deepcopy(st.session_state.evolve_marks))
-                st.session_state.board_history.append(history_entry)
-
-                original_owner = st.session_state.board[r][c]
-                st.session_state.board[r][c] = EMPTY_CELL # Remove the mark
-                # Remove evolve mark data if it exists
-                if (r,c) in st.session_state.evolve_marks:
-                    del st.session_state.evolve_marks[(r,c)]
-                st.session_state.player_abilities[st.session_state.current_player]['remove'] -= 1 # Decrement ability use
+            original_owner = state.mark_at(r, c)
+            if original_owner != EMPTY_CELL: # Can only remove a non-empty spot
+                rules.remove_mark(state, rules.geometry.cell_bit(r, c)) # Remove the mark and its evolve level
+                rules.spend_ability(state, 'remove') # Decrement ability use
+                self._record_turn(REMOVE, rules.geometry.cell_bit(r, c))
                 st.session_state.game_message = f"Mark of player {original_owner} at ({r+1},{c+1}) removed!"
                 performed_action = True
             else:
@@ -720,189 +1102,275 @@ class TwistedTicTacToeStreamlit:
         if performed_action:
             self._reset_ability_mode() # Reset ability mode
             self._switch_player_and_end_turn_actions() # Switch player and handle end-turn actions
+            st.session_state.move_log.record(before, state)
         else:
             self._reset_ability_mode() # If no action (e.g., clicked empty for remove), still reset mode
-        st.rerun() # Force a rerun to update the UI
+        self._rerun_board() # Force a rerun to update the UI
 
     def _reset_ability_mode(self):
         """Resets the active ability mode and related temporary states."""
         st.session_state.ability_mode = None
         st.session_state.swap_first_click = None
         # If 'Memory Challenge' is active, hide opponent's marks when ability mode ends
-        if st.session_state.selected_twists["Memory Challenge"]:
+        if st.session_state.rules.memory:
             st.session_state.reveal_all_memory_marks = False
 
-    def _get_all_potential_winning_lines(self, player):
-        """Helper function to get all possible 3-in-a-row lines on the board."""
-        lines = []
-        # Rows
-        for r in range(BOARD_SIZE):
-            lines.append(((r,0),(r,1),(r,2)))
-        # Columns
-        for c in range(BOARD_SIZE):
-            lines.append(((0,c),(1,c),(2,c)))
-        # Diagonals
-        lines.append(((0,0),(1,1),(2,2)))
-        lines.append(((0,2),(1,1),(2,0)))
-        return lines
+    # --- Game Records and Replay ---
+    def _record_turn(self, action, *cells):
+        """Appends the turn being played (an action of gamerecord and the cell bits it acted on) to the game record."""
+        st.session_state.game_record.add(action, *cells)
+
+    def _finish_game_record(self, winner):
+        """Stores the result in the game record and queues the record for the records file."""
+        record = st.session_state.game_record
+        if record is None or record.result is not None:
+            return
+        record.result = winner
+        if GAME_RECORDS_PATH is not None:
+            get_game_record_writer().append(record)
+        if GAME_ARCHIVE_PATH is not None:
+            get_game_archive().add(record)
+
+    def _record_label(self, record):
+        """One-line description of a record for the replay list."""
+        opponents = {value: label for label, value in BOT_DIFFICULTIES.items()}
+        opponents.update(friend="Friend", online="Online")
+        result = "draw" if record.result == DRAW else f"{record.result} won" if record.result else "unfinished"
+        started = time.strftime("%Y-%m-%d %H:%M", time.localtime(record.started))
+        return f"{started} - {opponents[record.opponent]} - {record.rows}x{record.cols} - {result} in {record.turn_count()} turns"
+
+    def _display_statistics(self):
+        """Win rates from the game archive per twist combination and bot difficulty, and the quickest wins against each bot."""
+        statistics = load_game_statistics(GAME_ARCHIVE_PATH)
+        if not statistics["games"]:
+            st.caption("No finished games yet.")
+            return
+        st.caption(f"{statistics['games']} finished games.")
+        st.dataframe([{"Twists": ", ".join(twist_names(row["key"])) or "None", "Games": row["games"],
+                       "X wins": f"{row['x_win_rate']:.0%}", "O wins": f"{row['o_win_rate']:.0%}",
+                       "Draws": f"{row['draw_rate']:.0%}", "Avg. turns": round(row["mean_moves"], 1)}
+                      for row in statistics["twists"]], hide_index=True)
+        difficulty_labels = {value: label for label, value in BOT_DIFFICULTIES.items()}
+        if statistics["difficulties"]:
+            st.dataframe([{"Bot": difficulty_labels[row["key"]], "Games": row["games"],
+                           "Player wins": f"{row['x_win_rate']:.0%}", "Bot wins": f"{row['o_win_rate']:.0%}",
+                           "Draws": f"{row['draw_rate']:.0%}", "Avg. turns": round(row["mean_moves"], 1)}
+                          for row in statistics["difficulties"]], hide_index=True)
+        difficulty = st.selectbox("Quickest wins against", list(BOT_DIFFICULTIES), key="leaderboard_difficulty_select")
+        wins = statistics["fastest_wins"][BOT_DIFFICULTIES[difficulty]]
+        if wins:
+            st.dataframe([{"Turns": move_count, "Time (s)": round(duration),
+                           "Twists": ", ".join(twist_names(twists)) or "None",
+                           "Date": time.strftime("%Y-%m-%d", time.localtime(finished))}
+                          for finished, move_count, duration, twists in wins], hide_index=True)
+        else:
+            st.caption(f"Nobody has beaten the {difficulty} yet.")
+
+    def _start_replay(self, record):
+        """Switches the session to stepping through `record` on the board screen, from before its first turn."""
+        self._cancel_bot_job()
+        self._leave_online_game()
+        st.session_state.replay_record = record.to_bytes()
+        st.session_state.replay_step = 0
+        st.session_state.game_active = False
+        st.session_state.bot_enabled = False
+        st.session_state.bot_move_pending = False
+        st.session_state.ability_mode = None
+        st.session_state.swap_first_click = None
+        st.session_state.undo_mode = False
+        self.set_current_screen("game_board")
+
+    def _display_replay(self):
+        """
+        Shows the replayed game after `replay_step` turns, with buttons to step through it. The
+        position is rebuilt from the record's turns on every run; bot turns are replayed from the
+        moves they made, so no search runs.
+        """
+        record = GameRecord.from_bytes(st.session_state.replay_record)
+        rules = record.rules()
+        turns = list(record.turns())
+        step = min(st.session_state.replay_step, len(turns))
+        state = rules.new_state()
+        message = f"Replay: {self._record_label(record)}. Start of the game."
+        for turn, (action, cells) in enumerate(turns[:step]):
+            mover = state.current_player
+            outcome = apply_action(rules, state, action, cells, record.seed, turn)
+            message = f"Turn {turn + 1}/{len(turns)}: Player {mover} {ACTION_NAMES[action]}"
+            if action in (PLACE, UNDO_MARK, REMOVE):
+                r, c = rules.geometry.bit_to_coords(cells[0])
+                message += f" at ({r + 1},{c + 1})"
+            if outcome is not None:
+                message += ". It's a draw!" if outcome == DRAW else f". Player {outcome} wins!"
+
+        # The board renders from the session's rules and state, with every cell disabled
+        st.session_state.rules = rules
+        st.session_state.game_state = state
+        st.session_state.move_log = MoveLog(MOVE_HISTORY_LIMIT)
+        st.session_state.reveal_all_memory_marks = True
+        st.session_state.game_message = message
+        st.markdown(f"**{message}**")
+        self._render_board()
+
+        st.markdown("---")
+        replay_cols = st.columns(5)
+        for column, (label, target, key) in zip(replay_cols, (
+                ("First", 0, "replay_first_button"), ("Back", step - 1, "replay_back_button"),
+                ("Next", step + 1, "replay_next_button"), ("Last", len(turns), "replay_last_button"))):
+            with column:
+                if st.button(label, key=key, disabled=not 0 <= target <= len(turns) or target == step):
+                    st.session_state.replay_step = target
+                    st.rerun()
+        with replay_cols[4]:
+            if st.button("Exit Replay", key="exit_replay_button", help="Go back to the twist selection screen."):
+                self.set_current_screen("twist_selection")
+                self._initialize_session_state()
+                st.rerun()
+
+    # --- Performance Instrumentation ---
+    def _update_instrumentation(self):
+        """
+        Points the session at the process-wide metrics (if METRICS_PATH is set) and creates or drops
+        its own metrics as the debug query parameter comes and goes. Returns the session's metrics or None.
+        """
+        st.session_state.metrics = get_metrics()
+        if st.query_params.get(DEBUG_QUERY_PARAM) == "1":
+            if st.session_state.get("session_metrics") is None:
+                st.session_state.session_metrics = SessionMetrics()
+        else:
+            st.session_state.session_metrics = None
+        return st.session_state.session_metrics
+
+    def _record_search(self, stats):
+        """Adds a finished bot search's figures to the session's and the process-wide metrics."""
+        for metrics in (st.session_state.get("session_metrics"), st.session_state.get("metrics")):
+            if metrics is not None:
+                metrics.add_search(stats)
+                metrics.add_time("search", stats["seconds"])
+
+    def _render_debug_panel(self):
+        """Sidebar panel with the session's performance metrics: reruns, time per phase, bot searches, caches."""
+        session_metrics = st.session_state.session_metrics
+        summary = session_metrics.summary()
+        with st.sidebar:
+            st.header("Performance")
+            st.metric("Reruns", session_metrics.reruns)
+            st.caption("Latest run of each phase (ms)")
+            st.json(summary["last_run_ms"])
+            st.caption("All runs of each phase")
+            st.json(summary["phases"], expanded=False)
+            st.caption("Bot searches")
+            st.json(summary["search"])
+            st.json(summary["recent_searches"], expanded=False)
+            st.caption("Caches")
+            table = st.session_state.transposition_table
+            st.json({"transposition_table": table.stats() if table is not None else None,
+                     "opening_book": get_opening_book().stats(),
+                     "online_games": len(get_game_store())}, expanded=False)
 
     # --- Bot Logic Implementation ---
+    def _bot_job_key(self):
+        """Identifies the turn a bot search belongs to, so results for an older turn or game are discarded."""
+        return st.session_state.session_id, st.session_state.game_number, st.session_state.turn_number
+
+    def _cancel_bot_job(self):
+        """
+        Drops the session's bot search; one that already started finishes in the background and is
+        ignored. It keeps the transposition table and MCTS tree it was given, and the session moves
+        on to fresh ones, so two searches never change the same table or tree at once.
+        """
+        job = st.session_state.get("bot_job")
+        if job is not None:
+            if not job["future"].cancel() and not job["future"].done():
+                self._release_bot_caches()
+            st.session_state.bot_job = None
+
+    def _bot_caches(self):
+        """The session's (transposition table, MCTS Bot), creating the one the selected difficulty searches with."""
+        if st.session_state.bot_difficulty == "smart" and st.session_state.transposition_table is None:
+            st.session_state.transposition_table = TranspositionTable()
+        if st.session_state.bot_difficulty == "mcts" and st.session_state.mcts_bot is None:
+            st.session_state.mcts_bot = MCTSBot()
+        return st.session_state.transposition_table, st.session_state.mcts_bot
+
+    def _release_bot_caches(self):
+        """Drops the session's bot caches; the next bot move starts new ones."""
+        st.session_state.transposition_table = None
+        st.session_state.mcts_bot = None
+
+    @timed_phase("bot_move")
     def _bot_move(self):
-        """Determines and executes the bot's move based on difficulty."""
+        """
+        Advances the bot's turn without blocking: starts the search in the bot executor if it is not
+        running for this turn yet, and plays its move once it has finished and the minimum display
+        delay has passed. Returns True if the bot moved (or the game is over).
+        """
         if not st.session_state.game_active:
-            return
+            return True
+
+        key = self._bot_job_key()
+        job = st.session_state.bot_job
+        if job is None or job["key"] != key:
+            self._cancel_bot_job()
+            # Search figures are only collected while instrumentation is on
+            instrumented = st.session_state.get("session_metrics") is not None or st.session_state.get("metrics") is not None
+            stats = {} if instrumented else None
+            # Basic Bot: random empty cell; Smart Bot: tablebase or opening book lookup, else alpha-beta
+            # within the time budget; MCTS Bot: UCT search within the time budget
+            table, mcts_bot = self._bot_caches()
+            future = get_bot_executor().submit(
+                compute_bot_move, st.session_state.rules, st.session_state.game_state.copy(),
+                st.session_state.bot_difficulty, table, mcts_bot, st.session_state.bot_time_budget_ms, stats)
+            job = st.session_state.bot_job = {"key": key, "future": future, "stats": stats,
+                                              "ready_at": time.time() + BOT_MIN_DISPLAY_DELAY}
+        if not job["future"].done() or time.time() < job["ready_at"]:
+            return False
+        st.session_state.bot_job = None
+        bit = job["future"].result()
+        if job["stats"] is not None:
+            self._record_search(job["stats"])
 
         # Temporarily reveal all marks for the bot's internal decision making
         original_reveal_state = st.session_state.reveal_all_memory_marks
         st.session_state.reveal_all_memory_marks = True # Bot needs to see the full board
 
-        # Store current board state in history before bot makes its move (for undo)
-        history_entry = (copy.deepcopy(st.session_state.board), copy.deepcopy(st.session_state.evolve_marks))
-        st.session_state.board_history.append(history_entry)
+        if not bit:
+            bit = choose_basic_move(st.session_state.rules, st.session_state.game_state) # Any legal move will do
+        st.session_state.bot_move_pending = False
+        if bit:
+            before = st.session_state.game_state.snapshot() # Logged as a delta once the bot has moved
+            self._place_mark(*st.session_state.rules.geometry.bit_to_coords(bit))
+            st.session_state.move_log.record(before, st.session_state.game_state)
+        else:
+            self._end_game("The bot has no legal move. It's a draw!", DRAW)
 
-        if st.session_state.bot_difficulty == "basic":
-            self._basic_bot_move()
-        else: # Smart Bot
-            self._smart_bot_move()
-        
         # Restore the original memory challenge reveal state after the bot's turn
         st.session_state.reveal_all_memory_marks = original_reveal_state
-
-    def _basic_bot_move(self):
-        """Basic bot logic: chooses a random empty cell."""
-        available = [(r, c) for r in range(BOARD_SIZE) for c in range(BOARD_SIZE) if st.session_state.board[r][c] == EMPTY_CELL]
-        if available:
-            if st.session_state.selected_twists["Gravity Tic-Tac-Toe"]:
-                valid_gravity_moves = []
-                for _, c in available: # Iterate columns to find valid gravity placements
-                    actual_r = self._get_gravity_placement(st.session_state.board, c)
-                    if actual_r is not None and (actual_r, c) not in valid_gravity_moves:
-                        valid_gravity_moves.append((actual_r, c))
-                
-                if valid_gravity_moves:
-                    r, c = random.choice(valid_gravity_moves)
-                    self._place_mark(r, c)
-                else:
-                    st.session_state.game_message = "Basic bot couldn't find a gravity move. (Unexpected state if spots are available)"
-            else:
-                r, c = random.choice(available)
-                self._place_mark(r, c)
-
-    def _smart_bot_move(self):
-        """Smart bot logic: uses Minimax algorithm to find the optimal move."""
-        best_score = -float('inf')
-        move = None
-        
-        # Iterate through all possible cells to find the best move
-        for r_iter in range(BOARD_SIZE):
-            for c_iter in range(BOARD_SIZE):
-                # Create deep copies of board state for minimax simulation
-                temp_board = copy.deepcopy(st.session_state.board)
-                temp_evolve_marks = copy.deepcopy(st.session_state.evolve_marks)
-                
-                current_r, current_c = r_iter, c_iter
-                # Apply 'Gravity Tic-Tac-Toe' for minimax consideration
-                if st.session_state.selected_twists["Gravity Tic-Tac-Toe"]:
-                    actual_r = self._get_gravity_placement(temp_board, c_iter)
-                    if actual_r is None: # Column is full, skip this move
-                        continue
-                    current_r = actual_r
-                
-                if temp_board[current_r][current_c] == EMPTY_CELL:
-                    # Make the move on the temporary board for simulation
-                    temp_board[current_r][current_c] = PLAYER_O # Bot's move
-                    if st.session_state.selected_twists["Evolve Tic-Tac-Toe"]:
-                        temp_evolve_marks[(current_r, current_c)] = temp_evolve_marks.get((current_r, current_c), 0) + 1
-
-                    # Call minimax to evaluate this move. `False` indicates it's now Minimizing Player's turn (Human 'X')
-                    score = self._minimax(temp_board, temp_evolve_marks, 0, False)
-                    
-                    if score > best_score:
-                        best_score = score
-                        move = (current_r, current_c) # Store the best move found so far
-        
-        if move:
-            self._place_mark(*move) # Execute the best move
-        else:
-            # Fallback to basic bot if smart bot can't find an optimal move (e.g., board full)
-            st.session_state.game_message = "Smart bot found no optimal moves, making a random move."
-            self._basic_bot_move()
-
-    def _minimax(self, board_state, evolve_marks_state, depth, is_max):
-        """
-        Minimax algorithm to find the best move for the bot.
-        This function operates on *passed* board_state and evolve_marks_state,
-        ensuring it doesn't modify the main game's session_state during simulation.
-        """
-        # Base cases: Check for win/draw on the current simulated board state
-        if self._check_win(board_state, evolve_marks_state, PLAYER_O): # If O wins in this state
-            return 1 # Maximize score for O
-        if self._check_win(board_state, evolve_marks_state, PLAYER_X): # If X wins in this state
-            return -1 # Minimize score for O
-        if self._check_draw(board_state): # If it's a draw
-            return 0 # Neutral score
-
-        # Limit search depth to prevent excessive computation, especially in a web environment
-        if depth >= 5: # Tunable depth limit (deeper means smarter but slower)
-            return 0 # Return neutral score if depth limit is reached
-
-        if is_max: # Maximizing player (Bot 'O')
-            best = -float('inf') # Initialize with negative infinity
-            for r_iter in range(BOARD_SIZE):
-                for c_iter in range(BOARD_SIZE):
-                    temp_board = copy.deepcopy(board_state) # Create a new temporary board for simulation
-                    temp_evolve_marks = copy.deepcopy(evolve_marks_state)
-
-                    current_r, current_c = r_iter, c_iter
-                    # Apply 'Gravity Tic-Tac-Toe' for minimax consideration
-                    if st.session_state.selected_twists["Gravity Tic-Tac-Toe"]:
-                        actual_r = self._get_gravity_placement(temp_board, c_iter)
-                        if actual_r is None: # Column is full, skip this potential move
-                            continue
-                        current_r = actual_r
-
-                    if temp_board[current_r][current_c] == EMPTY_CELL:
-                        temp_board[current_r][current_c] = PLAYER_O # Make the move
-                        if st.session_state.selected_twists["Evolve Tic-Tac-Toe"]:
-                            temp_evolve_marks[(current_r, c_iter)] = temp_evolve_marks.get((current_r, c_iter), 0) + 1
-                        
-                        # Recursively call minimax for the next player (Minimizing)
-                        best = max(best, self._minimax(temp_board, temp_evolve_marks, depth + 1, False))
-            return best
-        else: # Minimizing player (Human 'X')
-            best = float('inf') # Initialize with positive infinity
-            for r_iter in range(BOARD_SIZE):
-                for c_iter in range(BOARD_SIZE):
-                    temp_board = copy.deepcopy(board_state)
-                    temp_evolve_marks = copy.deepcopy(evolve_marks_state)
-
-                    current_r, current_c = r_iter, c_iter
-                    if st.session_state.selected_twists["Gravity Tic-Tac-Toe"]:
-                        actual_r = self._get_gravity_placement(temp_board, c_iter)
-                        if actual_r is None:
-                            continue
-                        current_r = actual_r
-
-                    if temp_board[current_r][current_c] == EMPTY_CELL:
-                        temp_board[current_r][c_iter] = PLAYER_X # Make the move
-                        if st.session_state.selected_twists["Evolve Tic-Tac-Toe"]:
-                            temp_evolve_marks[(current_r, c_iter)] = temp_evolve_marks.get((current_r, c_iter), 0) + 1
-                        
-                        # Recursively call minimax for the next player (Maximizing)
-                        best = min(best, self._minimax(temp_board, temp_evolve_marks, depth + 1, True))
-            return best
+        return True
 
 # Main Streamlit application entry point
 def app():
     # Create an instance of the game logic class.
     # This will also ensure st.session_state is initialized.
     game = TwistedTicTacToeStreamlit()
+    session_metrics = game._update_instrumentation()
+    metrics = st.session_state.metrics
+    if session_metrics is not None:
+        session_metrics.reruns += 1
+    if metrics is not None:
+        metrics.add_rerun()
 
     # Route to the appropriate screen based on session state
-    if st.session_state.current_screen == "twist_selection":
-        game.display_twist_selection_screen()
-    elif st.session_state.current_screen == "game_board":
-        game.display_game_board_screen()
+    with timed("rerun", session_metrics, metrics), game._unpacked_game():
+        if st.session_state.current_screen == "twist_selection":
+            game.display_twist_selection_screen()
+        elif st.session_state.current_screen == "game_board":
+            game.display_game_board_screen()
+
+    # Not reached when the run ends in st.rerun(); the next run catches up
+    if session_metrics is not None:
+        game._render_debug_panel()
+    if metrics is not None:
+        metrics.maybe_flush()
 
 if __name__ == "__main__":
     app()
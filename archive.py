@@ -0,0 +1,228 @@
+"""
+Local SQLite archive of finished games, and the statistics and leaderboards read from it.
+
+Each finished game is one row of `games`: twists (a bitmask in TWIST_NAMES order), board, mode
+("friend", "bot" or "online"), bot difficulty, winner ('X', 'O' or NULL for a draw), turns
+played, duration (NULL when unknown, as for imported games) and the compact move list
+(GameRecord.to_bytes). A game is stored once, keyed by its start time and seed, so importing a
+records file the app also archived adds nothing twice. GameArchive writes them from a background
+thread in batched transactions, so the app's script threads only queue a tuple.
+
+An insert trigger keeps running totals per twist combination, mode and difficulty in
+`game_totals`, so the statistics read a few hundred rows however many games are stored, and
+indexes serve the leaderboard and time-window queries. Records files can be imported:
+
+    python archive.py games.sqlite3 --import game_records.bin
+"""
+import argparse
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from engine import PLAYER_X, PLAYER_O, TWIST_NAMES
+from gamerecord import read_records
+
+BOT_DIFFICULTIES = ("basic", "smart", "mcts") # Record opponents that are bots
+DEFAULT_ARCHIVE_BATCH_SIZE = 256 # Games written per transaction at most
+DEFAULT_ARCHIVE_FLUSH_INTERVAL = 1.0 # Seconds a queued game waits for others to share its transaction
+LEADERBOARD_LIMIT = 10
+
+SCHEMA = """
+PRAGMA journal_mode = WAL; -- Readers never wait for the writer
+PRAGMA synchronous = NORMAL;
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    started INTEGER NOT NULL, -- Unix seconds, from the record
+    seed INTEGER NOT NULL, -- From the record; with `started`, identifies the game
+    finished REAL NOT NULL, -- Unix seconds
+    twists INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    cols INTEGER NOT NULL,
+    win_length INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    difficulty TEXT, -- NULL unless mode is 'bot'
+    winner TEXT, -- NULL for a draw
+    move_count INTEGER NOT NULL,
+    duration REAL, -- Seconds; NULL if unknown
+    record BLOB NOT NULL,
+    UNIQUE (started, seed)
+);
+-- Leaderboard: the quickest wins against each bot difficulty, read in index order
+CREATE INDEX IF NOT EXISTS games_by_difficulty ON games (difficulty, winner, move_count, duration);
+-- Recent games and statistics over a time window
+CREATE INDEX IF NOT EXISTS games_by_finished ON games (finished, twists, mode, difficulty, winner);
+CREATE TABLE IF NOT EXISTS game_totals (
+    twists INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    difficulty TEXT NOT NULL, -- '' unless mode is 'bot'
+    games INTEGER NOT NULL,
+    x_wins INTEGER NOT NULL,
+    o_wins INTEGER NOT NULL,
+    draws INTEGER NOT NULL,
+    moves INTEGER NOT NULL,
+    timed_games INTEGER NOT NULL, -- Games with a known duration
+    duration REAL NOT NULL,
+    PRIMARY KEY (twists, mode, difficulty)
+) WITHOUT ROWID;
+-- Fires only for rows actually inserted, so games ignored as duplicates are not counted again
+CREATE TRIGGER IF NOT EXISTS games_add_totals AFTER INSERT ON games BEGIN
+    INSERT INTO game_totals VALUES (NEW.twists, NEW.mode, COALESCE(NEW.difficulty, ''), 1, NEW.winner IS 'X',
+                                    NEW.winner IS 'O', NEW.winner IS NULL, NEW.move_count,
+                                    NEW.duration IS NOT NULL, COALESCE(NEW.duration, 0))
+    ON CONFLICT (twists, mode, difficulty) DO UPDATE SET
+        games = games + 1, x_wins = x_wins + excluded.x_wins, o_wins = o_wins + excluded.o_wins,
+        draws = draws + excluded.draws, moves = moves + excluded.moves,
+        timed_games = timed_games + excluded.timed_games, duration = duration + excluded.duration;
+END;
+"""
+INSERT_GAME = ("INSERT OR IGNORE INTO games (started, seed, finished, twists, rows, cols, win_length, mode, difficulty, "
+               "winner, move_count, duration, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)")
+TOTALS_COLUMNS = ("SUM(games), SUM(x_wins), SUM(o_wins), SUM(draws), SUM(moves), SUM(timed_games), SUM(duration)")
+
+_CLOSE = object() # Queued by close to stop the writer thread
+
+def open_archive(path):
+    """Opens the archive at `path`, creating its tables, indexes and trigger if needed."""
+    connection = sqlite3.connect(path, timeout=30)
+    connection.executescript(SCHEMA)
+    return connection
+
+def twist_names(twist_bits):
+    """The twist names set in a twists bitmask."""
+    return [twist_name for index, twist_name in enumerate(TWIST_NAMES) if twist_bits >> index & 1]
+
+def game_row(record, finished=None):
+    """
+    The `games` row of a finished GameRecord (its result set). A game finished now unless
+    `finished` is given; only then is its duration known.
+    """
+    duration = None
+    if finished is None:
+        finished = time.time()
+        duration = max(0.0, finished - record.started)
+    difficulty = record.opponent if record.opponent in BOT_DIFFICULTIES else None
+    mode = "bot" if difficulty is not None else record.opponent
+    winner = record.result if record.result in (PLAYER_X, PLAYER_O) else None
+    return (record.started, record.seed, finished, record.twist_bits(), record.rows, record.cols, record.win_length, mode, difficulty, winner,
+            record.turn_count(), duration, record.to_bytes())
+
+class GameArchive:
+    """
+    Thread-safe writer of finished games to the archive at `path`. add only queues the game; a
+    background thread writes the queue in transactions of up to `batch_size` games, waiting up to
+    `flush_interval` seconds for a batch to fill. flush waits until everything queued is written.
+    """
+    def __init__(self, path, batch_size=DEFAULT_ARCHIVE_BATCH_SIZE, flush_interval=DEFAULT_ARCHIVE_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0 # Games stored; games already in the archive are skipped
+        self.failed = 0 # Games lost to database errors (e.g. a full disk); the app goes on without them
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="game-archive", daemon=True)
+        self._thread.start()
+
+    def add(self, record, finished=None):
+        self._queue.put(game_row(record, finished))
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        """Writes everything queued and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(_CLOSE)
+            self._thread.join()
+
+    def _run(self):
+        connection = open_archive(self.path)
+        closing = False
+        while not closing:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not _CLOSE:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            closing = batch[-1] is _CLOSE
+            rows = [row for row in batch if row is not _CLOSE]
+            try:
+                if rows:
+                    with connection:
+                        self.written += connection.executemany(INSERT_GAME, rows).rowcount # Duplicates are not counted
+            except sqlite3.Error as error:
+                self.failed += len(rows)
+                print(f"game archive: {len(rows)} games not written: {error}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+        connection.close()
+
+def _totals(connection, group_column, where=""):
+    """
+    Summed game_totals per `group_column`, as dicts with rates and means, most played first.
+    "mean_duration" covers the games with a known duration and is None if there are none.
+    """
+    rows = connection.execute(f"SELECT {group_column}, {TOTALS_COLUMNS} FROM game_totals {where} "
+                              f"GROUP BY {group_column} ORDER BY SUM(games) DESC").fetchall()
+    return [{"key": key, "games": games, "x_wins": x_wins, "o_wins": o_wins, "draws": draws,
+             "x_win_rate": x_wins / games, "o_win_rate": o_wins / games, "draw_rate": draws / games,
+             "mean_moves": moves / games, "mean_duration": duration / timed_games if timed_games else None}
+            for key, games, x_wins, o_wins, draws, moves, timed_games, duration in rows]
+
+def totals_by_twists(connection):
+    """Results per twist combination over every game; "key" is the twists bitmask."""
+    return _totals(connection, "twists")
+
+def totals_by_difficulty(connection):
+    """Results of games against each bot difficulty (the player is X, the bot O); "key" is the difficulty."""
+    return _totals(connection, "difficulty", "WHERE mode = 'bot'")
+
+def fastest_wins(connection, difficulty, limit=LEADERBOARD_LIMIT):
+    """
+    The player's quickest wins against a bot difficulty: (finished, turns, duration, twists bitmask)
+    rows. Games of unknown duration are left out.
+    """
+    return connection.execute(
+        "SELECT finished, move_count, duration, twists FROM games WHERE difficulty = ? AND winner = ? "
+        "AND duration IS NOT NULL ORDER BY move_count, duration LIMIT ?", (difficulty, PLAYER_X, limit)).fetchall()
+
+def game_count(connection, since=None):
+    """Games finished since a Unix time (all games by default)."""
+    if since is None:
+        return connection.execute("SELECT COALESCE(SUM(games), 0) FROM game_totals").fetchone()[0]
+    return connection.execute("SELECT COUNT(*) FROM games WHERE finished >= ?", (since,)).fetchone()[0]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import game records into the archive and print its statistics.")
+    parser.add_argument("path", help="archive database file")
+    parser.add_argument("--import", dest="import_paths", action="append", default=[],
+                        help="records file to import (repeatable); unfinished games and games already stored are skipped")
+    args = parser.parse_args(argv)
+
+    if args.import_paths:
+        archive = GameArchive(args.path)
+        imported = 0
+        for import_path in args.import_paths:
+            for record in read_records(import_path):
+                if record.result is not None:
+                    archive.add(record, finished=record.started)
+                    imported += 1
+        archive.close()
+        print(f"imported {archive.written} of {imported} finished games (the rest were already stored)")
+    with open_archive(args.path) as connection:
+        print(f"{game_count(connection)} games")
+        print(f"{'games':>8} {'X wins':>7} {'O wins':>7} {'draws':>7} {'turns':>6}  twists")
+        for row in totals_by_twists(connection):
+            print(f"{row['games']:>8} {row['x_win_rate']:>7.1%} {row['o_win_rate']:>7.1%} {row['draw_rate']:>7.1%} "
+                  f"{row['mean_moves']:>6.1f}  {'+'.join(twist_names(row['key'])) or '(none)'}")
+        print(f"{'games':>8} {'player':>7} {'bot':>7} {'draws':>7} {'turns':>6}  difficulty")
+        for row in totals_by_difficulty(connection):
+            print(f"{row['games']:>8} {row['x_win_rate']:>7.1%} {row['o_win_rate']:>7.1%} {row['draw_rate']:>7.1%} "
+                  f"{row['mean_moves']:>6.1f}  {row['key']}")
+
+if __name__ == "__main__":
+    main()
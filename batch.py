@@ -0,0 +1,238 @@
+"""
+Vectorized rules checks over batches of positions, for self-play, analysis and tablebase work.
+
+A batch is a set of positions of one board shape and twist set, held as parallel NumPy arrays:
+X and O masks and the two evolve level planes (uint64, so boards of up to 64 cells), plus the
+side to move and the blocked line where needed. BatchEvaluator answers, for the whole batch at
+once, what Rules answers for one GameState: win (check_win, blocked line included), draw
+(is_draw), legal moves (legal_moves), the 'Gravity' landing row of every column (gravity_row)
+and the 'Board Shift' of end_turn. Evolve levels are applied as in Rules: only evolved marks
+count towards a line.
+
+    python batch.py --positions 200000 --rows 6 --cols 7 --win-length 4
+
+checks the batch results against Rules on random positions and reports the throughput of both.
+NumPy is an optional dependency (not in requirements.txt): this module needs it, and the
+tablebase build uses it for its line checks when it is installed, falling back to Rules
+otherwise. The app and the other tools run without it.
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from engine import PLAYER_O, TWIST_NAMES, BOARD_SIZE, WIN, BLOCKED, Rules
+
+NOT_WON, WON, WIN_BLOCKED = 0, 1, 2 # check_win results: None, WIN, BLOCKED
+NO_LINE = -1 # Blocked line index of positions without a block
+DEFAULT_CHUNK_SIZE = 1 << 16 # Positions per step of the line checks (bounds the positions x lines temporaries)
+
+def _bit_count(masks):
+    """Number of set bits of each uint64 mask."""
+    if hasattr(np, "bitwise_count"): # NumPy 2.0+
+        return np.bitwise_count(masks).astype(np.int64)
+    return np.unpackbits(masks.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1).astype(np.int64)
+
+class PositionBatch:
+    """Parallel arrays of positions: masks and level planes (uint64), side to move and blocked line index."""
+    __slots__ = ("x", "o", "levels_low", "levels_high", "o_to_move", "blocked", "last_board_shift_turn")
+
+    def __init__(self, x, o, levels_low=None, levels_high=None, o_to_move=None, blocked=None,
+                 last_board_shift_turn=None):
+        self.x = np.asarray(x, dtype=np.uint64)
+        self.o = np.asarray(o, dtype=np.uint64)
+        size = len(self.x)
+        self.levels_low = np.zeros(size, np.uint64) if levels_low is None else np.asarray(levels_low, dtype=np.uint64)
+        self.levels_high = np.zeros(size, np.uint64) if levels_high is None else np.asarray(levels_high, dtype=np.uint64)
+        self.o_to_move = np.zeros(size, bool) if o_to_move is None else np.asarray(o_to_move, dtype=bool)
+        self.blocked = np.full(size, NO_LINE, np.int64) if blocked is None else np.asarray(blocked, dtype=np.int64)
+        self.last_board_shift_turn = (np.zeros(size, np.int64) if last_board_shift_turn is None
+                                      else np.asarray(last_board_shift_turn, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.x)
+
+    @classmethod
+    def from_states(cls, rules, states):
+        """Encodes GameStates (all under `rules`) as a batch."""
+        geometry = rules.geometry
+        cells = geometry.cell_count
+        if cells > 64:
+            raise ValueError(f"batches hold boards of up to 64 cells, not {cells}")
+        return cls([state.x_mask for state in states], [state.o_mask for state in states],
+                   [state.levels & geometry.full_mask for state in states], [state.levels >> cells for state in states],
+                   [state.current_player == PLAYER_O for state in states],
+                   [NO_LINE if state.blocked_line is None else geometry.line_index[state.blocked_line] for state in states],
+                   [state.last_board_shift_turn for state in states])
+
+class BatchEvaluator:
+    """Rules checks for batches of positions of one board shape and twist set."""
+    def __init__(self, rules, chunk_size=DEFAULT_CHUNK_SIZE):
+        geometry = rules.geometry
+        if geometry.cell_count > 64:
+            raise ValueError(f"batches hold boards of up to 64 cells, not {geometry.cell_count}")
+        self.rules = rules
+        self.geometry = geometry
+        self.chunk_size = chunk_size
+        self.full_mask = np.uint64(geometry.full_mask)
+        self.line_masks = np.array(geometry.line_masks, dtype=np.uint64)
+        # Cell bits of each column, bottom row first, as in BoardGeometry.column_bits
+        self.column_bits = np.array(geometry.column_bits, dtype=np.uint64) # (cols, rows)
+
+    def counted_masks(self, batch):
+        """The X and O masks that count towards lines: only evolved marks under 'Evolve'."""
+        if not self.rules.evolve:
+            return batch.x, batch.o
+        evolved = (batch.levels_low | batch.levels_high) & self.full_mask
+        return batch.x & evolved, batch.o & evolved
+
+    def completed_lines(self, masks):
+        """Boolean (positions x lines) array of the lines each mask completes."""
+        return (masks[:, None] & self.line_masks[None, :]) == self.line_masks[None, :]
+
+    def check_win(self, batch, o_player=None):
+        """
+        check_win for every position: NOT_WON, WON, or WIN_BLOCKED when the blocked line is the one
+        completed under 'Abilities' (the batch is not changed; Rules.check_win would clear the block).
+        `o_player` picks whose lines are checked per position; by default the side to move's.
+        """
+        o_player = batch.o_to_move if o_player is None else np.asarray(o_player, dtype=bool)
+        x_counted, o_counted = self.counted_masks(batch)
+        player_masks = np.where(o_player, o_counted, x_counted)
+        result = np.empty(len(batch), np.int8)
+        for start in range(0, len(batch), self.chunk_size):
+            end = start + self.chunk_size
+            completed = self.completed_lines(player_masks[start:end])
+            chunk = np.where(completed.any(axis=1), WON, NOT_WON).astype(np.int8)
+            if self.rules.abilities:
+                blocked = batch.blocked[start:end]
+                has_block = blocked != NO_LINE
+                blocked_done = np.zeros(len(chunk), bool)
+                blocked_done[has_block] = completed[has_block, blocked[has_block]]
+                chunk[blocked_done] = WIN_BLOCKED
+            result[start:end] = chunk
+        return result
+
+    def winners(self, batch):
+        """Boolean arrays (x_wins, o_wins): whether each side has a completed line, ignoring blocks."""
+        x_counted, o_counted = self.counted_masks(batch)
+        x_wins = np.empty(len(batch), bool)
+        o_wins = np.empty(len(batch), bool)
+        for start in range(0, len(batch), self.chunk_size):
+            end = start + self.chunk_size
+            x_wins[start:end] = self.completed_lines(x_counted[start:end]).any(axis=1)
+            o_wins[start:end] = self.completed_lines(o_counted[start:end]).any(axis=1)
+        return x_wins, o_wins
+
+    def is_draw(self, batch):
+        """is_draw for every position: the board is full."""
+        return (batch.x | batch.o) == self.full_mask
+
+    def gravity_rows(self, batch):
+        """(positions x cols) array of each column's lowest empty row, or -1 for a full column (gravity_row)."""
+        occupied = batch.x | batch.o
+        rows = np.full((len(batch), self.geometry.cols), -1, np.int64)
+        for c in range(self.geometry.cols):
+            # Walk the column from the top row down, so the lowest empty row is the one kept
+            for r in range(self.geometry.rows):
+                empty = (occupied & self.column_bits[c, self.geometry.rows - 1 - r]) == 0
+                rows[empty, c] = r
+        return rows
+
+    def legal_moves(self, batch):
+        """Mask of the cells the side to move may place on, per position (legal_moves as a mask)."""
+        occupied = batch.x | batch.o
+        if not self.rules.gravity:
+            return ~occupied & self.full_mask
+        moves = np.zeros(len(batch), np.uint64)
+        rows = self.gravity_rows(batch)
+        for c in range(self.geometry.cols):
+            open_column = rows[:, c] >= 0
+            bits = np.uint64(1) << (rows[open_column, c] * self.geometry.cols + c).astype(np.uint64)
+            moves[open_column] |= bits
+        return moves
+
+    def filled_count(self, batch):
+        return _bit_count(batch.x | batch.o)
+
+    def shift_board(self, batch, where=None):
+        """Moves every row up by one (shift_board) in the positions selected by `where` (default all), in place."""
+        where = np.ones(len(batch), bool) if where is None else where
+        shift = np.uint64(self.geometry.cols)
+        for plane in (batch.x, batch.o, batch.levels_low, batch.levels_high):
+            plane[where] >>= shift
+
+    def end_turn(self, batch):
+        """
+        end_turn for every position: passes the move and applies 'Board Shift' every 5 filled cells
+        since the last shift, in place. Returns the boolean array of positions that shifted.
+        """
+        batch.o_to_move = ~batch.o_to_move
+        if not self.rules.board_shift:
+            return np.zeros(len(batch), bool)
+        filled = self.filled_count(batch)
+        shifted = (filled > 0) & ((filled - batch.last_board_shift_turn) % 5 == 0)
+        self.shift_board(batch, shifted)
+        batch.last_board_shift_turn[shifted] = filled[shifted]
+        return shifted
+
+def _random_states(rules, count, rng):
+    """Random reachable-looking positions: random placements, ability uses and turn ends under `rules`."""
+    states = []
+    cells = [1 << i for i in range(rules.geometry.cell_count)]
+    for _ in range(count):
+        state = rules.new_state()
+        for _ in range(rng.randrange(rules.geometry.cell_count + 1)):
+            moves = rules.legal_moves(state)
+            if not moves:
+                break
+            rules.place_mark(state, rng.choice(moves))
+            if rules.abilities and rng.random() < 0.1:
+                rules.block_random_line(state, rng)
+            if rng.random() < 0.05:
+                rules.remove_mark(state, rng.choice(cells))
+            rules.end_turn(state)
+        states.append(state)
+    return states
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Check the batch evaluator against Rules and time both.")
+    parser.add_argument("--positions", type=int, default=100000)
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE)
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE)
+    parser.add_argument("--win-length", type=int, default=BOARD_SIZE)
+    parser.add_argument("--twists", default="", help="comma-separated twists to apply")
+    parser.add_argument("--seed", default="0")
+    args = parser.parse_args(argv)
+
+    twists = [twist.strip() for twist in args.twists.split(",") if twist.strip()]
+    unknown = [twist for twist in twists if twist not in TWIST_NAMES]
+    if unknown:
+        parser.error(f"unknown twist(s): {', '.join(unknown)}")
+    rules = Rules({twist_name: twist_name in twists for twist_name in TWIST_NAMES}, args.rows, args.cols, args.win_length)
+    states = _random_states(rules, args.positions, random.Random(args.seed))
+    evaluator = BatchEvaluator(rules)
+    batch = PositionBatch.from_states(rules, states)
+
+    start = time.perf_counter()
+    wins, draws, moves = evaluator.check_win(batch), evaluator.is_draw(batch), evaluator.legal_moves(batch)
+    batch_seconds = time.perf_counter() - start
+
+    codes = {WIN: WON, BLOCKED: WIN_BLOCKED, None: NOT_WON}
+    start = time.perf_counter()
+    expected = []
+    for state in states:
+        check_state = state.copy() if state.blocked_line is not None else state # check_win clears a block it cancels
+        expected.append((codes[rules.check_win(check_state, state.current_player)], rules.is_draw(state),
+                         sum(rules.legal_moves(state))))
+    single_seconds = time.perf_counter() - start
+
+    mismatches = sum(1 for index, (win, draw, move_mask) in enumerate(expected)
+                     if (win, draw, move_mask) != (wins[index], draws[index], int(moves[index])))
+    print(f"{len(states)} positions, {mismatches} mismatches")
+    print(f"batch:  {batch_seconds * 1e9 / len(states):8.1f} ns/position")
+    print(f"single: {single_seconds * 1e9 / len(states):8.1f} ns/position")
+
+if __name__ == "__main__":
+    main()
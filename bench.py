@@ -0,0 +1,184 @@
+"""
+Benchmark suite for the Smart Bot and the rules hot paths.
+
+Builds an empty, a mid-game and a near-full position for every twist combination and times,
+on each: the Smart Bot move as the app makes it (choose_smart_move, tablebase included), the
+raw alpha-beta search (nodes searched, nodes per second, depth, peak memory), the win check
+and the board shift. Results are printed and written as JSON so runs can be compared:
+
+    python bench.py --output bench.json
+    python bench.py --output bench-new.json --compare bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from engine import (
+    PLAYER_X, TWIST_NAMES, BOARD_SIZE, DEFAULT_BOT_TIME_BUDGET_MS, WIN,
+    Rules, SmartBotSearch, TranspositionTable, choose_smart_move,
+)
+from simulate import twist_combinations
+
+POSITIONS = ("empty", "mid", "near_full")
+DEFAULT_REPEATS = 5
+MICRO_REPEATS = 2000 # Calls per timing of the rules methods
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a list of samples."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def build_position(rules, kind, rng):
+    """
+    Plays random legal moves under `rules` (evolve levels and board shifts included) up to the
+    requested fill level without either player completing a line, and returns the state.
+    """
+    cells = rules.geometry.cell_count
+    target = {"empty": 0, "mid": cells // 2, "near_full": cells - 2}[kind]
+    for _ in range(1000):
+        state = rules.new_state()
+        while state.filled_count() < target:
+            moves = rules.legal_moves(state)
+            if not moves:
+                break
+            player = state.current_player
+            rules.place_mark(state, rng.choice(moves))
+            if rules.check_win(state, player) == WIN:
+                break
+            rules.end_turn(state)
+        else:
+            return state
+    raise RuntimeError(f"could not build a {kind} position without a win")
+
+def _time_calls(function, repeats):
+    """Returns the mean time of one call in microseconds."""
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function()
+    return (time.perf_counter() - start) * 1e6 / repeats
+
+def bench_case(rules, state, repeats, time_budget_ms):
+    """Times every benchmarked path on one position and returns the measurements."""
+    o_to_move = state.current_player != PLAYER_X
+    move_ms = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        choose_smart_move(rules, state, TranspositionTable(), time_budget_ms)
+        move_ms.append((time.perf_counter() - start) * 1000)
+
+    search_ms, nodes = [], []
+    for _ in range(repeats):
+        search = SmartBotSearch(rules, TranspositionTable(), time_budget_ms)
+        start = time.perf_counter()
+        search.best_move(state.x_mask, state.o_mask, state.levels, o_to_move)
+        search_ms.append((time.perf_counter() - start) * 1000)
+        nodes.append(search.nodes)
+    # Peak memory is taken in a separate run, as tracing slows the search down
+    tracemalloc.start()
+    search = SmartBotSearch(rules, TranspositionTable(), time_budget_ms)
+    search.best_move(state.x_mask, state.o_mask, state.levels, o_to_move)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    shift_state = state.copy()
+
+    def shift_from_position():
+        # Restore the masks first so every call shifts the benchmarked position, not an emptied board
+        shift_state.x_mask, shift_state.o_mask, shift_state.levels = state.x_mask, state.o_mask, state.levels
+        rules.shift_board(shift_state)
+
+    return {
+        "smart_move_p50_ms": round(percentile(move_ms, 0.50), 3),
+        "smart_move_p99_ms": round(percentile(move_ms, 0.99), 3),
+        "search_p50_ms": round(percentile(search_ms, 0.50), 3),
+        "search_p99_ms": round(percentile(search_ms, 0.99), 3),
+        "search_nodes": round(sum(nodes) / len(nodes)),
+        "search_nodes_per_s": round(sum(nodes) / (sum(search_ms) / 1000)) if sum(search_ms) else None,
+        "search_depth": search.depth_reached,
+        "search_peak_kib": round(peak_bytes / 1024, 1),
+        "check_win_us": round(_time_calls(lambda: rules.check_win(state, state.current_player), MICRO_REPEATS), 3),
+        "shift_board_us": round(_time_calls(shift_from_position, MICRO_REPEATS), 3),
+    }
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_comparison(cases, baseline_cases, out=sys.stdout):
+    """Prints the ratio of each case's p50 search time and node rate to a previous run's."""
+    baseline = {(tuple(case["twists"]), case["position"]): case for case in baseline_cases}
+    print(f"{'position':<10} {'search p50':>11} {'nodes/s':>9}  twists", file=out)
+    for case in cases:
+        old = baseline.get((tuple(case["twists"]), case["position"]))
+        if old is None:
+            continue
+        time_ratio = case["search_p50_ms"] / old["search_p50_ms"] if old["search_p50_ms"] else float("nan")
+        rate_ratio = (case["search_nodes_per_s"] / old["search_nodes_per_s"]
+                      if case["search_nodes_per_s"] and old["search_nodes_per_s"] else float("nan"))
+        print(f"{case['position']:<10} {time_ratio:>10.2f}x {rate_ratio:>8.2f}x  {'+'.join(case['twists']) or '(none)'}",
+              file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the Smart Bot and rules hot paths.")
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS, help="timed runs per case")
+    parser.add_argument("--time-budget-ms", type=int, default=DEFAULT_BOT_TIME_BUDGET_MS)
+    parser.add_argument("--twists", default=None,
+                        help="only this comma-separated twist combination (default: all 128 combinations)")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE)
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE)
+    parser.add_argument("--win-length", type=int, default=BOARD_SIZE)
+    parser.add_argument("--seed", default="0", help="seed for the generated positions")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="JSON results of a previous run to compare against")
+    args = parser.parse_args(argv)
+
+    if args.twists is None:
+        combinations = list(twist_combinations())
+    else:
+        twists = [twist.strip() for twist in args.twists.split(",") if twist.strip()]
+        unknown = [twist for twist in twists if twist not in TWIST_NAMES]
+        if unknown:
+            parser.error(f"unknown twist(s): {', '.join(unknown)}")
+        combinations = [tuple(twist for twist in TWIST_NAMES if twist in twists)]
+
+    cases = []
+    print(f"{'position':<10} {'move p50':>9} {'move p99':>9} {'nodes':>8} {'nodes/s':>9} {'peak KiB':>9} "
+          f"{'win us':>7} {'shift us':>8}  twists")
+    for twists in combinations:
+        rules = Rules({twist_name: twist_name in twists for twist_name in TWIST_NAMES},
+                      args.rows, args.cols, args.win_length)
+        for kind in POSITIONS:
+            state = build_position(rules, kind, random.Random(f"{args.seed}:{'+'.join(twists)}:{kind}"))
+            case = {"twists": list(twists), "position": kind, "filled": state.filled_count()}
+            case.update(bench_case(rules, state, args.repeats, args.time_budget_ms))
+            cases.append(case)
+            print(f"{kind:<10} {case['smart_move_p50_ms']:>9.2f} {case['smart_move_p99_ms']:>9.2f} "
+                  f"{case['search_nodes']:>8} {case['search_nodes_per_s'] or 0:>9} {case['search_peak_kib']:>9.1f} "
+                  f"{case['check_win_us']:>7.2f} {case['shift_board_us']:>8.2f}  {'+'.join(twists) or '(none)'}")
+
+    results = {
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "board": [args.rows, args.cols, args.win_length],
+        "repeats": args.repeats,
+        "time_budget_ms": args.time_budget_ms,
+        "cases": cases,
+    }
+    if args.output:
+        with open(args.output, "w") as results_file:
+            json.dump(results, results_file, indent=1)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            print_comparison(cases, json.load(baseline_file)["cases"])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,1230 @@
+"""
+Streamlit-free rules engine for Twisted Tic-Tac-Toe.
+
+Holds the bitboard position encoding, the GameState/Rules objects the Streamlit app adapts,
+and the Smart Bot search. Nothing here reads st.session_state, so the engine can be used from
+worker processes, solvers and benchmarks without starting Streamlit. Importing it is kept
+cheap for processes started often: the tablebase, board tables, search pool and the modules
+only they need are loaded on first use (python startup.py measures this).
+"""
+import atexit
+import itertools
+import os
+import random
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from functools import lru_cache
+
+from tablebase import get_shared_tablebase
+
+# Constants for game elements
+PLAYER_X = 'X'
+PLAYER_O = 'O'
+EMPTY_CELL = ''
+BOARD_SIZE = 3 # Default board: 3x3 with 3 in a row
+MAX_EVOLVE_LEVEL = 3
+
+# --- Bitboard State Representation ---
+# Cell (r, c) maps to bit r * cols + c of a player's mask. Evolve levels (0-3) are packed into a
+# single int as two bit-planes: bit i holds the low bit of cell i's level and bit cell_count + i
+# holds the high bit. The search works only on these ints, so child positions cost a few integer
+# operations instead of deep copies of the board.
+
+if hasattr(int, "bit_count"): # Python 3.10+
+    _popcount = int.bit_count
+else:
+    def _popcount(mask):
+        return bin(mask).count("1")
+
+class BoardGeometry:
+    """
+    Shape of a board (rows x cols, win_length in a row) and every table derived from it: all
+    winning lines, the lines through each cell, gravity column order and the static move order.
+    Shared per shape through get_geometry; symmetry tables are built on first use.
+    """
+    __slots__ = ("rows", "cols", "win_length", "cell_count", "full_mask", "lines", "line_masks", "line_index",
+                 "cell_lines", "cell_line_indices", "column_bits", "move_rank", "_symmetry_tables")
+
+    def __init__(self, rows, cols, win_length):
+        if not 1 <= win_length <= max(rows, cols):
+            raise ValueError(f"win length {win_length} does not fit a {rows}x{cols} board")
+        self.rows = rows
+        self.cols = cols
+        self.win_length = win_length
+        self.cell_count = rows * cols
+        self.full_mask = (1 << self.cell_count) - 1 # Every cell occupied
+
+        # All winning lines as coordinates (rows, columns, then both diagonal directions) and as masks
+        lines = []
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            for r in range(rows):
+                for c in range(cols):
+                    end_r, end_c = r + dr * (win_length - 1), c + dc * (win_length - 1)
+                    if 0 <= end_r < rows and 0 <= end_c < cols:
+                        lines.append(tuple((r + dr * i, c + dc * i) for i in range(win_length)))
+        self.lines = tuple(lines)
+        self.line_masks = tuple(self.line_mask(line) for line in lines)
+        self.line_index = {line: index for index, line in enumerate(self.line_masks)}
+        # Index of the winning lines passing through each cell, by cell index (as masks and as line indices)
+        self.cell_line_indices = tuple(
+            tuple(index for index, line in enumerate(self.line_masks) if line >> i & 1) for i in range(self.cell_count)
+        )
+        self.cell_lines = tuple(
+            tuple(self.line_masks[index] for index in indices) for indices in self.cell_line_indices
+        )
+        # Cell bits of each column ordered bottom row first, used for 'Gravity' placement
+        self.column_bits = tuple(
+            tuple(self.cell_bit(r, c) for r in range(rows - 1, -1, -1)) for c in range(cols)
+        )
+        # Static move order: cells on more winning lines first (center, then corners, then edges on 3x3)
+        self.move_rank = {
+            bit: rank for rank, bit in enumerate(sorted(
+                (1 << i for i in range(self.cell_count)),
+                key=lambda bit: (-len(self.cell_lines[bit.bit_length() - 1]), bit)))
+        }
+        self._symmetry_tables = {}
+
+    def cell_bit(self, r, c):
+        """Returns the single-bit mask for cell (r, c)."""
+        return 1 << (r * self.cols + c)
+
+    def bit_to_coords(self, bit):
+        """Converts a single-bit mask back to (row, col) coordinates."""
+        return divmod(bit.bit_length() - 1, self.cols)
+
+    def line_mask(self, line):
+        """Returns the mask covering every cell of a line given as ((r, c), ...) coordinates."""
+        mask = 0
+        for r, c in line:
+            mask |= self.cell_bit(r, c)
+        return mask
+
+    def encode_board(self, board_state, evolve_marks_state):
+        """Encodes a list-of-lists board and its evolve marks as (x_mask, o_mask, levels)."""
+        x_mask = o_mask = levels = 0
+        for r in range(self.rows):
+            for c in range(self.cols):
+                bit = self.cell_bit(r, c)
+                if board_state[r][c] == PLAYER_X:
+                    x_mask |= bit
+                elif board_state[r][c] == PLAYER_O:
+                    o_mask |= bit
+                level = evolve_marks_state.get((r, c))
+                if isinstance(level, int) and level > 0: # Swaps can leave None entries behind
+                    level = min(level, MAX_EVOLVE_LEVEL)
+                    if level & 1:
+                        levels |= bit
+                    if level & 2:
+                        levels |= bit << self.cell_count
+        return x_mask, o_mask, levels
+
+    def evolved_mask(self, levels):
+        """Returns the mask of cells whose evolve level is above zero."""
+        return (levels | (levels >> self.cell_count)) & self.full_mask
+
+    def bump_level(self, levels, bit):
+        """Raises the evolve level of the cell at `bit` by one, capped at MAX_EVOLVE_LEVEL."""
+        high_bit = bit << self.cell_count
+        if not levels & bit:
+            return levels | bit # 0 -> 1 or 2 -> 3
+        if not levels & high_bit:
+            return (levels & ~bit) | high_bit # 1 -> 2
+        return levels # Already at level 3
+
+    def winning_line_masks(self, player_mask, levels, evolve):
+        """Returns the winning line masks completed by `player_mask` (only evolved cells count under 'Evolve')."""
+        if evolve:
+            player_mask &= self.evolved_mask(levels)
+        return [line for line in self.line_masks if player_mask & line == line]
+
+    def has_winning_line(self, player_mask, levels, evolve):
+        """Fast boolean form of winning_line_masks."""
+        if evolve:
+            player_mask &= self.evolved_mask(levels)
+        for line in self.line_masks:
+            if player_mask & line == line:
+                return True
+        return False
+
+    def wins_through(self, player_mask, levels, evolve, bit):
+        """Like has_winning_line, but only checks the lines through `bit` (the cell just played)."""
+        if evolve:
+            player_mask &= self.evolved_mask(levels)
+        for line in self.cell_lines[bit.bit_length() - 1]:
+            if player_mask & line == line:
+                return True
+        return False
+
+    def gravity_bit(self, occupied, col):
+        """Returns the bit of the lowest empty cell in `col`, or 0 if the column is full."""
+        for bit in self.column_bits[col]:
+            if not occupied & bit:
+                return bit
+        return 0
+
+    def legal_move_bits(self, occupied, gravity):
+        """Returns the cell bits a mark can be placed on, honouring 'Gravity' if active."""
+        if gravity:
+            return [bit for bit in (self.gravity_bit(occupied, c) for c in range(self.cols)) if bit]
+        return [1 << i for i in range(self.cell_count) if not occupied & (1 << i)]
+
+    # --- Symmetry Canonicalization ---
+    def _symmetries(self, gravity):
+        """
+        The rotations/reflections mapping the board (and its set of winning lines) onto itself, as
+        (r, c) -> (r', c') maps: 8 for square boards, 4 for rectangular ones. 'Gravity' pulls marks
+        towards the bottom row, so only the left-right mirror keeps positions equivalent there.
+        """
+        last_r, last_c = self.rows - 1, self.cols - 1
+        symmetries = [lambda r, c: (r, c), lambda r, c: (r, last_c - c)]
+        if gravity:
+            return symmetries
+        symmetries += [lambda r, c: (last_r - r, c), lambda r, c: (last_r - r, last_c - c)]
+        if self.rows == self.cols:
+            symmetries += [lambda r, c: (c, r), lambda r, c: (last_c - c, last_r - r),
+                           lambda r, c: (c, last_r - r), lambda r, c: (last_c - c, r)]
+        return symmetries
+
+    def _get_symmetry_tables(self, gravity):
+        """
+        Returns, for each symmetry, a table indexed [row][row_bits] giving the transformed mask of
+        that row's cells, so a whole mask is transformed with one lookup per row.
+        """
+        if gravity not in self._symmetry_tables:
+            tables = []
+            for symmetry in self._symmetries(gravity):
+                row_tables = []
+                for r in range(self.rows):
+                    row_table = []
+                    for row_bits in range(1 << self.cols):
+                        mask = 0
+                        for c in range(self.cols):
+                            if row_bits & (1 << c):
+                                mask |= self.cell_bit(*symmetry(r, c))
+                        row_table.append(mask)
+                    row_tables.append(row_table)
+                tables.append(row_tables)
+            self._symmetry_tables[gravity] = tables
+        return self._symmetry_tables[gravity]
+
+    def _transform_mask(self, row_tables, mask):
+        """Applies one symmetry (given by its row tables) to a cell mask."""
+        row_mask = (1 << self.cols) - 1
+        result = 0
+        for r in range(self.rows):
+            result |= row_tables[r][(mask >> (r * self.cols)) & row_mask]
+        return result
+
+    def canonical_key(self, x_mask, o_mask, levels, o_to_move, gravity, evolve):
+        """
+        Returns a hashable key identical for all symmetric variants of a position: the smallest
+        packed (board, levels) int over the allowed symmetries, plus side to move, active twists
+        and the board shape.
+        """
+        return self.canonical_form(x_mask, o_mask, levels, o_to_move, gravity, evolve)[0]
+
+    def canonical_form(self, x_mask, o_mask, levels, o_to_move, gravity, evolve):
+        """Like canonical_key, but also returns the symmetry (as row tables) that maps the position onto it."""
+        cells = self.cell_count
+        low_levels, high_levels = levels & self.full_mask, levels >> cells
+        best = best_tables = None
+        for row_tables in self._get_symmetry_tables(gravity):
+            packed = (self._transform_mask(row_tables, x_mask)
+                      | self._transform_mask(row_tables, o_mask) << cells
+                      | self._transform_mask(row_tables, low_levels) << (2 * cells)
+                      | self._transform_mask(row_tables, high_levels) << (3 * cells))
+            if best is None or packed < best:
+                best, best_tables = packed, row_tables
+        return (best, o_to_move, gravity, evolve, self.rows, self.cols, self.win_length), best_tables
+
+    def transform_bit(self, row_tables, bit):
+        """Returns the cell bit that the symmetry given by `row_tables` maps `bit` onto."""
+        return self._transform_mask(row_tables, bit)
+
+    def untransform_bit(self, row_tables, bit):
+        """Returns the cell bit that the symmetry given by `row_tables` maps onto `bit`."""
+        for i in range(self.cell_count):
+            if self._transform_mask(row_tables, 1 << i) == bit:
+                return 1 << i
+        return 0
+
+@lru_cache(maxsize=None)
+def get_geometry(rows=BOARD_SIZE, cols=BOARD_SIZE, win_length=BOARD_SIZE):
+    """Returns the shared BoardGeometry for a board shape."""
+    return BoardGeometry(rows, cols, win_length)
+
+def _swap_bits(mask, bit_a, bit_b):
+    """Exchanges the values of two single-bit positions in `mask`."""
+    if bool(mask & bit_a) != bool(mask & bit_b):
+        mask ^= bit_a | bit_b
+    return mask
+
+# --- Game State and Rules ---
+TWIST_NAMES = (
+    "Tic-Tac-Undo",
+    "Gravity Tic-Tac-Toe",
+    "Sudden Death Tic-Tac-Toe",
+    "Evolve Tic-Tac-Toe",
+    "Tic-Tac-Toe with Abilities",
+    "Board Shift Tic-Tac-Toe",
+    "Memory Challenge",
+)
+ABILITY_TYPES = ('swap', 'block', 'remove')
+# check_win outcomes for the live game
+WIN = "win"
+BLOCKED = "blocked"
+
+# Packed encoding of a state's non-board fields (see Rules.pack_state): side to move, ability uses
+# (two bits each), blocked line index + 1, last placed cell + 1, filled count at the last shift
+PACKED_SCALARS_FORMAT = "<BHHBB"
+PACKED_SCALARS_SIZE = struct.calcsize(PACKED_SCALARS_FORMAT)
+
+class GameState:
+    """
+    Mutable state of one game: both players' marks and evolve levels as bitboards, whose turn it
+    is, remaining ability uses, the line blocked by the 'Block' ability (as a mask) and the
+    'Board Shift' bookkeeping.
+
+    `line_counts[player][i]` counts the player's marks on winning line i (evolved marks only under
+    'Evolve') and `completed_lines[player]` how many of those lines are full. Rules keeps both in
+    step with every change, so win checks never rescan the board. A state built directly with
+    marks on it must go through Rules.recount before the rules are applied to it.
+    """
+    __slots__ = ("geometry", "x_mask", "o_mask", "levels", "current_player", "abilities",
+                 "blocked_line", "last_placed", "last_board_shift_turn", "line_counts", "completed_lines")
+
+    def __init__(self, geometry=None, x_mask=0, o_mask=0, levels=0, current_player=PLAYER_X, abilities=None,
+                 blocked_line=None, last_placed=None, last_board_shift_turn=0, line_counts=None, completed_lines=None):
+        self.geometry = geometry if geometry is not None else get_geometry()
+        self.x_mask = x_mask
+        self.o_mask = o_mask
+        self.levels = levels
+        self.current_player = current_player
+        self.abilities = abilities if abilities is not None else {
+            player: {ability: 1 for ability in ABILITY_TYPES} for player in (PLAYER_X, PLAYER_O)
+        }
+        self.blocked_line = blocked_line
+        self.last_placed = last_placed # Bit of the most recently placed mark, for 'Memory Challenge'
+        self.last_board_shift_turn = last_board_shift_turn
+        self.line_counts = line_counts if line_counts is not None else {
+            player: [0] * len(self.geometry.line_masks) for player in (PLAYER_X, PLAYER_O)
+        }
+        self.completed_lines = completed_lines if completed_lines is not None else {PLAYER_X: 0, PLAYER_O: 0}
+
+    def copy(self):
+        return GameState(self.geometry, self.x_mask, self.o_mask, self.levels, self.current_player,
+                         {player: dict(counts) for player, counts in self.abilities.items()},
+                         self.blocked_line, self.last_placed, self.last_board_shift_turn,
+                         {player: list(counts) for player, counts in self.line_counts.items()},
+                         dict(self.completed_lines))
+
+    @property
+    def occupied(self):
+        return self.x_mask | self.o_mask
+
+    @property
+    def opponent(self):
+        return PLAYER_O if self.current_player == PLAYER_X else PLAYER_X
+
+    def player_mask(self, player):
+        return self.x_mask if player == PLAYER_X else self.o_mask
+
+    def mark_at(self, r, c):
+        """Returns PLAYER_X, PLAYER_O or EMPTY_CELL for cell (r, c)."""
+        bit = self.geometry.cell_bit(r, c)
+        if self.x_mask & bit:
+            return PLAYER_X
+        if self.o_mask & bit:
+            return PLAYER_O
+        return EMPTY_CELL
+
+    def level_at(self, r, c):
+        """Returns the evolve level (0-3) of cell (r, c)."""
+        bit = self.geometry.cell_bit(r, c)
+        return (1 if self.levels & bit else 0) + (2 if self.levels & (bit << self.geometry.cell_count) else 0)
+
+    def filled_count(self):
+        return _popcount(self.occupied)
+
+    def snapshot(self):
+        """
+        Returns the state as a flat tuple of immutable values (masks, turn, block, bookkeeping and
+        ability uses), cheap enough to take before every move and diff afterwards.
+        """
+        return (self.x_mask, self.o_mask, self.levels, self.current_player, self.blocked_line, self.last_placed,
+                self.last_board_shift_turn,
+                tuple(self.abilities[player][ability] for player in (PLAYER_X, PLAYER_O) for ability in ABILITY_TYPES))
+
+class Rules:
+    """
+    The game rules for one set of selected twists and board shape. Configured once per game and
+    applied to GameState objects; the UI-only twists (Undo, Sudden Death, Memory Challenge) are
+    recorded so callers can query them, but do not change how moves resolve.
+    """
+    __slots__ = ("geometry", "undo", "gravity", "sudden_death", "evolve", "abilities", "board_shift", "memory")
+
+    def __init__(self, selected_twists, rows=BOARD_SIZE, cols=BOARD_SIZE, win_length=BOARD_SIZE):
+        self.geometry = get_geometry(rows, cols, win_length)
+        self.undo = selected_twists.get("Tic-Tac-Undo", False)
+        self.gravity = selected_twists.get("Gravity Tic-Tac-Toe", False)
+        self.sudden_death = selected_twists.get("Sudden Death Tic-Tac-Toe", False)
+        self.evolve = selected_twists.get("Evolve Tic-Tac-Toe", False)
+        self.abilities = selected_twists.get("Tic-Tac-Toe with Abilities", False)
+        self.board_shift = selected_twists.get("Board Shift Tic-Tac-Toe", False)
+        self.memory = selected_twists.get("Memory Challenge", False)
+
+    def new_state(self):
+        """Returns the state of a fresh game: empty board, X to move, one use of each ability."""
+        return GameState(self.geometry)
+
+    def state_from_board(self, board_state, evolve_marks_state, current_player=PLAYER_X):
+        """Builds a state from a list-of-lists board and a {(row, col): level} dict."""
+        x_mask, o_mask, levels = self.geometry.encode_board(board_state, evolve_marks_state)
+        state = GameState(self.geometry, x_mask, o_mask, levels, current_player)
+        self.recount(state)
+        return state
+
+    # --- Packed Encoding ---
+    # A state packs into four little-endian cell masks (X, O, low and high evolve level planes) of
+    # ceil(cells / 8) bytes each, followed by the scalar fields: 15 bytes on the 3x3 board.
+    def _pack_masks(self, *masks):
+        width = (self.geometry.cell_count + 7) // 8
+        return b"".join(mask.to_bytes(width, "little") for mask in masks)
+
+    def _unpack_masks(self, data, offset, count):
+        width = (self.geometry.cell_count + 7) // 8
+        return [int.from_bytes(data[offset + i * width:offset + (i + 1) * width], "little") for i in range(count)]
+
+    def _packed_masks_size(self, count):
+        return count * ((self.geometry.cell_count + 7) // 8)
+
+    def _pack_scalars(self, scalars):
+        """Packs the (player, blocked_line, last_placed, last_board_shift_turn, ability_uses) part of a snapshot."""
+        current_player, blocked_line, last_placed, last_board_shift_turn, ability_uses = scalars
+        packed_uses = 0
+        for index, uses in enumerate(ability_uses):
+            packed_uses |= min(uses, 3) << (2 * index)
+        return struct.pack(PACKED_SCALARS_FORMAT, 1 if current_player == PLAYER_O else 0, packed_uses,
+                           0 if blocked_line is None else self.geometry.line_index[blocked_line] + 1,
+                           0 if not last_placed else last_placed.bit_length(), last_board_shift_turn)
+
+    def _unpack_scalars(self, data, offset):
+        side, packed_uses, blocked_index, last_placed_index, last_board_shift_turn = struct.unpack_from(
+            PACKED_SCALARS_FORMAT, data, offset)
+        ability_uses = tuple((packed_uses >> (2 * index)) & 3 for index in range(2 * len(ABILITY_TYPES)))
+        return (PLAYER_O if side else PLAYER_X,
+                self.geometry.line_masks[blocked_index - 1] if blocked_index else None,
+                1 << (last_placed_index - 1) if last_placed_index else None,
+                last_board_shift_turn, ability_uses)
+
+    def pack_state(self, state):
+        """Encodes a state (board, levels, turn, abilities, block, bookkeeping) as a few bytes."""
+        cells = self.geometry.cell_count
+        return (self._pack_masks(state.x_mask, state.o_mask, state.levels & self.geometry.full_mask, state.levels >> cells)
+                + self._pack_scalars(state.snapshot()[3:]))
+
+    def unpack_state(self, data):
+        """Decodes a pack_state encoding into a new GameState, rebuilding its line counters."""
+        x_mask, o_mask, low_levels, high_levels = self._unpack_masks(data, 0, 4)
+        current_player, blocked_line, last_placed, last_board_shift_turn, ability_uses = self._unpack_scalars(
+            data, self._packed_masks_size(4))
+        abilities = {player: {ability: ability_uses[player_index * len(ABILITY_TYPES) + ability_index]
+                              for ability_index, ability in enumerate(ABILITY_TYPES)}
+                     for player_index, player in enumerate((PLAYER_X, PLAYER_O))}
+        state = GameState(self.geometry, x_mask, o_mask, low_levels | (high_levels << self.geometry.cell_count),
+                          current_player, abilities, blocked_line, last_placed, last_board_shift_turn)
+        self.recount(state)
+        return state
+
+    def _counted_owner(self, state, bit):
+        """Returns the player whose mark on `bit` counts towards lines (it must have evolved under 'Evolve'), or None."""
+        if self.evolve and not state.levels & (bit | (bit << self.geometry.cell_count)):
+            return None
+        if state.x_mask & bit:
+            return PLAYER_X
+        if state.o_mask & bit:
+            return PLAYER_O
+        return None
+
+    def _update_lines(self, state, bit, owner_before):
+        """Moves the counts of the lines through `bit` from its previous counted owner to its current one."""
+        owner_after = self._counted_owner(state, bit)
+        if owner_after == owner_before:
+            return
+        win_length = self.geometry.win_length
+        for index in self.geometry.cell_line_indices[bit.bit_length() - 1]:
+            if owner_before is not None:
+                counts = state.line_counts[owner_before]
+                if counts[index] == win_length:
+                    state.completed_lines[owner_before] -= 1
+                counts[index] -= 1
+            if owner_after is not None:
+                counts = state.line_counts[owner_after]
+                counts[index] += 1
+                if counts[index] == win_length:
+                    state.completed_lines[owner_after] += 1
+
+    def recount(self, state):
+        """Rebuilds a state's line counters from its masks (after a board shift or building a state by hand)."""
+        win_length = self.geometry.win_length
+        evolved = self.geometry.evolved_mask(state.levels) if self.evolve else self.geometry.full_mask
+        for player in (PLAYER_X, PLAYER_O):
+            player_mask = state.player_mask(player) & evolved
+            counts = [_popcount(player_mask & line) for line in self.geometry.line_masks]
+            state.line_counts[player] = counts
+            state.completed_lines[player] = counts.count(win_length)
+
+    def gravity_row(self, state, col):
+        """Returns the lowest empty row of `col`, or None if the column is full."""
+        bit = self.geometry.gravity_bit(state.occupied, col)
+        return self.geometry.bit_to_coords(bit)[0] if bit else None
+
+    def target_cell(self, state, r, c):
+        """Returns the bit a click on (r, c) places a mark on (the column's lowest empty cell under 'Gravity'), or 0 if none."""
+        if self.gravity:
+            return self.geometry.gravity_bit(state.occupied, c)
+        bit = self.geometry.cell_bit(r, c)
+        return 0 if state.occupied & bit else bit
+
+    def legal_moves(self, state):
+        """Returns the bits of every cell the current player may place a mark on."""
+        return self.geometry.legal_move_bits(state.occupied, self.gravity)
+
+    def place_mark(self, state, bit):
+        """
+        Places the current player's mark on `bit`, raising its evolve level under 'Evolve'.
+        Returns False (and leaves the state unchanged) if the cell is already at the max level.
+        """
+        if self.evolve and state.levels & bit and state.levels & (bit << self.geometry.cell_count):
+            return False
+        owner_before = self._counted_owner(state, bit)
+        if self.evolve:
+            state.levels = self.geometry.bump_level(state.levels, bit)
+        if state.current_player == PLAYER_X:
+            state.x_mask |= bit
+            state.o_mask &= ~bit
+        else:
+            state.o_mask |= bit
+            state.x_mask &= ~bit
+        state.last_placed = bit
+        self._update_lines(state, bit, owner_before)
+        return True
+
+    def winning_lines(self, state, player):
+        """Returns the masks of the winning lines `player` has completed (only evolved marks count under 'Evolve')."""
+        counts = state.line_counts[player]
+        win_length = self.geometry.win_length
+        return [line for index, line in enumerate(self.geometry.line_masks) if counts[index] == win_length]
+
+    def check_win(self, state, player):
+        """
+        Returns WIN if `player` has a winning line. Under 'Abilities' a win on the blocked line is
+        cancelled instead: the block is used up and BLOCKED is returned. Otherwise returns None.
+        Answered from the line counters in O(1).
+        """
+        if self.abilities and state.blocked_line is not None:
+            blocked_index = self.geometry.line_index[state.blocked_line]
+            if state.line_counts[player][blocked_index] == self.geometry.win_length:
+                state.blocked_line = None # Clear the block after it's used
+                return BLOCKED
+        return WIN if state.completed_lines[player] else None
+
+    def is_draw(self, state):
+        """A game is drawn once no cell is empty (a single mask comparison)."""
+        return state.occupied == self.geometry.full_mask
+
+    def end_turn(self, state):
+        """
+        Passes the turn to the other player and applies 'Board Shift' (every 5 filled cells
+        since the last shift). Returns True if the board shifted.
+        """
+        state.current_player = state.opponent
+        if self.board_shift:
+            filled_cells = state.filled_count()
+            if filled_cells > 0 and (filled_cells - state.last_board_shift_turn) % 5 == 0:
+                self.shift_board(state)
+                state.last_board_shift_turn = filled_cells
+                return True
+        return False
+
+    def shift_board(self, state):
+        """Moves every row up by one: the top row is lost and an empty row appears at the bottom."""
+        cols, cells = self.geometry.cols, self.geometry.cell_count
+        state.x_mask >>= cols
+        state.o_mask >>= cols
+        state.levels = ((state.levels & self.geometry.full_mask) >> cols) | (((state.levels >> cells) >> cols) << cells)
+        self.recount(state) # Every cell moved, so rebuild the counters (once every few turns at most)
+
+    def remove_mark(self, state, bit):
+        """Clears a cell together with its evolve level."""
+        owner_before = self._counted_owner(state, bit)
+        state.x_mask &= ~bit
+        state.o_mask &= ~bit
+        state.levels &= ~(bit | (bit << self.geometry.cell_count))
+        self._update_lines(state, bit, owner_before)
+
+    def swap_cells(self, state, bit_a, bit_b):
+        """Exchanges the marks and evolve levels of two cells."""
+        cells = self.geometry.cell_count
+        owner_a, owner_b = self._counted_owner(state, bit_a), self._counted_owner(state, bit_b)
+        state.x_mask = _swap_bits(state.x_mask, bit_a, bit_b)
+        state.o_mask = _swap_bits(state.o_mask, bit_a, bit_b)
+        state.levels = _swap_bits(state.levels, bit_a, bit_b)
+        state.levels = _swap_bits(state.levels, bit_a << cells, bit_b << cells)
+        self._update_lines(state, bit_a, owner_a)
+        self._update_lines(state, bit_b, owner_b)
+
+    def apply_move_record(self, state, record, forward):
+        """
+        Replays (forward=True) or reverts a MoveRecord on `state`. The board changes are XOR deltas,
+        so both directions cost a few integer operations plus a counter update per changed cell.
+        """
+        cells = self.geometry.cell_count
+        changed = record.x_delta | record.o_delta | ((record.levels_delta | (record.levels_delta >> cells)) & self.geometry.full_mask)
+        changed_bits = []
+        while changed:
+            bit = changed & -changed
+            changed_bits.append((bit, self._counted_owner(state, bit)))
+            changed ^= bit
+        state.x_mask ^= record.x_delta
+        state.o_mask ^= record.o_delta
+        state.levels ^= record.levels_delta
+        for bit, owner_before in changed_bits:
+            self._update_lines(state, bit, owner_before)
+        (state.current_player, state.blocked_line, state.last_placed, state.last_board_shift_turn,
+         ability_uses) = record.after if forward else record.before
+        if record.after[4] != record.before[4]:
+            for index, uses in enumerate(ability_uses):
+                player = PLAYER_X if index < len(ABILITY_TYPES) else PLAYER_O
+                state.abilities[player][ABILITY_TYPES[index % len(ABILITY_TYPES)]] = uses
+
+    def spend_ability(self, state, ability_type):
+        """Uses up one of the current player's uses of an ability."""
+        state.abilities[state.current_player][ability_type] -= 1
+
+    def potential_winning_lines(self, player):
+        """All lines that could win the game for `player`, as masks."""
+        return list(self.geometry.line_masks)
+
+    def block_random_line(self, state, rng=random):
+        """Blocks a random potential winning line of the opponent; returns the blocked mask or None."""
+        lines = self.potential_winning_lines(state.opponent)
+        state.blocked_line = rng.choice(lines) if lines else None
+        return state.blocked_line
+
+# --- Move History ---
+class MoveRecord:
+    """
+    One turn in the move log: XOR deltas of both mark masks and the evolve level planes (covering
+    placements, removals, swaps and board shifts alike) plus the turn, block, bookkeeping and
+    ability uses before and after the turn.
+    """
+    __slots__ = ("x_delta", "o_delta", "levels_delta", "before", "after")
+
+    def __init__(self, x_delta, o_delta, levels_delta, before, after):
+        self.x_delta = x_delta
+        self.o_delta = o_delta
+        self.levels_delta = levels_delta
+        self.before = before
+        self.after = after
+
+class MoveLog:
+    """
+    Reversible history of a game as MoveRecords, with O(1) undo and redo. With a `limit`, the
+    oldest records are dropped once it is reached (a ring buffer), bounding per-session memory.
+    """
+    def __init__(self, limit=None):
+        self._undo = deque(maxlen=limit)
+        self._redo = []
+
+    def __len__(self):
+        return len(self._undo)
+
+    def record(self, before, state):
+        """
+        Logs the turn that took `state` from the `before` snapshot (GameState.snapshot) to its
+        current contents. Turns that changed nothing are not logged. Clears the redo history.
+        """
+        after = state.snapshot()
+        if after == before:
+            return None
+        entry = MoveRecord(before[0] ^ after[0], before[1] ^ after[1], before[2] ^ after[2], before[3:], after[3:])
+        self._undo.append(entry)
+        self._redo.clear()
+        return entry
+
+    def can_undo(self):
+        return bool(self._undo)
+
+    def can_redo(self):
+        return bool(self._redo)
+
+    def undo(self, rules, state):
+        """Reverts the most recent turn on `state`. Returns False if there is nothing to undo."""
+        if not self._undo:
+            return False
+        entry = self._undo.pop()
+        rules.apply_move_record(state, entry, forward=False)
+        self._redo.append(entry)
+        return True
+
+    def redo(self, rules, state):
+        """Replays the most recently undone turn on `state`. Returns False if there is nothing to redo."""
+        if not self._redo:
+            return False
+        entry = self._redo.pop()
+        rules.apply_move_record(state, entry, forward=True)
+        self._undo.append(entry)
+        return True
+
+    def clear(self):
+        self._undo.clear()
+        self._redo.clear()
+
+    # Packed form: undo and redo record counts, then each record as its four delta masks and the
+    # before and after scalar fields in Rules' packed encoding
+    def pack(self, rules):
+        """Encodes the log (undo and redo sides) as bytes; see Rules.pack_state for the field layout."""
+        parts = [struct.pack("<HH", len(self._undo), len(self._redo))]
+        cells = rules.geometry.cell_count
+        for entry in (*self._undo, *self._redo):
+            parts.append(rules._pack_masks(entry.x_delta, entry.o_delta, entry.levels_delta & rules.geometry.full_mask,
+                                           entry.levels_delta >> cells))
+            parts.append(rules._pack_scalars(entry.before))
+            parts.append(rules._pack_scalars(entry.after))
+        return b"".join(parts)
+
+    @classmethod
+    def unpack(cls, rules, data, limit=None):
+        """Decodes a pack encoding into a new MoveLog."""
+        log = cls(limit)
+        undo_count, redo_count = struct.unpack_from("<HH", data, 0)
+        offset = struct.calcsize("<HH")
+        record_size = rules._packed_masks_size(4) + 2 * PACKED_SCALARS_SIZE
+        entries = []
+        for _ in range(undo_count + redo_count):
+            x_delta, o_delta, low_delta, high_delta = rules._unpack_masks(data, offset, 4)
+            scalars_offset = offset + rules._packed_masks_size(4)
+            entries.append(MoveRecord(x_delta, o_delta, low_delta | (high_delta << rules.geometry.cell_count),
+                                      rules._unpack_scalars(data, scalars_offset),
+                                      rules._unpack_scalars(data, scalars_offset + PACKED_SCALARS_SIZE)))
+            offset += record_size
+        log._undo.extend(entries[:undo_count])
+        log._redo.extend(entries[undo_count:])
+        return log
+
+# Bound types stored with each transposition table score under alpha-beta pruning
+EXACT, LOWER_BOUND, UPPER_BOUND = 0, 1, 2
+
+class TranspositionTable:
+    """
+    Bounded cache of search results keyed by BoardGeometry.canonical_key, evicting the least
+    recently used entry when full. Kept in session state so it is reused across moves of a game.
+    """
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self.entries = OrderedDict() # key -> (searched_depth, score, bound_type)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, depth):
+        """Returns the stored (depth, score, bound_type) if it was searched at least `depth` plies deep, else None."""
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] >= depth:
+            self.entries.move_to_end(key) # Mark as recently used
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, key, depth, score, bound_type=EXACT):
+        """Stores a score searched `depth` plies deep, evicting the oldest entry if full."""
+        self.entries[key] = (depth, score, bound_type)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Returns the table's counters for inspection (e.g. from a debug view)."""
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+OPENING_BOOK_MAX_ENTRIES = 100000
+OPENING_BOOK_MAX_FILLED = 4 # Positions with at most this many marks count as openings
+
+class OpeningBook:
+    """
+    Process-wide cache of Smart Bot moves for opening positions, shared by every session. Keyed by
+    BoardGeometry.canonical_key (which covers the board shape and the twists the search depends
+    on, 'Gravity' and 'Evolve') with moves stored in canonical orientation, so all symmetric
+    variants of an opening share one entry. Filled lazily from search results and bounded by LRU
+    eviction; optionally loaded from and saved to a JSON lines file. Safe to use from several threads.
+    """
+    def __init__(self, max_entries=OPENING_BOOK_MAX_ENTRIES, max_filled=OPENING_BOOK_MAX_FILLED, path=None,
+                 save_every=100):
+        self.max_entries = max_entries
+        self.max_filled = max_filled
+        self.path = path
+        self.save_every = save_every # New entries between saves to `path`
+        self.entries = OrderedDict() # canonical key -> (canonical move bit, time budget it was searched with)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._unsaved = 0
+        self._lock = threading.Lock()
+
+    def _key(self, rules, state):
+        """Returns (canonical key, symmetry row tables), or None if the position is not an opening."""
+        if state.filled_count() > self.max_filled:
+            return None
+        return rules.geometry.canonical_form(state.x_mask, state.o_mask, state.levels,
+                                             state.current_player == PLAYER_O, rules.gravity, rules.evolve)
+
+    def lookup(self, rules, state, time_budget_ms):
+        """
+        Returns the stored move (a bit in the state's own orientation) for an opening position that
+        was searched with at least `time_budget_ms`, or 0.
+        """
+        key = self._key(rules, state)
+        if key is None:
+            return 0
+        key, row_tables = key
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[1] < time_budget_ms:
+                self.misses += 1
+                return 0
+            self.entries.move_to_end(key) # Mark as recently used
+            self.hits += 1
+        return rules.geometry.untransform_bit(row_tables, entry[0])
+
+    def store(self, rules, state, bit, time_budget_ms):
+        """Records the move searched for an opening position, keeping the result of the longest search."""
+        key = self._key(rules, state)
+        if key is None or not bit:
+            return
+        key, row_tables = key
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[1] >= time_budget_ms:
+                return
+            self.entries[key] = (rules.geometry.transform_bit(row_tables, bit), time_budget_ms)
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self._unsaved += 1
+            save = self.path is not None and self._unsaved >= self.save_every
+        if save:
+            self.save()
+
+    def load(self, path=None):
+        """Warm-starts the book from a file written by save; a missing file is ignored."""
+        import json
+        path = path if path is not None else self.path
+        try:
+            with open(path) as book_file:
+                records = [json.loads(line) for line in book_file if line.strip()]
+        except FileNotFoundError:
+            return
+        with self._lock:
+            for record in records[-self.max_entries:]:
+                *key, move_index, time_budget_ms = record
+                self.entries[tuple(key)] = (1 << move_index, time_budget_ms)
+
+    def save(self, path=None):
+        """Writes every entry as one JSON line, least recently used first, replacing the file atomically."""
+        import json
+        path = path if path is not None else self.path
+        with self._lock:
+            records = [[*key, bit.bit_length() - 1, time_budget_ms] for key, (bit, time_budget_ms) in self.entries.items()]
+            self._unsaved = 0
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as book_file:
+            for record in records:
+                book_file.write(json.dumps(record) + "\n")
+        os.replace(temp_path, path)
+
+    def stats(self):
+        """Returns the book's counters for inspection (e.g. from a debug view)."""
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+# --- Smart Bot Search ---
+# Scores are from the side to move's point of view. A win found `ply` plies below the root scores
+# WIN_SCORE - ply, so quicker wins (and slower losses) are preferred; anything beyond
+# MATE_THRESHOLD is such a win/loss score and is stored in the table relative to its node.
+# Positions at the search horizon are scored by open lines, always well below MATE_THRESHOLD.
+WIN_SCORE = 1000000
+MATE_THRESHOLD = WIN_SCORE // 2
+DEFAULT_BOT_TIME_BUDGET_MS = 250
+
+class SearchTimeout(Exception):
+    """Raised inside the search once the wall-clock budget has run out."""
+
+class SmartBotSearch:
+    """
+    Iterative-deepening alpha-beta (negamax) search over bitboard positions. Each iteration
+    searches one ply deeper until the position is solved or `time_budget_ms` runs out, and the
+    best move of the last completed iteration is returned, so latency stays bounded. An optional
+    `max_depth` stops the deepening early, making the move independent of machine speed.
+    """
+    def __init__(self, rules, table, time_budget_ms=DEFAULT_BOT_TIME_BUDGET_MS, max_depth=None):
+        self.geometry = rules.geometry
+        self.gravity = rules.gravity
+        self.evolve = rules.evolve
+        self.table = table
+        self.time_budget_ms = time_budget_ms
+        self.max_depth = max_depth
+        self.deadline = None # perf_counter() value after which the search aborts; None while unbounded
+        self.full_win_checks = False # Set when the root already has a completed line somewhere
+        self.killers = [[0, 0] for _ in range(self.geometry.cell_count + 1)] # Two cutoff moves remembered per ply
+        self.history = {} # cell bit -> accumulated cutoff weight across the whole search
+        self.nodes = 0
+        self.depth_reached = 0
+
+    def best_move(self, x_mask, o_mask, levels, o_to_move):
+        """Returns the bit of the best move found within the time budget, or None if there is no legal move."""
+        start = time.perf_counter()
+        geometry = self.geometry
+        moves = self._order_moves(geometry.legal_move_bits(x_mask | o_mask, self.gravity), 0)
+        if not moves:
+            return None
+        # Nodes normally only check the lines through the move just played; a line that already
+        # exists at the root (e.g. left by a swap) needs the full check everywhere below it
+        self.full_win_checks = (geometry.has_winning_line(x_mask, levels, self.evolve)
+                                or geometry.has_winning_line(o_mask, levels, self.evolve))
+        best_bit = moves[0]
+        max_depth = geometry.cell_count - _popcount(x_mask | o_mask) # Every empty cell filled
+        if self.max_depth is not None:
+            max_depth = min(max_depth, self.max_depth)
+        for depth in range(1, max_depth + 1):
+            # The first iteration always completes so there is a searched move to return
+            self.deadline = None if depth == 1 else start + self.time_budget_ms / 1000.0
+            try:
+                score, best_bit = self._search_root(x_mask, o_mask, levels, o_to_move, depth, moves)
+            except SearchTimeout:
+                break
+            self.depth_reached = depth
+            moves.remove(best_bit)
+            moves.insert(0, best_bit) # Search the previous best move first in the next iteration
+            if abs(score) > MATE_THRESHOLD:
+                break # A forced result does not change with more depth
+        return best_bit
+
+    def _search_root(self, x_mask, o_mask, levels, o_to_move, depth, moves):
+        """Searches every root move to `depth` plies and returns (best_score, best_bit)."""
+        alpha, beta = -WIN_SCORE - 1, WIN_SCORE + 1
+        best_score, best_bit = -WIN_SCORE - 1, moves[0]
+        for bit in moves:
+            score = -self._minimax(*self._play(x_mask, o_mask, levels, o_to_move, bit), not o_to_move,
+                                   depth - 1, 1, -beta, -alpha, bit)
+            if score > best_score:
+                best_score, best_bit = score, bit
+            alpha = max(alpha, score)
+        return best_score, best_bit
+
+    def _play(self, x_mask, o_mask, levels, o_to_move, bit):
+        """Returns the (x_mask, o_mask, levels) after the side to move places a mark on `bit`."""
+        if self.evolve:
+            levels = self.geometry.bump_level(levels, bit)
+        if o_to_move:
+            return x_mask, o_mask | bit, levels
+        return x_mask | bit, o_mask, levels
+
+    def _evaluate(self, x_mask, o_mask, o_to_move):
+        """Horizon score for the side to move: lines still open to only one player, weighted by how full they are."""
+        score = 0
+        for line in self.geometry.line_masks:
+            x_count = _popcount(x_mask & line)
+            o_count = _popcount(o_mask & line)
+            if x_count and not o_count:
+                score -= 1 << (2 * x_count)
+            elif o_count and not x_count:
+                score += 1 << (2 * o_count)
+        return score if o_to_move else -score
+
+    def _minimax(self, x_mask, o_mask, levels, o_to_move, depth, ply, alpha, beta, last_bit):
+        """Alpha-beta negamax; returns the score of the position for the side to move."""
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 255 and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+        geometry = self.geometry
+        # Base cases: as before, an O line is checked before an X line
+        if self.full_win_checks:
+            o_won = geometry.has_winning_line(o_mask, levels, self.evolve)
+            x_won = not o_won and geometry.has_winning_line(x_mask, levels, self.evolve)
+        else:
+            # Only the player who just moved can have completed a line, and only through `last_bit`
+            o_won = not o_to_move and geometry.wins_through(o_mask, levels, self.evolve, last_bit)
+            x_won = o_to_move and geometry.wins_through(x_mask, levels, self.evolve, last_bit)
+        if o_won:
+            return WIN_SCORE - ply if o_to_move else ply - WIN_SCORE
+        if x_won:
+            return ply - WIN_SCORE if o_to_move else WIN_SCORE - ply
+        occupied = x_mask | o_mask
+        if occupied == geometry.full_mask: # Draw
+            return 0
+        if depth <= 0:
+            return self._evaluate(x_mask, o_mask, o_to_move)
+
+        # Every ply fills a cell, so a search covering all empty cells is exact at any depth
+        empty_cells = geometry.cell_count - _popcount(occupied)
+        searched_depth = depth if depth < empty_cells else geometry.cell_count
+        key = geometry.canonical_key(x_mask, o_mask, levels, o_to_move, self.gravity, self.evolve)
+        entry = self.table.get(key, min(depth, empty_cells))
+        if entry is not None:
+            score = entry[1]
+            if score > MATE_THRESHOLD:
+                score -= ply
+            elif score < -MATE_THRESHOLD:
+                score += ply
+            if entry[2] == EXACT:
+                return score
+            if entry[2] == LOWER_BOUND:
+                alpha = max(alpha, score)
+            else:
+                beta = min(beta, score)
+            if alpha >= beta:
+                return score
+
+        original_alpha = alpha
+        best = -WIN_SCORE - 1
+        for bit in self._order_moves(geometry.legal_move_bits(occupied, self.gravity), ply):
+            score = -self._minimax(*self._play(x_mask, o_mask, levels, o_to_move, bit), not o_to_move,
+                                   depth - 1, ply + 1, -beta, -alpha, bit)
+            if score > best:
+                best = score
+            if best > alpha:
+                alpha = best
+            if alpha >= beta:
+                self._record_cutoff(bit, ply, depth)
+                break
+
+        if best <= original_alpha:
+            bound_type = UPPER_BOUND
+        elif best >= beta:
+            bound_type = LOWER_BOUND
+        else:
+            bound_type = EXACT
+        # Win/loss scores are stored relative to this node so they stay valid at any ply
+        stored = best + ply if best > MATE_THRESHOLD else best - ply if best < -MATE_THRESHOLD else best
+        self.table.put(key, searched_depth, stored, bound_type)
+        return best
+
+    def _order_moves(self, moves, ply):
+        """Orders moves: killer moves for this ply, then by history weight, then center/corners/edges."""
+        killers = self.killers[ply]
+        move_rank = self.geometry.move_rank
+        return sorted(moves, key=lambda bit: (bit not in killers, -self.history.get(bit, 0), move_rank[bit]))
+
+    def _record_cutoff(self, bit, ply, depth):
+        """Remembers a move that caused a beta cutoff as a killer for its ply and in the history table."""
+        killers = self.killers[ply]
+        if killers[0] != bit:
+            killers[1] = killers[0]
+            killers[0] = bit
+        self.history[bit] = self.history.get(bit, 0) + depth * depth
+
+# --- Parallel Root-Split Search ---
+# Searches worth spreading over several cores: larger boards or long budgets, with enough of the
+# game left. Anything smaller finishes faster in one process than the pool round trips take.
+PARALLEL_MIN_CELLS = 16 # 4x4 boards and up
+PARALLEL_MIN_BUDGET_MS = 1000 # ...or a budget this long on any board
+PARALLEL_MIN_EMPTY_CELLS = 8
+PARALLEL_MAX_WORKERS = 8
+PARALLEL_BOUND_SLOTS = 64 # Parallel searches that can run at once (each needs its own shared bound)
+PARALLEL_RESULT_GRACE = 0.05 # Seconds past the deadline to wait for workers before abandoning an iteration
+NO_BOUND = -WIN_SCORE - 1
+
+_search_pool = None
+_search_pool_lock = threading.Lock()
+_bound_slots = None # multiprocessing.Array of each running search's best root score so far
+_bound_owners = None # ...and the id of the search iteration each slot belongs to, guarded by the same lock
+_free_bound_slots = []
+_search_ids = itertools.count(1)
+
+_worker_bounds = None
+_worker_owners = None
+
+def parallel_search_workers():
+    """Worker processes the parallel search uses here: 0 on a single core or inside a daemon process (a pool worker)."""
+    import multiprocessing
+    if multiprocessing.current_process().daemon:
+        return 0
+    cores = os.cpu_count() or 1
+    return min(cores, PARALLEL_MAX_WORKERS) if cores > 1 else 0
+
+def get_search_pool(workers=None):
+    """
+    Process-wide pool of search workers, started on first use (workers are spawned, so the pool is
+    safe to start from a threaded server). Returns None where parallel search cannot run.
+    """
+    global _search_pool, _bound_slots, _bound_owners
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    with _search_pool_lock:
+        if _search_pool is None:
+            workers = workers if workers is not None else parallel_search_workers()
+            if workers < 1:
+                return None
+            context = multiprocessing.get_context("spawn")
+            _bound_slots = context.Array("q", PARALLEL_BOUND_SLOTS)
+            _bound_owners = context.Array("q", PARALLEL_BOUND_SLOTS, lock=False)
+            _free_bound_slots.extend(range(PARALLEL_BOUND_SLOTS))
+            _search_pool = ProcessPoolExecutor(workers, mp_context=context, initializer=_init_search_worker,
+                                               initargs=(_bound_slots, _bound_owners))
+            atexit.register(_search_pool.shutdown, cancel_futures=True)
+        return _search_pool
+
+def _init_search_worker(bounds, owners):
+    global _worker_bounds, _worker_owners
+    _worker_bounds = bounds
+    _worker_owners = owners
+
+def _search_root_move(task):
+    """
+    Pool worker: searches one root move and returns (score, exact, nodes), with score None if the
+    deadline passed first. The window starts just below the best root score other workers have
+    found, so moves that cannot beat it are cut off, while a move that ties it still gets an
+    exact score. Every task searches with a fresh transposition table, so the scores depend only on
+    the position and not on what the worker searched before. A task whose search has moved on
+    (its slot now belongs to another search id) returns None without searching.
+    """
+    (rows, cols, win_length, gravity, evolve, x_mask, o_mask, levels, o_to_move, bit, depth, full_win_checks,
+     slot, search_id, remaining, submitted) = task
+    with _worker_bounds.get_lock():
+        if _worker_owners[slot] != search_id:
+            return None, False, 0
+        alpha = max(_worker_bounds[slot] - 1, NO_BOUND)
+    rules = Rules({"Gravity Tic-Tac-Toe": gravity, "Evolve Tic-Tac-Toe": evolve}, rows, cols, win_length)
+    search = SmartBotSearch(rules, TranspositionTable())
+    search.full_win_checks = full_win_checks
+    if remaining is not None:
+        search.deadline = time.perf_counter() + remaining - (time.time() - submitted)
+    try:
+        score = -search._minimax(*search._play(x_mask, o_mask, levels, o_to_move, bit), not o_to_move,
+                                 depth - 1, 1, -WIN_SCORE - 1, -alpha, bit)
+    except SearchTimeout:
+        return None, False, search.nodes
+    with _worker_bounds.get_lock():
+        if _worker_owners[slot] == search_id and score > _worker_bounds[slot]:
+            _worker_bounds[slot] = score
+    return score, score > alpha, search.nodes
+
+def wants_parallel_search(rules, state, time_budget_ms, max_depth=None):
+    """Whether a Smart Bot search of `state` is expensive enough to be worth the pool (and the pool can run)."""
+    if max_depth is not None:
+        return False # Depth-capped searches stay serial so that their moves stay reproducible
+    geometry = rules.geometry
+    if geometry.cell_count < PARALLEL_MIN_CELLS and time_budget_ms < PARALLEL_MIN_BUDGET_MS:
+        return False
+    # Checked last, so small boards never load multiprocessing
+    return geometry.cell_count - state.filled_count() >= PARALLEL_MIN_EMPTY_CELLS and parallel_search_workers() > 0
+
+class ParallelSmartBotSearch(SmartBotSearch):
+    """
+    SmartBotSearch whose iterations from depth 2 on search the root moves in parallel on the shared
+    search pool, with the best root score so far shared between workers for cutoffs. Equal scores
+    are resolved by move order (as in the serial search), not by which worker finished first. Runs
+    serially if the pool cannot run or every shared bound is taken.
+    """
+    def __init__(self, rules, table, time_budget_ms=DEFAULT_BOT_TIME_BUDGET_MS, max_depth=None, pool=None):
+        super().__init__(rules, table, time_budget_ms, max_depth)
+        self.pool = pool
+        self.slot = None
+
+    def best_move(self, x_mask, o_mask, levels, o_to_move):
+        self.pool = self.pool if self.pool is not None else get_search_pool()
+        if self.pool is not None:
+            with _search_pool_lock:
+                self.slot = _free_bound_slots.pop() if _free_bound_slots else None
+        try:
+            return super().best_move(x_mask, o_mask, levels, o_to_move)
+        finally:
+            if self.slot is not None:
+                with _search_pool_lock:
+                    _free_bound_slots.append(self.slot)
+                self.slot = None
+
+    def _search_root(self, x_mask, o_mask, levels, o_to_move, depth, moves):
+        if self.slot is None or depth == 1 or len(moves) < 2:
+            return super()._search_root(x_mask, o_mask, levels, o_to_move, depth, moves)
+        from concurrent.futures import wait
+        # A new id per iteration: tasks abandoned by an earlier iteration or search in this slot
+        # can no longer read or raise its bound
+        search_id = next(_search_ids)
+        with _bound_slots.get_lock():
+            _bound_owners[self.slot] = search_id
+            _bound_slots[self.slot] = NO_BOUND
+        geometry = self.geometry
+        remaining = None if self.deadline is None else self.deadline - time.perf_counter()
+        submitted = time.time()
+        futures = [self.pool.submit(_search_root_move, (
+            geometry.rows, geometry.cols, geometry.win_length, self.gravity, self.evolve, x_mask, o_mask, levels,
+            o_to_move, bit, depth, self.full_win_checks, self.slot, search_id, remaining, submitted)) for bit in moves]
+        done, pending = wait(futures, None if remaining is None else max(0.0, remaining) + PARALLEL_RESULT_GRACE)
+        for future in pending:
+            future.cancel()
+        results = [future.result() if future in done else (None, False, 0) for future in futures]
+        self.nodes += sum(nodes for _, _, nodes in results)
+        if pending or any(score is None for score, _, _ in results):
+            raise SearchTimeout()
+        # Only moves that beat (or tie) the bound they were searched with have exact scores; the
+        # best move always does. Ties go to the earlier move in the search order.
+        best_score, best_bit = NO_BOUND, moves[0]
+        for bit, (score, exact, _) in zip(moves, results):
+            if exact and score > best_score:
+                best_score, best_bit = score, bit
+        if best_score == NO_BOUND:
+            raise SearchTimeout() # No exact score (never expected): keep the previous iteration's move
+        return best_score, best_bit
+
+# --- Bot Move Selection ---
+def choose_basic_move(rules, state, rng=random):
+    """Basic bot logic: a random legal placement (bit), or 0 if there is none."""
+    moves = rules.legal_moves(state)
+    return rng.choice(moves) if moves else 0
+
+def choose_smart_move(rules, state, table, time_budget_ms=DEFAULT_BOT_TIME_BUDGET_MS, max_depth=None, book=None,
+                      stats=None, parallel=None):
+    """
+    Smart bot logic: the shared tablebase's move if it has this position solved, then the opening
+    book's move if one is given and has it, otherwise the best move of an iterative-deepening
+    alpha-beta search (recorded in the book). Returns a bit, or 0 if there is no move. If a
+    `stats` dict is given, it is filled in with where the move came from ("source") and, for a
+    search, its nodes, depth reached and transposition table hits and misses. The search runs
+    on the parallel search pool when `parallel` is True, or by default when wants_parallel_search
+    finds the position expensive enough.
+    """
+    o_to_move = state.current_player == PLAYER_O
+    # The tablebase only covers the standard 3x3 board
+    tablebase = get_shared_tablebase() if rules.geometry is get_geometry() else None
+    if tablebase is not None:
+        solved = tablebase.lookup(state.x_mask, state.o_mask, rules.geometry.evolved_mask(state.levels), o_to_move,
+                                  rules.gravity, rules.evolve)
+        if solved is not None and solved[1] < rules.geometry.cell_count:
+            if stats is not None:
+                stats["source"] = "tablebase"
+            return 1 << solved[1]
+    if book is not None and max_depth is None:
+        bit = book.lookup(rules, state, time_budget_ms)
+        if bit:
+            if stats is not None:
+                stats["source"] = "book"
+            return bit
+    if parallel is None:
+        parallel = wants_parallel_search(rules, state, time_budget_ms, max_depth)
+    search_class = ParallelSmartBotSearch if parallel else SmartBotSearch
+    search = search_class(rules, table, time_budget_ms, max_depth)
+    hits, misses = table.hits, table.misses
+    bit = search.best_move(state.x_mask, state.o_mask, state.levels, o_to_move) or 0
+    if stats is not None:
+        stats.update(source="parallel_search" if parallel else "search", nodes=search.nodes, depth=search.depth_reached,
+                     cache_hits=table.hits - hits, cache_misses=table.misses - misses)
+    if book is not None and max_depth is None:
+        book.store(rules, state, bit, time_budget_ms)
+    return bit
@@ -0,0 +1,431 @@
+"""
+Property and fuzz harness for the rules engine.
+
+Plays random legal action sequences (placements, 'Tic-Tac-Undo' removals, 'Swap', 'Block' and
+'Remove' ability uses and Sudden Death timeouts, as the app allows them) under every twist
+combination across a process pool, with the turn semantics of game records (apply_action).
+After every turn it checks:
+
+- the board: no cell holds both marks, nothing off the board, evolve levels only on marks
+  (and none without 'Evolve'), the line counters equal a recount from the masks;
+- the bookkeeping: ability uses between zero and the starting count, the blocked line is a real
+  line (and only under 'Abilities'), a 'Board Shift' leaves the bottom row empty, a placement
+  that did not shift the board added exactly the mover's mark;
+- the encodings: pack_state/unpack_state and the move log's undo/redo give back the same state.
+
+On sampled positions with few empty cells the Smart Bot's move (choose_smart_move, tablebase
+included) is checked against an exhaustive search of the placement-only game it models.
+
+A failing sequence is shrunk (dropping runs of turns, then twists, while the same check still
+fails) and saved as a game record, which replays here with --replay or in the app's "Replay a
+Recorded Game":
+
+    python fuzz.py --seconds 60 --failures fuzz_failures.bin
+    python fuzz.py --replay fuzz_failures.bin
+
+Every turn of every sequence is checked, in pure Python, so throughput is far from millions of
+sequences a minute: at the defaults one core runs about 4,000 actions a second (roughly 20,000
+sequences a minute), and the checks take over half of that time. Sequences are independent, so
+the rate grows with --workers.
+"""
+import argparse
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from engine import (
+    PLAYER_X, PLAYER_O, TWIST_NAMES, BOARD_SIZE, WIN,
+    MoveLog, Rules, TranspositionTable, choose_smart_move,
+)
+from gamerecord import (
+    PLACE, UNDO_MARK, SWAP, BLOCK, REMOVE, TIMEOUT, ACTION_NAMES,
+    GameRecord, apply_action, read_records,
+)
+from simulate import twist_combinations
+
+DEFAULT_MAX_TURNS = 60 # 'Board Shift' and removals keep games going, so sequences are cut off here
+DEFAULT_BATCH_SIZE = 200 # Sequences per pool task
+DEFAULT_ORACLE_RATE = 0.02 # Share of sequences whose first eligible position is checked against the oracle
+DEFAULT_ORACLE_MAX_EMPTY = 7 # Oracle positions have at most this many empty cells
+ORACLE_TIME_BUDGET_MS = 60000 # Lets the search run to the end on oracle positions
+FAILURES_PER_TASK = 3 # Failing sequences minimized per pool task; further failures are only counted
+
+# Chance per turn of each non-placement action, where the twists allow it
+UNDO_RATE = 0.05
+ABILITY_RATE = 0.08
+TIMEOUT_RATE = 0.01
+
+def _bits(mask):
+    """The single-bit masks set in `mask`."""
+    bits = []
+    while mask:
+        bit = mask & -mask
+        bits.append(bit)
+        mask ^= bit
+    return bits
+
+def twist_flags(twists):
+    """The twists dict for the names in `twists`."""
+    return {twist_name: twist_name in twists for twist_name in TWIST_NAMES}
+
+def random_action(rules, state, rng):
+    """A random action the app would let the side to move take, as (action, cell bits), or None if there is none."""
+    roll = rng.random()
+    uses = state.abilities[state.current_player]
+    if rules.sudden_death and roll < TIMEOUT_RATE:
+        return TIMEOUT, ()
+    own_marks = _bits(state.player_mask(state.current_player))
+    if rules.undo and own_marks and roll < UNDO_RATE:
+        return UNDO_MARK, (rng.choice(own_marks),)
+    available = [ability for ability in ('swap', 'block', 'remove') if uses[ability] > 0]
+    if rules.abilities and available and roll > 1 - ABILITY_RATE:
+        ability = rng.choice(available)
+        if ability == 'swap':
+            first, second = rng.sample(range(rules.geometry.cell_count), 2)
+            return SWAP, (1 << first, 1 << second)
+        if ability == 'block':
+            return BLOCK, ()
+        marks = _bits(state.occupied)
+        if marks:
+            return REMOVE, (rng.choice(marks),)
+    moves = rules.legal_moves(state)
+    return (PLACE, (rng.choice(moves),)) if moves else None
+
+def is_legal(rules, state, action, cells):
+    """Whether the app would let the side to move take `action` on `cells` (used when replaying shrunk sequences)."""
+    uses = state.abilities[state.current_player]
+    if action == PLACE:
+        return cells[0] in rules.legal_moves(state)
+    if action == UNDO_MARK:
+        return rules.undo and bool(state.player_mask(state.current_player) & cells[0])
+    if action == SWAP:
+        return rules.abilities and uses['swap'] > 0 and cells[0] != cells[1]
+    if action == BLOCK:
+        return rules.abilities and uses['block'] > 0
+    if action == REMOVE:
+        return rules.abilities and uses['remove'] > 0 and bool(state.occupied & cells[0])
+    return action == TIMEOUT and rules.sudden_death
+
+def check_state(rules, state, starting_uses):
+    """Returns (check, message) for the first invariant `state` breaks, or None."""
+    geometry = rules.geometry
+    full_mask, cells = geometry.full_mask, geometry.cell_count
+    if state.x_mask & state.o_mask:
+        return "board", "a cell holds both marks"
+    if state.occupied & ~full_mask:
+        return "board", "marks off the board"
+    if state.levels >> (2 * cells):
+        return "levels", "evolve levels off the board"
+    if ((state.levels | (state.levels >> cells)) & full_mask) & ~state.occupied:
+        return "levels", "evolve level on an empty cell"
+    if state.levels and not rules.evolve:
+        return "levels", "evolve levels without 'Evolve'"
+    for player in (PLAYER_X, PLAYER_O):
+        for ability, uses in state.abilities[player].items():
+            if not 0 <= uses <= starting_uses[player][ability]:
+                return "abilities", f"{player}'s {ability} uses at {uses}"
+    if state.blocked_line is not None and (not rules.abilities or state.blocked_line not in geometry.line_index):
+        return "block", "blocked line that is not a line under 'Abilities'"
+    counted = state.copy()
+    rules.recount(counted)
+    if counted.line_counts != state.line_counts or counted.completed_lines != state.completed_lines:
+        return "counters", "line counters out of step with the board"
+    try:
+        unpacked = rules.unpack_state(rules.pack_state(state))
+    except Exception as error:
+        return "packing", f"pack_state/unpack_state raised {error!r}"
+    if unpacked.snapshot() != state.snapshot():
+        return "packing", "unpack_state(pack_state(state)) differs from the state"
+    return None
+
+def check_turn(rules, state, action, cells, outcome, mover, filled_before, shift_turn_before):
+    """Returns (check, message) for a turn that did not do what it should, or None."""
+    geometry = rules.geometry
+    # Filled cells once the action is done, before the turn ends (and the board may shift)
+    filled = filled_before + (1 if action == PLACE else -1 if action in (UNDO_MARK, REMOVE) else 0)
+    ended_turn = outcome is None and action != TIMEOUT
+    shifted = rules.board_shift and ended_turn and filled > 0 and (filled - shift_turn_before) % 5 == 0
+    if ended_turn and state.current_player == mover:
+        return "turn", "the turn did not pass to the other player"
+    if shifted:
+        if state.last_board_shift_turn != filled:
+            return "shift", "'Board Shift' did not record the filled cell count"
+        if state.occupied >> (geometry.cell_count - geometry.cols):
+            return "shift", "bottom row not empty after 'Board Shift'"
+        return None
+    if state.last_board_shift_turn != shift_turn_before:
+        return "shift", "'Board Shift' bookkeeping changed without a shift"
+    if state.filled_count() != filled:
+        return "turn", f"{filled} cells should be filled, not {state.filled_count()}"
+    if action == PLACE and not state.player_mask(mover) & cells[0]:
+        return "place", "the placed cell does not hold the mover's mark"
+    return None
+
+def check_move_log(rules, state, log, before):
+    """Undoes and redoes the latest logged turn on a copy of `state`; returns (check, message) on a mismatch, or None."""
+    if log.record(before, state) is None:
+        return None
+    probe = state.copy()
+    log.undo(rules, probe)
+    if probe.snapshot() != before:
+        return "move log", "undo does not restore the state before the turn"
+    log.redo(rules, probe)
+    if probe.snapshot() != state.snapshot() or probe.line_counts != state.line_counts:
+        return "move log", "redo does not restore the state after the turn"
+    return None
+
+def oracle_value(rules, state, memo):
+    """Exact value (1 win, 0 draw, -1 loss) for the side to move when both sides only place marks."""
+    key = (state.x_mask, state.o_mask, state.levels, state.current_player)
+    if key in memo:
+        return memo[key]
+    best = -1
+    for bit in rules.legal_moves(state):
+        value = placement_value(rules, state, bit, memo)
+        if value > best:
+            best = value
+            if best == 1:
+                break
+    memo[key] = best
+    return best
+
+def placement_value(rules, state, bit, memo):
+    """Exact value for the side to move of placing on `bit`."""
+    child = state.copy()
+    rules.place_mark(child, bit)
+    if rules.check_win(child, child.current_player) == WIN:
+        return 1
+    if rules.is_draw(child):
+        return 0
+    child.current_player = child.opponent
+    return -oracle_value(rules, child, memo)
+
+def oracle_position(rules, state, max_empty):
+    """
+    The position as the Smart Bot search sees it (only 'Gravity' and 'Evolve' change how moves
+    resolve there) with its Rules, or None if it is unsuitable: decided, or too many empty cells.
+    """
+    empty = rules.geometry.cell_count - state.filled_count()
+    if not 0 < empty <= max_empty or state.completed_lines[PLAYER_X] or state.completed_lines[PLAYER_O]:
+        return None
+    search_rules = Rules(twist_flags([twist_name for twist_name, on in (("Gravity Tic-Tac-Toe", rules.gravity),
+                                                                         ("Evolve Tic-Tac-Toe", rules.evolve)) if on]),
+                         rules.geometry.rows, rules.geometry.cols, rules.geometry.win_length)
+    position = state.copy()
+    position.blocked_line = None
+    return search_rules, position
+
+def check_search(search_rules, position):
+    """Returns (check, message) if the Smart Bot's move is worse than the oracle's best, or None."""
+    memo = {}
+    best = oracle_value(search_rules, position, memo)
+    bit = choose_smart_move(search_rules, position, TranspositionTable(), ORACLE_TIME_BUDGET_MS, parallel=False)
+    if not bit:
+        return "search", "no move returned"
+    value = placement_value(search_rules, position, bit, memo)
+    if value != best:
+        names = {1: "win", 0: "draw", -1: "loss"}
+        return "search", (f"move {search_rules.geometry.bit_to_coords(bit)} is a {names[value]}, "
+                          f"the position is a {names[best]}")
+    return None
+
+def run_sequence(rules, record, rng=None, max_turns=DEFAULT_MAX_TURNS, oracle_rate=0.0,
+                 oracle_max_empty=DEFAULT_ORACLE_MAX_EMPTY):
+    """
+    Plays a sequence with every check after every turn. With `rng`, random actions are chosen
+    and appended to `record`; without, `record`'s turns are replayed (with --replay and while
+    shrinking), oracle checks on every suitable position when `oracle_rate` is 1. Returns
+    (turns played, failure) with failure = (turn, check, message) or None; replaying an action
+    the app would not allow fails with check "illegal".
+    """
+    state = rules.new_state()
+    starting_uses = {player: dict(uses) for player, uses in state.abilities.items()}
+    log = MoveLog()
+    turns = None if rng is not None else record.turns()
+    oracle_pending = rng is None or rng.random() < oracle_rate
+    turn = 0
+    while turn < max_turns:
+        if turns is None:
+            chosen = random_action(rules, state, rng)
+            if chosen is None:
+                break
+            action, cells = chosen
+            record.add(action, *cells)
+        else:
+            action, cells = next(turns, (None, None))
+            if action is None:
+                break
+            if not is_legal(rules, state, action, cells):
+                return turn, (turn, "illegal", f"{ACTION_NAMES[action]} is not allowed here")
+        mover, before, filled_before = state.current_player, state.snapshot(), state.filled_count()
+        shift_turn_before = state.last_board_shift_turn
+        try:
+            outcome = apply_action(rules, state, action, cells, record.seed, turn)
+        except Exception as error:
+            return turn + 1, (turn, "exception", f"{ACTION_NAMES[action]} raised {error!r}")
+        failure = (check_turn(rules, state, action, cells, outcome, mover, filled_before, shift_turn_before)
+                   or check_state(rules, state, starting_uses) or check_move_log(rules, state, log, before))
+        if failure is None and oracle_pending and outcome is None and oracle_rate > 0:
+            position = oracle_position(rules, state, oracle_max_empty)
+            if position is not None:
+                oracle_pending = rng is None
+                failure = check_search(*position)
+        if failure is not None:
+            return turn + 1, (turn, *failure)
+        turn += 1
+        if outcome is not None:
+            break
+    return turn, None
+
+def _replay_fails(record, check, max_turns, oracle_max_empty):
+    """Whether replaying `record` fails `check` (and not merely on an illegal action)."""
+    rules = record.rules()
+    _, failure = run_sequence(rules, record, max_turns=max_turns, oracle_rate=1.0 if check == "search" else 0.0,
+                              oracle_max_empty=oracle_max_empty)
+    return failure is not None and failure[1] == check
+
+def _with_turns(record, twists, turns):
+    shrunk = GameRecord(twists, record.rows, record.cols, record.win_length, seed=record.seed, started=record.started)
+    for action, cells in turns:
+        shrunk.add(action, *cells)
+    return shrunk
+
+def minimize(record, check, max_turns=DEFAULT_MAX_TURNS, oracle_max_empty=DEFAULT_ORACLE_MAX_EMPTY):
+    """
+    Shrinks a failing record: drops runs of turns (halving the run length down to single turns)
+    and then twists, keeping each cut that still fails `check`. Returns the smaller record.
+    """
+    turns = list(record.turns())
+    twists = dict(record.twists)
+    chunk = max(1, len(turns) // 2)
+    while True:
+        index, reduced = 0, False
+        while index < len(turns):
+            candidate = turns[:index] + turns[index + chunk:]
+            if candidate and _replay_fails(_with_turns(record, twists, candidate), check, max_turns, oracle_max_empty):
+                turns, reduced = candidate, True
+            else:
+                index += chunk
+        if chunk == 1 and not reduced:
+            break
+        chunk = max(1, chunk // 2) if not reduced else chunk
+    for twist_name in TWIST_NAMES:
+        if twists[twist_name]:
+            candidate_twists = dict(twists, **{twist_name: False})
+            if _replay_fails(_with_turns(record, candidate_twists, turns), check, max_turns, oracle_max_empty):
+                twists = candidate_twists
+    return _with_turns(record, twists, turns)
+
+def fuzz_batch(task):
+    """Pool worker: plays a batch of sequences under one twist combination; returns counts and shrunk failures."""
+    twists, board, seed, count, max_turns, oracle_rate, oracle_max_empty = task
+    rng = random.Random(seed)
+    flags = twist_flags(twists)
+    rules = Rules(flags, *board)
+    actions = 0
+    failures = [] # (record bytes, turn, check, message)
+    failure_counts = {}
+    for _ in range(count):
+        record = GameRecord(flags, *board, seed=rng.getrandbits(32), started=0)
+        played, failure = run_sequence(rules, record, rng, max_turns, oracle_rate, oracle_max_empty)
+        actions += played
+        if failure is None:
+            continue
+        turn, check, message = failure
+        failure_counts[check] = failure_counts.get(check, 0) + 1
+        if len(failures) < FAILURES_PER_TASK:
+            shrunk = minimize(_with_turns(record, flags, list(record.turns())[:turn + 1]), check, max_turns,
+                              oracle_max_empty)
+            _, shrunk_failure = run_sequence(shrunk.rules(), shrunk, max_turns=max_turns,
+                                             oracle_rate=1.0 if check == "search" else 0.0,
+                                             oracle_max_empty=oracle_max_empty)
+            failures.append((shrunk.to_bytes(), *(shrunk_failure or failure)))
+    return count, actions, failure_counts, failures
+
+def _tasks(combinations, board, seed, batch_size, max_turns, oracle_rate, oracle_max_empty):
+    """Endless batches cycling through the twist combinations."""
+    batch_index = 0
+    while True:
+        for twists in combinations:
+            yield twists, board, f"{seed}:{batch_index}", batch_size, max_turns, oracle_rate, oracle_max_empty
+            batch_index += 1
+
+def replay_file(path, max_turns, oracle_max_empty):
+    """Re-runs every check on the records in a file and prints the result of each."""
+    failed = 0
+    for index, record in enumerate(read_records(path)):
+        _, failure = run_sequence(record.rules(), record, max_turns=max_turns, oracle_rate=1.0,
+                                  oracle_max_empty=oracle_max_empty)
+        twists = "+".join(twist_name for twist_name, on in record.twists.items() if on) or "(none)"
+        if failure is None:
+            print(f"#{index} passes ({record.turn_count()} turns, {twists})")
+        else:
+            failed += 1
+            turn, check, message = failure
+            print(f"#{index} fails {check} on turn {turn + 1}: {message} ({twists})")
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fuzz the rules engine with random legal action sequences.")
+    parser.add_argument("--seconds", type=float, default=60, help="how long to fuzz")
+    parser.add_argument("--twists", default=None,
+                        help="only this comma-separated twist combination (default: all 128 combinations)")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE)
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE)
+    parser.add_argument("--win-length", type=int, default=BOARD_SIZE)
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--oracle-rate", type=float, default=DEFAULT_ORACLE_RATE,
+                        help="share of sequences with a position checked against the exhaustive oracle")
+    parser.add_argument("--oracle-max-empty", type=int, default=DEFAULT_ORACLE_MAX_EMPTY)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--failures", default="fuzz_failures.bin", help="records file the shrunk failures are appended to")
+    parser.add_argument("--replay", default=None, help="re-check the records in this file instead of fuzzing")
+    args = parser.parse_args(argv)
+
+    if args.replay:
+        raise SystemExit(1 if replay_file(args.replay, args.max_turns, args.oracle_max_empty) else 0)
+    if args.twists is None:
+        combinations = list(twist_combinations())
+    else:
+        twists = [twist.strip() for twist in args.twists.split(",") if twist.strip()]
+        unknown = [twist for twist in twists if twist not in TWIST_NAMES]
+        if unknown:
+            parser.error(f"unknown twist(s): {', '.join(unknown)}")
+        combinations = [tuple(twist for twist in TWIST_NAMES if twist in twists)]
+
+    sequences = actions = 0
+    failure_counts = {}
+    saved = 0
+    start = time.perf_counter()
+    tasks = _tasks(combinations, (args.rows, args.cols, args.win_length), args.seed, args.batch_size, args.max_turns,
+                   args.oracle_rate, args.oracle_max_empty)
+    with Pool(args.workers) as pool:
+        for count, played, counts, failures in pool.imap_unordered(fuzz_batch, tasks):
+            sequences += count
+            actions += played
+            for check, failed in counts.items():
+                failure_counts[check] = failure_counts.get(check, 0) + failed
+            if failures:
+                with open(args.failures, "ab") as failures_file:
+                    for data, turn, check, message in failures:
+                        record = GameRecord.from_bytes(data)
+                        failures_file.write(record.frame())
+                        saved += 1
+                        print(f"{check} failure on turn {turn + 1} of a {record.turn_count()}-turn sequence: {message}")
+            if time.perf_counter() - start >= args.seconds:
+                pool.terminate()
+                break
+    elapsed = time.perf_counter() - start
+    print(f"{sequences} sequences, {actions} actions in {elapsed:.1f}s "
+          f"({sequences / elapsed * 60:,.0f} sequences/min, {actions / elapsed:,.0f} actions/s)")
+    if failure_counts:
+        print("failures: " + ", ".join(f"{check} {count}" for check, count in sorted(failure_counts.items())))
+        print(f"{saved} shrunk failing sequences appended to {args.failures}")
+    else:
+        print("no failures")
+
+if __name__ == "__main__":
+    main()
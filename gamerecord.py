@@ -0,0 +1,208 @@
+"""
+Compact binary records of finished games, an append-only writer for them and replay.
+
+A record holds the game's settings (twists, board, opponent, bot time budget), a seed and the
+list of turns as actions: a placement, a 'Tic-Tac-Undo' removal, or a 'Swap', 'Block' or
+'Remove' ability use (so the ability uses are part of the move list), or running out of time.
+Bot turns are stored as the placements they made, so replaying a record never searches. The
+random line a 'Block' picks comes from the seed and the turn number, which makes every game
+reproducible from its record alone.
+
+Records are framed by a two-byte length, so a file of them can be appended to at any time and
+read back as a stream; GameRecordWriter batches the appends.
+"""
+import os
+import random
+import struct
+import threading
+import time
+
+from engine import PLAYER_X, PLAYER_O, TWIST_NAMES, Rules
+from mcts import DRAW, play_move
+
+RECORD_FORMAT_VERSION = 1
+# Version, twist bitmask (in TWIST_NAMES order), rows, cols, win length, opponent, result,
+# bot time budget in ms, seed, start time (Unix seconds)
+RECORD_HEADER_FORMAT = "<BBBBBBBHII"
+RECORD_HEADER_SIZE = struct.calcsize(RECORD_HEADER_FORMAT)
+RECORD_FRAME_FORMAT = "<H" # Length of the record that follows, in a records file
+
+# Turn actions: the action byte is followed by this many cell indices (one byte each)
+PLACE, UNDO_MARK, SWAP, BLOCK, REMOVE, TIMEOUT = range(6)
+ACTION_CELLS = {PLACE: 1, UNDO_MARK: 1, SWAP: 2, BLOCK: 0, REMOVE: 1, TIMEOUT: 0}
+ACTION_NAMES = {PLACE: "placed a mark", UNDO_MARK: "took back a mark", SWAP: "swapped two marks",
+                BLOCK: "used Block", REMOVE: "removed a mark", TIMEOUT: "ran out of time"}
+
+OPPONENTS = ("friend", "basic", "smart", "mcts", "online") # Index stored in the record
+RESULTS = (None, PLAYER_X, PLAYER_O, DRAW) # Index stored in the record; None while unfinished
+
+DEFAULT_WRITER_BATCH_SIZE = 64 # Records buffered before they are written
+DEFAULT_WRITER_FLUSH_INTERVAL = 10.0 # Seconds after which a partial batch is written on the next append
+
+def block_rng(seed, turn):
+    """The RNG a 'Block' on the given turn (0-based action index) picks its line with."""
+    return random.Random(f"{seed}:{turn}")
+
+def apply_action(rules, state, action, cells, seed, turn):
+    """
+    Plays one recorded turn on `state` in the app's order and returns the winner, DRAW, or None
+    if the game goes on. `cells` are the action's cell bits.
+    """
+    if action == PLACE:
+        return play_move(rules, state, cells[0])
+    if action == TIMEOUT:
+        return state.opponent
+    if action == UNDO_MARK:
+        rules.remove_mark(state, cells[0])
+    elif action == SWAP:
+        rules.swap_cells(state, cells[0], cells[1])
+        rules.spend_ability(state, 'swap')
+    elif action == BLOCK:
+        rules.spend_ability(state, 'block')
+        rules.block_random_line(state, block_rng(seed, turn))
+    elif action == REMOVE:
+        rules.remove_mark(state, cells[0])
+        rules.spend_ability(state, 'remove')
+    rules.end_turn(state)
+    return None
+
+def check_actions(actions, cell_count):
+    """Raises ValueError unless `actions` are whole turns with known action codes and cells on the board."""
+    offset = 0
+    while offset < len(actions):
+        action = actions[offset]
+        if action not in ACTION_CELLS:
+            raise ValueError(f"unknown action {action} at byte {offset} of the turns")
+        cells = actions[offset + 1:offset + 1 + ACTION_CELLS[action]]
+        if len(cells) < ACTION_CELLS[action]:
+            raise ValueError(f"turn at byte {offset} is cut short")
+        if any(index >= cell_count for index in cells):
+            raise ValueError(f"turn at byte {offset} acts on a cell off the {cell_count}-cell board")
+        offset += 1 + len(cells)
+
+class GameRecord:
+    """One game's settings, seed, turns and result. Turns are kept encoded, a few bytes each."""
+    __slots__ = ("twists", "rows", "cols", "win_length", "opponent", "bot_time_budget_ms", "seed", "started",
+                 "result", "actions")
+
+    def __init__(self, twists, rows, cols, win_length, opponent="friend", bot_time_budget_ms=0, seed=None,
+                 started=None, result=None, actions=b""):
+        self.twists = {twist_name: bool(twists.get(twist_name)) for twist_name in TWIST_NAMES}
+        self.rows = rows
+        self.cols = cols
+        self.win_length = win_length
+        self.opponent = opponent
+        self.bot_time_budget_ms = bot_time_budget_ms
+        self.seed = seed if seed is not None else random.getrandbits(32)
+        self.started = int(started if started is not None else time.time())
+        self.result = result
+        self.actions = bytearray(actions)
+
+    def rules(self):
+        return Rules(self.twists, self.rows, self.cols, self.win_length)
+
+    def add(self, action, *cells):
+        """Appends a turn; `cells` are the cell bits it acted on."""
+        self.actions.append(action)
+        self.actions.extend(bit.bit_length() - 1 for bit in cells)
+
+    def turn_count(self):
+        return sum(1 for _ in self.turns())
+
+    def turns(self):
+        """Yields each turn as (action, cell bits)."""
+        offset = 0
+        while offset < len(self.actions):
+            action = self.actions[offset]
+            cell_count = ACTION_CELLS[action]
+            yield action, tuple(1 << index for index in self.actions[offset + 1:offset + 1 + cell_count])
+            offset += 1 + cell_count
+
+    def replay(self, rules=None):
+        """Yields (action, cells, state, outcome) after each turn, all on one state object that is updated in place."""
+        rules = rules if rules is not None else self.rules()
+        state = rules.new_state()
+        for turn, (action, cells) in enumerate(self.turns()):
+            outcome = apply_action(rules, state, action, cells, self.seed, turn)
+            yield action, cells, state, outcome
+
+    def twist_bits(self):
+        """The twists as a bitmask in TWIST_NAMES order."""
+        return sum(1 << index for index, twist_name in enumerate(TWIST_NAMES) if self.twists[twist_name])
+
+    def to_bytes(self):
+        return struct.pack(RECORD_HEADER_FORMAT, RECORD_FORMAT_VERSION, self.twist_bits(), self.rows, self.cols,
+                           self.win_length, OPPONENTS.index(self.opponent), RESULTS.index(self.result),
+                           self.bot_time_budget_ms, self.seed, self.started) + bytes(self.actions)
+
+    def frame(self):
+        """The record as it is stored in a records file: length prefix, then the record."""
+        data = self.to_bytes()
+        return struct.pack(RECORD_FRAME_FORMAT, len(data)) + data
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Decodes a record, raising ValueError (or struct.error if it is too short) if it is damaged."""
+        (version, twist_bits, rows, cols, win_length, opponent, result, bot_time_budget_ms, seed,
+         started) = struct.unpack_from(RECORD_HEADER_FORMAT, data)
+        if version != RECORD_FORMAT_VERSION:
+            raise ValueError(f"unsupported game record version {version}")
+        if opponent >= len(OPPONENTS) or result >= len(RESULTS):
+            raise ValueError(f"unknown opponent {opponent} or result {result} in game record")
+        check_actions(data[RECORD_HEADER_SIZE:], rows * cols)
+        twists = {twist_name: bool(twist_bits >> index & 1) for index, twist_name in enumerate(TWIST_NAMES)}
+        return cls(twists, rows, cols, win_length, OPPONENTS[opponent], bot_time_budget_ms, seed, started,
+                   RESULTS[result], data[RECORD_HEADER_SIZE:])
+
+def read_records(source):
+    """Yields the GameRecords in a records file (a path or the file's bytes), oldest first."""
+    if isinstance(source, (bytes, bytearray)):
+        data = source
+    else:
+        with open(source, "rb") as records_file:
+            data = records_file.read()
+    frame_size = struct.calcsize(RECORD_FRAME_FORMAT)
+    offset = 0
+    while offset + frame_size <= len(data):
+        (length,) = struct.unpack_from(RECORD_FRAME_FORMAT, data, offset)
+        offset += frame_size
+        if offset + length > len(data):
+            break # A record cut short by a crash mid-write
+        yield GameRecord.from_bytes(data[offset:offset + length])
+        offset += length
+
+class GameRecordWriter:
+    """
+    Thread-safe append-only writer of finished games. Records are buffered and written in
+    batches of `batch_size`, or on the next append once `flush_interval` seconds have passed;
+    call flush (e.g. at exit) to write a partial batch.
+    """
+    def __init__(self, path, batch_size=DEFAULT_WRITER_BATCH_SIZE, flush_interval=DEFAULT_WRITER_FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._last_flush = time.time()
+        self.written = 0
+
+    def append(self, record):
+        frame = record.frame()
+        with self._lock:
+            self._buffer.append(frame)
+            if len(self._buffer) < self.batch_size and time.time() - self._last_flush < self.flush_interval:
+                return
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+            self._last_flush = time.time()
+            if not batch:
+                return
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(self.path, "ab") as records_file:
+                records_file.write(b"".join(batch))
+            self.written += len(batch)
@@ -0,0 +1,154 @@
+"""
+Monte Carlo Tree Search bot for Twisted Tic-Tac-Toe.
+
+Unlike the Smart Bot's alpha-beta search, the tree is grown by playing moves through the real
+Rules, so 'Board Shift', 'Evolve' and a pending 'Block' are all applied exactly as in the game,
+and its cost is capped by an iteration count and/or a wall-clock budget rather than by depth.
+"""
+import math
+import random
+import time
+
+from engine import PLAYER_X, PLAYER_O, WIN, DEFAULT_BOT_TIME_BUDGET_MS
+
+DRAW = "draw"
+EXPLORATION = math.sqrt(2) # UCT exploration constant
+ROLLOUT_PLY_FACTOR = 4 # Rollouts are cut off (as draws) after this many plies per board cell
+
+class MCTSNode:
+    """A position in the search tree, reached by `mover` placing a mark on `move`."""
+    __slots__ = ("move", "parent", "mover", "outcome", "children", "untried", "visits", "score")
+
+    def __init__(self, move, parent, mover, outcome=None):
+        self.move = move
+        self.parent = parent
+        self.mover = mover
+        self.outcome = outcome # PLAYER_X, PLAYER_O or DRAW once the game is over here, else None
+        self.children = []
+        self.untried = None # Moves not expanded yet; filled on the first visit
+        self.visits = 0
+        self.score = 0.0 # Sum of results from the mover's point of view: 1 win, 0.5 draw, 0 loss
+
+    def best_child(self, exploration):
+        """Returns the child with the highest UCT value."""
+        log_visits = math.log(self.visits)
+        return max(self.children, key=lambda child: child.score / child.visits
+                   + exploration * math.sqrt(log_visits / child.visits))
+
+def play_move(rules, state, bit):
+    """
+    Plays a turn in the app's order: place, check the mover's win, check for a draw, end the turn
+    (which may shift the board). Returns the winner, DRAW or None if the game goes on.
+    """
+    player = state.current_player
+    rules.place_mark(state, bit)
+    if rules.check_win(state, player) == WIN:
+        return player
+    if rules.is_draw(state):
+        return DRAW
+    rules.end_turn(state)
+    return None
+
+class MCTSBot:
+    """
+    UCT search with uniformly random rollouts. Each call to best_move runs until `max_iterations`
+    or `time_budget_ms` is reached (whichever comes first) and keeps the subtree of the chosen
+    move, so the next call starts from the opponent's reply with the statistics gathered so far.
+    """
+    def __init__(self, time_budget_ms=DEFAULT_BOT_TIME_BUDGET_MS, max_iterations=None, exploration=EXPLORATION,
+                 rng=None):
+        self.time_budget_ms = time_budget_ms
+        self.max_iterations = max_iterations
+        self.exploration = exploration
+        self.rng = rng if rng is not None else random.Random()
+        self.rules = None
+        self.root = None
+        self.root_state = None
+        self.iterations = 0 # Iterations run by the last best_move call
+        self.reused_visits = 0 # Visits inherited from the previous move's tree
+
+    def best_move(self, rules, state):
+        """Returns the bit of the most visited move from `state`, or 0 if there is no legal move."""
+        if not rules.legal_moves(state):
+            return 0
+        root = self._reuse_tree(rules, state)
+        if root is None:
+            root = MCTSNode(0, None, PLAYER_O if state.current_player == PLAYER_X else PLAYER_X)
+        self.reused_visits = root.visits
+        deadline = None if self.time_budget_ms is None else time.perf_counter() + self.time_budget_ms / 1000.0
+        self.iterations = 0
+        while self.max_iterations is None or self.iterations < self.max_iterations:
+            self._iterate(rules, state, root)
+            self.iterations += 1
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+        best = max(root.children, key=lambda child: child.visits)
+
+        # Keep the chosen move's subtree for the next call
+        best.parent = None
+        self.rules = rules
+        self.root = best
+        self.root_state = state.copy()
+        play_move(rules, self.root_state, best.move)
+        return best.move
+
+    def _reuse_tree(self, rules, state):
+        """Returns the kept subtree node matching `state` (the opponent's reply to our last move), or None."""
+        if self.root is None or self.rules is not rules:
+            return None
+        target = state.snapshot()
+        if self.root_state.snapshot() == target:
+            return self.root
+        for child in self.root.children:
+            child_state = self.root_state.copy()
+            play_move(rules, child_state, child.move)
+            if child_state.snapshot() == target:
+                child.parent = None
+                return child
+        return None # The opponent used an ability or the game was restarted
+
+    def _iterate(self, rules, root_state, root):
+        """One selection, expansion, rollout and backpropagation pass."""
+        state = root_state.copy()
+        node = root
+        # Selection: descend through fully expanded nodes by UCT
+        while node.outcome is None and node.untried is not None and not node.untried and node.children:
+            node = node.best_child(self.exploration)
+            play_move(rules, state, node.move)
+        # Expansion: add one untried move
+        if node.outcome is None:
+            if node.untried is None:
+                node.untried = rules.legal_moves(state)
+                self.rng.shuffle(node.untried)
+            if node.untried:
+                bit = node.untried.pop()
+                mover = state.current_player
+                child = MCTSNode(bit, node, mover, play_move(rules, state, bit))
+                node.children.append(child)
+                node = child
+        # Simulation: random playout from the new node
+        outcome = node.outcome if node.outcome is not None else self._rollout(rules, state)
+        # Backpropagation
+        while node is not None:
+            node.visits += 1
+            if outcome == node.mover:
+                node.score += 1.0
+            elif outcome == DRAW:
+                node.score += 0.5
+            node = node.parent
+
+    def _rollout(self, rules, state):
+        """Plays random legal moves to the end of the game and returns the winner or DRAW."""
+        choice = self.rng.choice
+        for _ in range(ROLLOUT_PLY_FACTOR * rules.geometry.cell_count):
+            moves = rules.legal_moves(state)
+            if not moves:
+                return DRAW
+            outcome = play_move(rules, state, choice(moves))
+            if outcome is not None:
+                return outcome
+        return DRAW # 'Board Shift' games can go on indefinitely
+
+def choose_mcts_move(rules, state, bot):
+    """MCTS bot logic: the most visited move of `bot`'s search (a bit), or 0 if there is no move."""
+    return bot.best_move(rules, state)
@@ -0,0 +1,188 @@
+"""
+Optional performance instrumentation for the app.
+
+Each session can carry a SessionMetrics (reruns, time per phase, the bot's last searches) shown
+in the app's debug panel, and every session can feed one process-wide Metrics aggregate that is
+written to a JSON file periodically. Instrumented code asks for a timer with `timed`, which hands
+back a shared no-op context manager when instrumentation is off, so the cost when off is a
+single check. Nothing here imports Streamlit.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+DEFAULT_FLUSH_INTERVAL = 30 # Seconds between writes of the aggregate metrics file
+RECENT_SEARCHES = 10 # Bot searches kept per session for the debug panel
+
+NO_TIMING = contextlib.nullcontext() # Reusable no-op stand-in for a PhaseTimer
+
+class PhaseStats:
+    """Count, total and maximum duration (seconds) of one phase."""
+    __slots__ = ("count", "total", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def summary(self):
+        return {"count": self.count, "total_ms": round(self.total * 1000, 3),
+                "mean_ms": round(self.total * 1000 / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max * 1000, 3)}
+
+class SearchStats:
+    """Totals over bot searches: where moves came from, nodes, cache hits and misses, deepest depth."""
+    __slots__ = ("count", "seconds", "nodes", "cache_hits", "cache_misses", "max_depth", "sources")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.nodes = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.max_depth = 0
+        self.sources = {}
+
+    def add(self, stats):
+        """Adds one search's stats dict (as filled in by choose_smart_move and the app's bot)."""
+        self.count += 1
+        self.seconds += stats.get("seconds", 0.0)
+        self.nodes += stats.get("nodes", 0)
+        self.cache_hits += stats.get("cache_hits", 0)
+        self.cache_misses += stats.get("cache_misses", 0)
+        self.max_depth = max(self.max_depth, stats.get("depth", 0))
+        source = stats.get("source", "unknown")
+        self.sources[source] = self.sources.get(source, 0) + 1
+
+    def summary(self):
+        lookups = self.cache_hits + self.cache_misses
+        return {"count": self.count, "total_ms": round(self.seconds * 1000, 3), "nodes": self.nodes,
+                "nodes_per_s": round(self.nodes / self.seconds) if self.seconds else None,
+                "cache_hits": self.cache_hits, "cache_misses": self.cache_misses,
+                "cache_hit_rate": round(self.cache_hits / lookups, 4) if lookups else None,
+                "max_depth": self.max_depth, "sources": dict(self.sources)}
+
+class SessionMetrics:
+    """One session's reruns, phase timings (totals and the latest run's) and recent bot searches."""
+    def __init__(self):
+        self.reruns = 0
+        self.phases = {} # phase -> PhaseStats
+        self.last_run = {} # phase -> milliseconds, for the latest run of the phase
+        self.searches = SearchStats()
+        self.recent_searches = [] # The last RECENT_SEARCHES stats dicts, newest last
+
+    def add_time(self, phase, seconds):
+        stats = self.phases.get(phase)
+        if stats is None:
+            stats = self.phases[phase] = PhaseStats()
+        stats.add(seconds)
+        self.last_run[phase] = round(seconds * 1000, 3)
+
+    def add_search(self, stats):
+        self.searches.add(stats)
+        self.recent_searches = (self.recent_searches + [stats])[-RECENT_SEARCHES:]
+
+    def summary(self):
+        return {"reruns": self.reruns, "last_run_ms": dict(self.last_run),
+                "phases": {phase: stats.summary() for phase, stats in self.phases.items()},
+                "search": self.searches.summary(), "recent_searches": list(self.recent_searches)}
+
+class Metrics:
+    """
+    Thread-safe aggregate of every instrumented session: reruns, phase timings and bot searches.
+    maybe_flush writes it to `path` as JSON when `flush_interval` seconds have passed since the
+    last write (atomically, so readers never see a partial file).
+    """
+    def __init__(self, path=None, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.started = time.time()
+        self.reruns = 0
+        self.phases = {}
+        self.searches = SearchStats()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._last_flush = time.time()
+
+    def add_rerun(self):
+        with self._lock:
+            self.reruns += 1
+
+    def add_time(self, phase, seconds):
+        with self._lock:
+            stats = self.phases.get(phase)
+            if stats is None:
+                stats = self.phases[phase] = PhaseStats()
+            stats.add(seconds)
+
+    def add_search(self, stats):
+        with self._lock:
+            self.searches.add(stats)
+
+    def summary(self):
+        with self._lock:
+            return {"updated": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "uptime_s": round(time.time() - self.started, 1),
+                    "reruns": self.reruns, "phases": {phase: stats.summary() for phase, stats in self.phases.items()},
+                    "search": self.searches.summary()}
+
+    def maybe_flush(self):
+        if self.path is None:
+            return
+        # Checked and set together, so of the threads that find a write due only one makes it
+        with self._lock:
+            now = time.time()
+            due = now - self._last_flush >= self.flush_interval
+            if due:
+                self._last_flush = now
+        if due:
+            self._write()
+
+    def flush(self):
+        if self.path is None:
+            return
+        with self._lock:
+            self._last_flush = time.time()
+        self._write()
+
+    def _write(self):
+        # One writer of the temporary file at a time (maybe_flush and flush at exit can still meet)
+        with self._write_lock:
+            temporary_path = f"{self.path}.tmp"
+            with open(temporary_path, "w") as metrics_file:
+                json.dump(self.summary(), metrics_file, indent=1)
+            os.replace(temporary_path, self.path)
+
+class PhaseTimer:
+    """Times a `with` block and adds it to a session's metrics and the aggregate (either may be None)."""
+    __slots__ = ("phase", "session_metrics", "metrics", "start")
+
+    def __init__(self, phase, session_metrics, metrics):
+        self.phase = phase
+        self.session_metrics = session_metrics
+        self.metrics = metrics
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        if self.session_metrics is not None:
+            self.session_metrics.add_time(self.phase, elapsed)
+        if self.metrics is not None:
+            self.metrics.add_time(self.phase, elapsed)
+        return False
+
+def timed(phase, session_metrics, metrics):
+    """A PhaseTimer for `phase`, or the shared no-op NO_TIMING when there is nothing to record into."""
+    if session_metrics is None and metrics is None:
+        return NO_TIMING
+    return PhaseTimer(phase, session_metrics, metrics)
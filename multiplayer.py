@@ -0,0 +1,144 @@
+"""
+Server-side store for online games between two browser sessions.
+
+Each SharedGame holds the one GameState both players act on, guarded by its own lock, plus a
+version number bumped on every published change. Sessions remember the version they last drew
+and only rerun when it moves. Games that see no activity for a while are ended and evicted; a
+session whose code no longer resolves treats its game as expired. Nothing here imports Streamlit.
+"""
+import secrets
+import threading
+import time
+
+from engine import PLAYER_X, PLAYER_O
+
+GAME_CODE_ALPHABET = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789" # No 0/O or 1/I look-alikes
+GAME_CODE_LENGTH = 6
+GAME_IDLE_TIMEOUT = 30 * 60 # Seconds without activity before a game is evicted
+EVICTION_SWEEP_INTERVAL = 60 # Seconds between idle sweeps
+GAME_EXPIRED_MESSAGE = "This online game has expired after too long without a move."
+
+class SharedGame:
+    """
+    One online game: its rules, state, move log and record, the session playing each side, and the
+    shared outcome fields (active flag, status message, turn deadline). Hold `lock` while reading
+    or changing the game and call publish once a change is complete.
+    """
+    def __init__(self, code, settings, rules, state, move_log, host_session_id):
+        self.code = code
+        self.settings = settings # Whatever the app needs to recreate the game (twists, board layout)
+        self.rules = rules
+        self.state = state
+        self.move_log = move_log
+        self.record = None # GameRecord of the game, written once it ends
+        self.players = {PLAYER_X: host_session_id, PLAYER_O: None}
+        self.active = True
+        self.message = ""
+        self.turn_deadline = 0
+        self.version = 0
+        self.last_activity = time.time()
+        self.lock = threading.RLock()
+
+    def player_of(self, session_id):
+        """Returns the side `session_id` plays (PLAYER_X or PLAYER_O), or None."""
+        for player, player_session_id in self.players.items():
+            if player_session_id == session_id:
+                return player
+        return None
+
+    def publish(self, **fields):
+        """Updates the shared fields given and bumps the version. Call with `lock` held."""
+        for name, value in fields.items():
+            setattr(self, name, value)
+        self.version += 1
+        self.last_activity = time.time()
+
+class GameStore:
+    """
+    Thread-safe registry of online games by join code. The store lock only guards the code
+    table; moves take the per-game lock, so games never wait on each other.
+    """
+    def __init__(self, idle_timeout=GAME_IDLE_TIMEOUT, sweep_interval=EVICTION_SWEEP_INTERVAL):
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        self._games = {} # code -> SharedGame
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._games)
+
+    def create(self, session_id, settings, rules, state, move_log):
+        """Registers a new game hosted (as X) by `session_id` and returns it."""
+        self._maybe_evict()
+        with self._lock:
+            code = self._new_code()
+            game = SharedGame(code, settings, rules, state, move_log, session_id)
+            self._games[code] = game
+        return game
+
+    def get(self, code):
+        """Returns the game for a join code (case-insensitive), or None."""
+        return self._games.get(code.strip().upper())
+
+    def join(self, code, session_id):
+        """
+        Takes the free seat (O) of the game with this code for `session_id`, or returns its existing
+        seat. Returns (game, player), or (None, None) if there is no such game or it is full.
+        """
+        self._maybe_evict()
+        game = self.get(code)
+        if game is None:
+            return None, None
+        with game.lock:
+            player = game.player_of(session_id)
+            if player is None and game.players[PLAYER_O] is None:
+                game.players[PLAYER_O] = session_id
+                player = PLAYER_O
+                game.publish(message="Both players are here. Player X's turn.")
+        return (game, player) if player is not None else (None, None)
+
+    def leave(self, code, session_id):
+        """Frees the seat `session_id` holds in a game; a game nobody is seated at is removed."""
+        game = self.get(code)
+        if game is None:
+            return
+        with game.lock:
+            player = game.player_of(session_id)
+            if player is None:
+                return
+            game.players[player] = None
+            game.publish(message=f"Player {player} left the game.")
+            empty = not any(game.players.values())
+        if empty:
+            with self._lock:
+                self._games.pop(game.code, None)
+
+    def evict_idle(self, now=None):
+        """
+        Ends and removes every game idle for longer than `idle_timeout`; returns how many were removed.
+        The games are ended after the store lock is released, as moves take a game lock and then it.
+        """
+        now = now if now is not None else time.time()
+        with self._lock:
+            idle_games = [game for game in self._games.values() if now - game.last_activity > self.idle_timeout]
+            for game in idle_games:
+                del self._games[game.code]
+            self.evictions += len(idle_games)
+            self._last_sweep = now
+        for game in idle_games:
+            with game.lock:
+                game.publish(active=False, message=GAME_EXPIRED_MESSAGE)
+        return len(idle_games)
+
+    def _maybe_evict(self):
+        if time.time() - self._last_sweep > self.sweep_interval:
+            self.evict_idle()
+
+    def _new_code(self):
+        """Returns a join code not in use. Call with the store lock held."""
+        while True:
+            code = "".join(secrets.choice(GAME_CODE_ALPHABET) for _ in range(GAME_CODE_LENGTH))
+            if code not in self._games:
+                return code
@@ -0,0 +1,122 @@
+"""
+Per-session memory of a game, before and after packing, and of the bot caches beside it.
+
+Between reruns the app keeps a session's game state, move log and turn deadline packed into a
+single bytes value (Rules.pack_state and MoveLog.pack) instead of as objects. This plays random
+games for every twist combination, stops them empty, mid-game and near full (or where they end)
+and reports the memory the objects held against the size of their packed form. A bot game also
+holds the Smart Bot's transposition table or the MCTS Bot's search tree until it ends; their
+sizes after the bot has moved on every O turn are reported alongside:
+
+    python session_memory.py --rows 6 --cols 7 --win-length 4
+
+Sizes are deep sizes (sys.getsizeof over everything reachable), leaving out the board geometry,
+which is cached and shared by every session on the same board.
+"""
+import argparse
+import random
+import struct
+import sys
+from collections import deque
+
+from engine import (
+    PLAYER_O, TWIST_NAMES, BOARD_SIZE, WIN,
+    BoardGeometry, MoveLog, Rules, TranspositionTable, choose_smart_move,
+)
+from bench import POSITIONS
+from mcts import MCTSBot
+from simulate import twist_combinations
+
+MOVE_HISTORY_LIMIT = 256 # As in the app
+PACKED_GAME_HEADER_SIZE = struct.calcsize("<dHH") # Turn deadline, packed state and record lengths, as in the app
+DEFAULT_BOT_DEPTH = 4 # Depth cap of the Smart Bot searches that fill the table
+DEFAULT_MCTS_ITERATIONS = 200 # MCTS iterations per bot move
+
+def deep_sizeof(obj, seen=None):
+    """Bytes taken by `obj` and everything it references, counting shared objects once and skipping geometries."""
+    seen = seen if seen is not None else set()
+    if id(obj) in seen or isinstance(obj, BoardGeometry):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(key, seen) + deep_sizeof(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    else:
+        for name in getattr(type(obj), "__slots__", ()):
+            size += deep_sizeof(getattr(obj, name, None), seen)
+        if hasattr(obj, "__dict__"):
+            size += deep_sizeof(vars(obj), seen)
+    return size
+
+def play_session(rules, kind, rng, table=None, mcts_bot=None, bot_depth=DEFAULT_BOT_DEPTH):
+    """
+    Plays random moves as the app would, logging each turn, up to the requested fill level or the
+    end of the game, whichever comes first. On O's turns the given bots search the position first,
+    filling their caches as in a bot game. Returns (state, log).
+    """
+    cells = rules.geometry.cell_count
+    target = {"empty": 0, "mid": cells // 2, "near_full": cells - 2}[kind]
+    state, log = rules.new_state(), MoveLog(MOVE_HISTORY_LIMIT)
+    while state.filled_count() < target:
+        moves = rules.legal_moves(state)
+        if not moves:
+            break
+        player = state.current_player
+        if player == PLAYER_O:
+            if table is not None:
+                choose_smart_move(rules, state, table, max_depth=bot_depth)
+            if mcts_bot is not None:
+                mcts_bot.best_move(rules, state)
+        before = state.snapshot()
+        rules.place_mark(state, rng.choice(moves))
+        if rules.check_win(state, player) == WIN:
+            log.record(before, state)
+            break
+        rules.end_turn(state)
+        log.record(before, state)
+    return state, log
+
+def measure(rules, state, log):
+    """Returns (bytes held as objects, bytes held packed) for one session's game."""
+    objects = deep_sizeof({"game_state": state, "move_log": log, "turn_deadline": 0.0})
+    packed = sys.getsizeof(b"") + PACKED_GAME_HEADER_SIZE + len(rules.pack_state(state)) + len(log.pack(rules))
+    return objects, packed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Report per-session game memory before and after packing.")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE)
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE)
+    parser.add_argument("--win-length", type=int, default=BOARD_SIZE)
+    parser.add_argument("--seed", default="0", help="seed for the generated games")
+    parser.add_argument("--bot-depth", type=int, default=DEFAULT_BOT_DEPTH,
+                        help="depth cap of the Smart Bot searches filling the table")
+    parser.add_argument("--mcts-iterations", type=int, default=DEFAULT_MCTS_ITERATIONS, help="MCTS iterations per bot move")
+    args = parser.parse_args(argv)
+
+    print(f"{'position':<10} {'games':>6} {'turns':>6} {'objects B':>10} {'packed B':>9} {'ratio':>6} "
+          f"{'table B':>9} {'tree B':>9}")
+    for kind in POSITIONS:
+        turns, objects_total, packed_total, table_total, tree_total, games = 0, 0, 0, 0, 0, 0
+        for twists in twist_combinations():
+            rules = Rules({twist_name: twist_name in twists for twist_name in TWIST_NAMES},
+                          args.rows, args.cols, args.win_length)
+            rng = random.Random(f"{args.seed}:{'+'.join(twists)}:{kind}")
+            table = TranspositionTable()
+            mcts_bot = MCTSBot(time_budget_ms=None, max_iterations=args.mcts_iterations, rng=random.Random(args.seed))
+            state, log = play_session(rules, kind, rng, table, mcts_bot, args.bot_depth)
+            objects, packed = measure(rules, state, log)
+            turns += len(log)
+            objects_total += objects
+            packed_total += packed
+            table_total += deep_sizeof(table)
+            tree_total += deep_sizeof(mcts_bot)
+            games += 1
+        print(f"{kind:<10} {games:>6} {turns / games:>6.1f} {objects_total / games:>10.0f} "
+              f"{packed_total / games:>9.0f} {objects_total / packed_total:>5.1f}x "
+              f"{table_total / games:>9.0f} {tree_total / games:>9.0f}")
+    print("The app drops the table and tree when the game ends (and never creates them outside bot games).")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+"""
+Headless self-play simulator for Twisted Tic-Tac-Toe.
+
+Plays bot-vs-bot games for every combination of the seven twists across a process pool and
+streams one JSON line per game to a results file, then prints win/draw rates, average game
+length and time per game for each twist combination and matchup:
+
+    python simulate.py --games 100 --output selfplay.jsonl
+
+Moves come from the same choose_basic_move/choose_smart_move/choose_mcts_move the app's bots use.
+Every game has its own seeded RNG, so runs are reproducible; the bots are time-bounded, so pass
+--smart-depth (with a generous --smart-budget-ms) and --mcts-iterations when moves must not
+depend on machine speed.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+from multiprocessing import Pool
+
+from engine import (
+    PLAYER_X, PLAYER_O, TWIST_NAMES, BOARD_SIZE, WIN,
+    Rules, TranspositionTable, choose_basic_move, choose_smart_move,
+)
+from mcts import MCTSBot, choose_mcts_move
+
+# Matchups as (X bot, O bot); X always moves first
+MATCHUPS = {
+    "basic-smart": ("basic", "smart"),
+    "smart-basic": ("smart", "basic"),
+    "smart-smart": ("smart", "smart"),
+    "mcts-smart": ("mcts", "smart"),
+    "smart-mcts": ("smart", "mcts"),
+    "mcts-basic": ("mcts", "basic"),
+    "basic-mcts": ("basic", "mcts"),
+}
+DEFAULT_MATCHUPS = ("basic-smart", "smart-basic", "smart-smart")
+DEFAULT_SMART_BUDGET_MS = 20 # Far below the app's default so large runs finish in reasonable time
+DEFAULT_MAX_TURNS = 200 # 'Board Shift' keeps freeing cells, so games are cut off after this many turns
+DEFAULT_BATCH_SIZE = 20 # Games per pool task
+
+def twist_combinations():
+    """Yields every subset of the twists as a tuple of twist names, from no twists to all seven."""
+    for size in range(len(TWIST_NAMES) + 1):
+        yield from itertools.combinations(TWIST_NAMES, size)
+
+def game_seed(seed, twists, matchup, game_index):
+    """Derives a game's RNG seed from the run seed, so results do not depend on scheduling."""
+    return f"{seed}:{'+'.join(twists)}:{matchup}:{game_index}"
+
+def play_game(twists, matchup, board, game_seed_value, smart_budget_ms, smart_depth, max_turns, opening_plies,
+              mcts_iterations=None):
+    """
+    Plays one game following the app's turn order (place, check the mover's win, check for a draw,
+    end the turn) and returns its result as a dict. The first `opening_plies` moves are random
+    so that deterministic matchups still produce varied games.
+    """
+    rng = random.Random(game_seed_value)
+    rules = Rules({twist_name: twist_name in twists for twist_name in TWIST_NAMES}, *board)
+    state = rules.new_state()
+    tables = {PLAYER_X: TranspositionTable(), PLAYER_O: TranspositionTable()} # One per bot, as in separate sessions
+    # With an iteration cap the MCTS Bot is not time-bounded, so its games stay reproducible
+    mcts_bots = {player: MCTSBot(None if mcts_iterations else smart_budget_ms, mcts_iterations, rng=rng)
+                 for player in (PLAYER_X, PLAYER_O)}
+    bots = dict(zip((PLAYER_X, PLAYER_O), MATCHUPS[matchup]))
+    winner, result, turns = None, "limit", 0
+    start = time.perf_counter()
+    while turns < max_turns:
+        player = state.current_player
+        if bots[player] == "basic" or turns < opening_plies:
+            bit = choose_basic_move(rules, state, rng)
+        elif bots[player] == "mcts":
+            bit = choose_mcts_move(rules, state, mcts_bots[player])
+        else:
+            bit = choose_smart_move(rules, state, tables[player], smart_budget_ms, smart_depth)
+        if not bit or not rules.place_mark(state, bit):
+            result = "stuck" # The app would leave the bot without a move here
+            break
+        turns += 1
+        if rules.check_win(state, player) == WIN:
+            winner, result = player, "win"
+            break
+        if rules.is_draw(state):
+            result = "draw"
+            break
+        rules.end_turn(state)
+    return {
+        "twists": list(twists),
+        "matchup": matchup,
+        "seed": game_seed_value,
+        "result": result,
+        "winner": winner,
+        "turns": turns,
+        "seconds": round(time.perf_counter() - start, 6),
+    }
+
+def _play_batch(task):
+    """Pool worker: plays a batch of games for one twist combination and matchup."""
+    twists, matchup, game_indices, options = task
+    return [play_game(twists, matchup, options["board"], game_seed(options["seed"], twists, matchup, index),
+                      options["smart_budget_ms"], options["smart_depth"], options["max_turns"],
+                      options["opening_plies"], options["mcts_iterations"])
+            for index in game_indices]
+
+def _tasks(combinations, matchups, games, batch_size, options):
+    for twists in combinations:
+        for matchup in matchups:
+            for first in range(0, games, batch_size):
+                yield twists, matchup, range(first, min(first + batch_size, games)), options
+
+def new_totals():
+    return defaultdict(lambda: {"games": 0, "x_wins": 0, "o_wins": 0, "draws": 0, "unfinished": 0,
+                                "turns": 0, "seconds": 0.0})
+
+def summarize(results, totals=None):
+    """Adds per-game results to rows keyed by (twists, matchup), so a run never holds every game in memory."""
+    totals = totals if totals is not None else new_totals()
+    for game in results:
+        row = totals[("+".join(game["twists"]) or "(none)", game["matchup"])]
+        row["games"] += 1
+        if game["winner"] == PLAYER_X:
+            row["x_wins"] += 1
+        elif game["winner"] == PLAYER_O:
+            row["o_wins"] += 1
+        elif game["result"] == "draw":
+            row["draws"] += 1
+        else:
+            row["unfinished"] += 1
+        row["turns"] += game["turns"]
+        row["seconds"] += game["seconds"]
+    return totals
+
+def print_summary(totals, out=sys.stdout):
+    """Prints one line per twist combination and matchup, slowest combinations first."""
+    print(f"{'matchup':<12} {'games':>7} {'X win':>6} {'O win':>6} {'draw':>6} {'cut':>5} {'turns':>6} {'ms/game':>8}  twists",
+          file=out)
+    for (twists, matchup), row in sorted(totals.items(), key=lambda item: -item[1]["seconds"] / item[1]["games"]):
+        games = row["games"]
+        print(f"{matchup:<12} {games:>7} {row['x_wins'] / games:>6.1%} {row['o_wins'] / games:>6.1%} "
+              f"{row['draws'] / games:>6.1%} {row['unfinished']:>5} {row['turns'] / games:>6.1f} "
+              f"{1000 * row['seconds'] / games:>8.1f}  {twists}", file=out)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless bot-vs-bot self-play over every twist combination.")
+    parser.add_argument("--games", type=int, default=100, help="games per twist combination and matchup")
+    parser.add_argument("--matchups", default=",".join(DEFAULT_MATCHUPS),
+                        help=f"comma-separated subset of {', '.join(MATCHUPS)} (X bot-O bot)")
+    parser.add_argument("--twists", default=None,
+                        help="only this comma-separated twist combination (default: all 128 combinations)")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE)
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE)
+    parser.add_argument("--win-length", type=int, default=BOARD_SIZE)
+    parser.add_argument("--seed", default="0", help="run seed; each game derives its own RNG from it")
+    parser.add_argument("--smart-budget-ms", type=int, default=DEFAULT_SMART_BUDGET_MS)
+    parser.add_argument("--smart-depth", type=int, default=None, help="cap the Smart Bot's search depth")
+    parser.add_argument("--mcts-iterations", type=int, default=None,
+                        help="MCTS Bot iterations per move (default: bounded by --smart-budget-ms instead)")
+    parser.add_argument("--opening-plies", type=int, default=0, help="random moves played before the bots take over")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--output", default="selfplay.jsonl", help="file the per-game JSON lines are streamed to")
+    args = parser.parse_args(argv)
+
+    matchups = [matchup.strip() for matchup in args.matchups.split(",") if matchup.strip()]
+    unknown = [matchup for matchup in matchups if matchup not in MATCHUPS]
+    if unknown:
+        parser.error(f"unknown matchup(s): {', '.join(unknown)}")
+    if args.twists is None:
+        combinations = list(twist_combinations())
+    else:
+        twists = tuple(twist.strip() for twist in args.twists.split(",") if twist.strip())
+        unknown = [twist for twist in twists if twist not in TWIST_NAMES]
+        if unknown:
+            parser.error(f"unknown twist(s): {', '.join(unknown)}")
+        combinations = [tuple(twist for twist in TWIST_NAMES if twist in twists)]
+    options = {
+        "board": (args.rows, args.cols, args.win_length),
+        "seed": args.seed,
+        "smart_budget_ms": args.smart_budget_ms,
+        "smart_depth": args.smart_depth,
+        "max_turns": args.max_turns,
+        "opening_plies": args.opening_plies,
+        "mcts_iterations": args.mcts_iterations,
+    }
+
+    totals = new_totals()
+    game_count = 0
+    start = time.perf_counter()
+    with open(args.output, "w") as results_file, Pool(args.workers) as pool:
+        # Batches are written as soon as they finish, so long runs can be inspected while they go
+        for batch in pool.imap_unordered(_play_batch, _tasks(combinations, matchups, args.games, args.batch_size, options)):
+            for game in batch:
+                results_file.write(json.dumps(game) + "\n")
+            results_file.flush()
+            summarize(batch, totals)
+            game_count += len(batch)
+    print_summary(totals)
+    print(f"{game_count} games in {time.perf_counter() - start:.1f}s, results in {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Cold start cost of the app and engine entry points.
+
+Process-pool workers, solvers and benchmarks only need the rules and the bots, so they import
+`engine` (no Streamlit) rather than `app`. This starts a fresh interpreter per run for each
+entry point and reports, as medians over the runs: the whole process's wall time, the import
+alone, the first bot move after it (which loads the tablebase and builds the board tables on
+first use), the modules loaded and peak memory:
+
+    python startup.py --runs 10 --output startup.json
+
+`app` needs Streamlit installed; it is imported, not run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Entry point -> (module to import, statements timed as the first bot move after the import)
+ENTRY_POINTS = {
+    "engine": ("engine", "state = engine.Rules({}).new_state(); engine.choose_smart_move(engine.Rules({}), state, "
+                         "engine.TranspositionTable())"),
+    "app": ("app", "state = app.Rules({}).new_state(); app.choose_smart_move(app.Rules({}), state, "
+                   "app.TranspositionTable())"),
+}
+DEFAULT_RUNS = 10
+MODULE_DIRECTORY = os.path.dirname(os.path.abspath(__file__)) # Where the measured modules live
+
+# Runs in the fresh interpreter (from any working directory) and prints one JSON line of its measurements
+CHILD_SCRIPT = """
+import sys, time
+sys.path.insert(0, {directory!r})
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+{first_move}
+moved = time.perf_counter()
+import json, resource
+print(json.dumps({{"import_ms": (imported - start) * 1000, "first_move_ms": (moved - imported) * 1000,
+                  "modules": len(sys.modules), "peak_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                  "streamlit": "streamlit" in sys.modules}}))
+"""
+
+def measure(entry_point, runs):
+    """Median measurements of `runs` fresh interpreters importing the entry point, or None if it cannot be imported."""
+    module, first_move = ENTRY_POINTS[entry_point]
+    script = CHILD_SCRIPT.format(directory=MODULE_DIRECTORY, module=module, first_move=first_move)
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        child = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True)
+        process_ms = (time.perf_counter() - start) * 1000
+        if child.returncode != 0:
+            print(f"{entry_point}: {child.stderr.strip().splitlines()[-1]}", file=sys.stderr)
+            return None
+        sample = json.loads(child.stdout.strip().splitlines()[-1])
+        sample["process_ms"] = process_ms
+        samples.append(sample)
+
+    def median(key):
+        values = sorted(sample[key] for sample in samples)
+        return values[len(values) // 2]
+    return {"process_ms": round(median("process_ms"), 1), "import_ms": round(median("import_ms"), 1),
+            "first_move_ms": round(median("first_move_ms"), 2), "modules": median("modules"),
+            "peak_rss_kib": median("peak_rss_kib"), "streamlit": samples[0]["streamlit"]}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure the cold start of the app and engine entry points.")
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS, help="fresh interpreters per entry point")
+    parser.add_argument("--entry-points", default=",".join(ENTRY_POINTS),
+                        help=f"comma-separated entry points to measure ({', '.join(ENTRY_POINTS)})")
+    parser.add_argument("--output", default=None, help="write the results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    entry_points = [name.strip() for name in args.entry_points.split(",") if name.strip()]
+    unknown = [name for name in entry_points if name not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"unknown entry point(s): {', '.join(unknown)}")
+
+    results = {}
+    print(f"{'entry':<8} {'process ms':>10} {'import ms':>10} {'1st move ms':>12} {'modules':>8} {'peak KiB':>9}  streamlit")
+    for name in entry_points:
+        result = measure(name, args.runs)
+        if result is None:
+            continue
+        results[name] = result
+        print(f"{name:<8} {result['process_ms']:>10.1f} {result['import_ms']:>10.1f} {result['first_move_ms']:>12.2f} "
+              f"{result['modules']:>8} {result['peak_rss_kib']:>9}  {'yes' if result['streamlit'] else 'no'}")
+    if args.output:
+        with open(args.output, "w") as results_file:
+            json.dump({"python": sys.version.split()[0], "runs": args.runs, "entry_points": results}, results_file,
+                      indent=1)
+
+if __name__ == "__main__":
+    main()
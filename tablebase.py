@@ -0,0 +1,192 @@
+"""
+Solved-position tablebase for the Smart Bot.
+
+Every position of the 3x3 board is solved offline for each twist combination the Smart Bot
+search understands ('Gravity' and 'Evolve') and written to a compact binary file:
+
+    python tablebase.py [output_path]
+
+At runtime the file is memory-mapped read-only, so a bot move is a single byte lookup and the
+pages are shared by every session (and every process) on the host. Positions the table cannot
+answer fall back to the regular search.
+
+Building checks every board for a completed line in one batch (batch.py) when the optional
+NumPy dependency is installed, and board by board otherwise; the file is the same either way.
+"""
+import mmap
+import os
+import struct
+import sys
+
+TABLEBASE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tablebase.bin")
+TABLEBASE_BOARD_SIZE = 3
+TABLEBASE_CELLS = TABLEBASE_BOARD_SIZE * TABLEBASE_BOARD_SIZE
+
+# File layout: header, one section record per twist combination, then the data blocks.
+# Each entry is one byte: the outcome for the side to move in the high nibble and the best
+# move's cell index in the low nibble (NO_MOVE when the position is already decided).
+MAGIC = b"TTTB"
+VERSION = 1
+HEADER_FORMAT = "<4sBBB" # magic, version, board size, section count
+SECTION_FORMAT = "<BII" # twist flags, data offset, data length
+LOSS, DRAW, WIN, UNSOLVED = 0, 1, 2, 3
+NO_MOVE = 0x0F
+GRAVITY_FLAG, EVOLVE_FLAG = 1, 2
+# The base-3 board index times two, plus one when O is to move
+ENTRY_COUNT = 3 ** TABLEBASE_CELLS * 2
+
+def twist_flags(gravity, evolve):
+    """Packs the twist combination into the flags byte used for section records."""
+    return (GRAVITY_FLAG if gravity else 0) | (EVOLVE_FLAG if evolve else 0)
+
+def position_index(x_mask, o_mask, o_to_move):
+    """Returns the table index of a position: its base-3 cell encoding (1 = X, 2 = O) and side to move."""
+    index = 0
+    for i in range(TABLEBASE_CELLS - 1, -1, -1):
+        bit = 1 << i
+        index = index * 3 + (1 if x_mask & bit else 2 if o_mask & bit else 0)
+    return index * 2 + (1 if o_to_move else 0)
+
+class Tablebase:
+    """Read-only view of a tablebase file mapped into memory."""
+    def __init__(self, path=TABLEBASE_PATH):
+        with open(path, "rb") as table_file:
+            self._map = mmap.mmap(table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, board_size, section_count = struct.unpack_from(HEADER_FORMAT, self._map, 0)
+        if magic != MAGIC or version != VERSION or board_size != TABLEBASE_BOARD_SIZE:
+            self._map.close()
+            raise ValueError(f"{path} is not a version {VERSION} tablebase for a {TABLEBASE_BOARD_SIZE}x{TABLEBASE_BOARD_SIZE} board")
+        self._sections = {} # twist flags -> data offset
+        record_offset = struct.calcsize(HEADER_FORMAT)
+        for _ in range(section_count):
+            flags, offset, _length = struct.unpack_from(SECTION_FORMAT, self._map, record_offset)
+            self._sections[flags] = offset
+            record_offset += struct.calcsize(SECTION_FORMAT)
+
+    def lookup(self, x_mask, o_mask, levels_evolved, o_to_move, gravity, evolve):
+        """
+        Returns (outcome, move_index) for the side to move, or None if the table cannot answer.
+        `levels_evolved` is the mask of cells with an evolve level above zero; under 'Evolve' the
+        table only covers positions where every mark has evolved, as normal play always produces.
+        """
+        offset = self._sections.get(twist_flags(gravity, evolve))
+        if offset is None or (x_mask | o_mask) >> TABLEBASE_CELLS:
+            return None
+        if evolve and levels_evolved & (x_mask | o_mask) != (x_mask | o_mask):
+            return None
+        entry = self._map[offset + position_index(x_mask, o_mask, o_to_move)]
+        if entry >> 4 == UNSOLVED:
+            return None
+        return entry >> 4, entry & 0x0F
+
+    def close(self):
+        self._map.close()
+
+_shared_tablebase = None
+_shared_tablebase_missing = False
+
+def get_shared_tablebase():
+    """Returns the process-wide Tablebase, mapping the file on first use, or None if it has not been built."""
+    global _shared_tablebase, _shared_tablebase_missing
+    if _shared_tablebase is None and not _shared_tablebase_missing:
+        try:
+            _shared_tablebase = Tablebase()
+        except (OSError, ValueError):
+            _shared_tablebase_missing = True # Don't retry on every bot move
+    return _shared_tablebase
+
+def board_winners(boards):
+    """
+    The side with a completed line on each (x_mask, o_mask) 3x3 board, O checked first as in the
+    search, or None. One BatchEvaluator pass when NumPy is installed, Rules checks otherwise.
+    """
+    from engine import PLAYER_X, PLAYER_O, Rules
+    rules = Rules({}, TABLEBASE_BOARD_SIZE, TABLEBASE_BOARD_SIZE, TABLEBASE_BOARD_SIZE)
+    try:
+        from batch import BatchEvaluator, PositionBatch
+    except ImportError: # NumPy is optional
+        geometry = rules.geometry
+        return [PLAYER_O if geometry.has_winning_line(o_mask, 0, False)
+                else PLAYER_X if geometry.has_winning_line(x_mask, 0, False) else None for x_mask, o_mask in boards]
+    x_wins, o_wins = BatchEvaluator(rules).winners(PositionBatch([x_mask for x_mask, _ in boards],
+                                                                 [o_mask for _, o_mask in boards]))
+    return [PLAYER_O if o_won else PLAYER_X if x_won else None for x_won, o_won in zip(x_wins.tolist(), o_wins.tolist())]
+
+def solve(gravity):
+    """
+    Solves every encodable board position (a superset of the positions reachable through play,
+    undo, abilities and board shifts) for both sides to move. Returns a bytearray of entries.
+    """
+    # The rules are imported here so the runtime lookup path does not import the engine
+    from engine import PLAYER_X, PLAYER_O, WIN_SCORE, get_geometry
+    geometry = get_geometry(TABLEBASE_BOARD_SIZE, TABLEBASE_BOARD_SIZE, TABLEBASE_BOARD_SIZE)
+
+    boards = [] # (x_mask, o_mask) of every base-3 board code, in code order
+    for code in range(3 ** TABLEBASE_CELLS):
+        x_mask = o_mask = 0
+        for i in range(TABLEBASE_CELLS):
+            code, cell = divmod(code, 3)
+            if cell == 1:
+                x_mask |= 1 << i
+            elif cell == 2:
+                o_mask |= 1 << i
+        boards.append((x_mask, o_mask))
+    winners = dict(zip(boards, board_winners(boards)))
+
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    scores = {} # (x_mask, o_mask, o_to_move) -> (score, best move index)
+
+    def negamax(x_mask, o_mask, o_to_move):
+        """Exact score for the side to move, with wins preferred the sooner they happen."""
+        key = (x_mask, o_mask, o_to_move)
+        if key in scores:
+            return scores[key][0]
+        # Same base cases as SmartBotSearch: an O line is checked before an X line
+        winner = winners[x_mask, o_mask]
+        if winner == PLAYER_O:
+            result = (WIN_SCORE if o_to_move else -WIN_SCORE, NO_MOVE)
+        elif winner == PLAYER_X:
+            result = (-WIN_SCORE if o_to_move else WIN_SCORE, NO_MOVE)
+        elif x_mask | o_mask == geometry.full_mask:
+            result = (0, NO_MOVE)
+        else:
+            result = (-WIN_SCORE - 1, NO_MOVE)
+            for bit in geometry.legal_move_bits(x_mask | o_mask, gravity):
+                if o_to_move:
+                    score = -negamax(x_mask, o_mask | bit, False)
+                else:
+                    score = -negamax(x_mask | bit, o_mask, True)
+                score -= (score > 0) - (score < 0) # A win one ply later is worth one point less
+                if score > result[0]:
+                    result = (score, bit.bit_length() - 1)
+        scores[key] = result
+        return result[0]
+
+    table = bytearray([UNSOLVED << 4 | NO_MOVE]) * ENTRY_COUNT
+    for x_mask, o_mask in boards:
+        for o_to_move in (False, True):
+            score = negamax(x_mask, o_mask, o_to_move)
+            outcome = WIN if score > 0 else LOSS if score < 0 else DRAW
+            table[position_index(x_mask, o_mask, o_to_move)] = outcome << 4 | scores[(x_mask, o_mask, o_to_move)][1]
+    return table
+
+def build(path=TABLEBASE_PATH):
+    """
+    Solves each supported twist combination and writes the tablebase file. Under 'Evolve' every
+    mark placed in normal play has level 1, so those combinations share the plain data blocks.
+    """
+    blocks = [solve(gravity=False), solve(gravity=True)]
+    combinations = [(gravity, evolve) for gravity in (False, True) for evolve in (False, True)]
+    data_start = struct.calcsize(HEADER_FORMAT) + len(combinations) * struct.calcsize(SECTION_FORMAT)
+    with open(path, "wb") as table_file:
+        table_file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, TABLEBASE_BOARD_SIZE, len(combinations)))
+        for gravity, evolve in combinations:
+            offset = data_start + (ENTRY_COUNT if gravity else 0)
+            table_file.write(struct.pack(SECTION_FORMAT, twist_flags(gravity, evolve), offset, ENTRY_COUNT))
+        for block in blocks:
+            table_file.write(block)
+
+if __name__ == "__main__":
+    output_path = sys.argv[1] if len(sys.argv) > 1 else TABLEBASE_PATH
+    build(output_path)
+    print(f"Wrote tablebase to {output_path} ({os.path.getsize(output_path)} bytes)")
@@ -0,0 +1,32 @@
+import os
+import time
+
+import pytest
+
+pytest.importorskip("streamlit")
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+def sudden_death_game(tmp_path, monkeypatch):
+    """A friend game under 'Sudden Death' with the shortest turn limit, started in `tmp_path`."""
+    monkeypatch.chdir(tmp_path) # The app writes its records and archive to the working directory
+    at = AppTest.from_file(APP_PATH, default_timeout=30).run()
+    at.checkbox(key="twist_checkbox_Sudden Death Tic-Tac-Toe").check().run()
+    at.slider(key="turn_time_limit_slider").set_value(3).run()
+    at.button(key="start_game_button").click().run()
+    assert not at.exception
+    return at
+
+def test_click_before_the_deadline_is_played(tmp_path, monkeypatch):
+    at = sudden_death_game(tmp_path, monkeypatch)
+    at.button(key="cell_0_0").click().run()
+    assert at.session_state.game_active
+    assert at.session_state.game_message == "Player O's turn."
+
+def test_click_after_the_deadline_loses(tmp_path, monkeypatch):
+    at = sudden_death_game(tmp_path, monkeypatch)
+    time.sleep(3.1)
+    at.button(key="cell_0_0").click().run()
+    assert not at.session_state.game_active
+    assert at.session_state.game_message == "Player X ran out of time! Player O wins!"
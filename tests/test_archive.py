@@ -0,0 +1,60 @@
+from archive import GameArchive, fastest_wins, game_count, open_archive, totals_by_difficulty, totals_by_twists
+from engine import PLAYER_O, PLAYER_X
+from gamerecord import PLACE, GameRecord
+from mcts import DRAW
+
+def finished_game(seed, opponent="smart", result=PLAYER_X, started=1700000000):
+    """A three-turn game against `opponent`, finished with `result`."""
+    record = GameRecord({}, 3, 3, 3, opponent=opponent, seed=seed, started=started)
+    for cell in (0, 4, 8):
+        record.add(PLACE, 1 << cell)
+    record.result = result
+    return record
+
+def write(path, games, finished=None):
+    archive = GameArchive(path, flush_interval=0.01)
+    for record in games:
+        archive.add(record, finished)
+    archive.close()
+    return archive
+
+def test_duplicate_games_are_stored_once(tmp_path):
+    path = str(tmp_path / "games.sqlite3")
+    games = [finished_game(seed) for seed in range(5)]
+    assert write(path, games).written == 5
+    # Importing the same games again, as from a records file the app also archived, adds nothing
+    assert write(path, games + [finished_game(5)], finished=1700000100).written == 1
+    with open_archive(path) as connection:
+        assert game_count(connection) == 6
+        assert connection.execute("SELECT COUNT(*) FROM games").fetchone()[0] == 6
+
+def test_totals_match_the_stored_games(tmp_path):
+    path = str(tmp_path / "games.sqlite3")
+    write(path, [finished_game(0), finished_game(1, result=PLAYER_O), finished_game(2, result=DRAW),
+                 finished_game(3, opponent="friend")])
+    with open_archive(path) as connection:
+        by_difficulty = {row["key"]: row for row in totals_by_difficulty(connection)}
+        assert list(by_difficulty) == ["smart"]
+        smart = by_difficulty["smart"]
+        assert (smart["games"], smart["x_wins"], smart["o_wins"], smart["draws"]) == (3, 1, 1, 1)
+        assert smart["mean_moves"] == 3
+        assert sum(row["games"] for row in totals_by_twists(connection)) == 4
+
+def test_unknown_durations_are_left_out(tmp_path):
+    path = str(tmp_path / "games.sqlite3")
+    write(path, [finished_game(0)]) # Finished now, so its duration is known
+    write(path, [finished_game(1)], finished=1700000050) # Imported: duration unknown
+    with open_archive(path) as connection:
+        assert connection.execute("SELECT COUNT(*) FROM games WHERE duration IS NULL").fetchone()[0] == 1
+        wins = fastest_wins(connection, "smart")
+        assert len(wins) == 1 and wins[0][2] is not None
+        smart = totals_by_difficulty(connection)[0]
+        assert smart["games"] == 2
+        assert smart["mean_duration"] == wins[0][2] # The mean covers only the timed game
+
+def test_mean_duration_is_none_without_timed_games(tmp_path):
+    path = str(tmp_path / "games.sqlite3")
+    write(path, [finished_game(0)], finished=1700000050)
+    with open_archive(path) as connection:
+        assert totals_by_twists(connection)[0]["mean_duration"] is None
+        assert fastest_wins(connection, "smart") == []
@@ -0,0 +1,141 @@
+import random
+
+import pytest
+
+from engine import (
+    PLAYER_O, MoveLog, OpeningBook, ParallelSmartBotSearch, Rules, SmartBotSearch, TranspositionTable, get_search_pool,
+)
+from mcts import play_move
+
+TWISTS = {"Evolve Tic-Tac-Toe": True, "Board Shift Tic-Tac-Toe": True, "Tic-Tac-Toe with Abilities": True}
+
+def logged_game(rules, turns, seed=3):
+    """Plays up to `turns` random moves, logging each; returns the state, log and snapshots taken before every turn."""
+    rng = random.Random(seed)
+    state, log, snapshots = rules.new_state(), MoveLog(), []
+    for _ in range(turns):
+        moves = rules.legal_moves(state)
+        if not moves:
+            break
+        before = state.snapshot()
+        result = play_move(rules, state, rng.choice(moves))
+        log.record(before, state)
+        snapshots.append(before)
+        if result is not None:
+            break
+    return state, log, snapshots
+
+def test_move_log_undo_and_redo_restore_snapshots():
+    rules = Rules(TWISTS, 4, 4, 3)
+    state, log, snapshots = logged_game(rules, 8)
+    final = state.snapshot()
+    assert len(log) == len(snapshots) > 1
+    for before in reversed(snapshots):
+        assert log.undo(rules, state)
+        assert state.snapshot() == before
+    assert not log.undo(rules, state) and log.can_redo()
+    for after in snapshots[1:] + [final]:
+        assert log.redo(rules, state)
+        assert state.snapshot() == after
+    assert not log.redo(rules, state)
+
+def test_move_log_skips_empty_turns_and_clears_redo():
+    rules = Rules(TWISTS)
+    state, log, _ = logged_game(rules, 2)
+    assert log.record(state.snapshot(), state) is None
+    log.undo(rules, state)
+    before = state.snapshot()
+    play_move(rules, state, rules.legal_moves(state)[0])
+    log.record(before, state)
+    assert not log.can_redo()
+
+def test_move_log_limit_drops_oldest_turns():
+    rules = Rules({})
+    state, log, snapshots = rules.new_state(), MoveLog(limit=2), []
+    for bit in rules.legal_moves(state)[:4]:
+        before = state.snapshot()
+        rules.place_mark(state, bit)
+        rules.end_turn(state)
+        log.record(before, state)
+        snapshots.append(before)
+    assert len(log) == 2
+    while log.undo(rules, state):
+        pass
+    assert state.snapshot() == snapshots[2]
+
+def test_move_log_pack_round_trip():
+    rules = Rules(TWISTS, 4, 4, 3)
+    state, log, snapshots = logged_game(rules, 8)
+    log.undo(rules, state)
+    log.undo(rules, state)
+    unpacked = MoveLog.unpack(rules, log.pack(rules))
+    assert (len(unpacked), unpacked.can_redo()) == (len(log), True)
+    assert unpacked.pack(rules) == log.pack(rules)
+    copy = state.copy()
+    while unpacked.undo(rules, copy):
+        pass
+    assert copy.snapshot() == snapshots[0]
+
+def opening(rules, *cells):
+    """The position after X, O, X... have played `cells` ((row, col) pairs) in turn."""
+    state = rules.new_state()
+    for r, c in cells:
+        rules.place_mark(state, rules.geometry.cell_bit(r, c))
+        rules.end_turn(state)
+    return state
+
+def test_opening_book_shares_moves_between_symmetric_positions():
+    rules = Rules({}, 4, 4, 3)
+    book = OpeningBook()
+    cell = rules.geometry.cell_bit
+    book.store(rules, opening(rules, (0, 0)), cell(1, 1), 100)
+    assert book.lookup(rules, opening(rules, (0, 0)), 100) == cell(1, 1)
+    assert book.lookup(rules, opening(rules, (0, 3)), 100) == cell(1, 2) # Mirrored
+    assert book.lookup(rules, opening(rules, (3, 3)), 50) == cell(2, 2) # Rotated, searched for less time
+    assert book.lookup(rules, opening(rules, (0, 0)), 200) == 0 # Searched with too small a budget
+    assert book.lookup(Rules({"Gravity Tic-Tac-Toe": True}, 4, 4, 3), opening(rules, (0, 0)), 100) == 0
+
+def test_opening_book_keeps_only_openings_and_evicts_least_recent():
+    rules = Rules({}, 4, 4, 3)
+    book = OpeningBook(max_entries=2, max_filled=1)
+    cell = rules.geometry.cell_bit
+    book.store(rules, opening(rules, (0, 0), (1, 1)), cell(2, 2), 100) # Past the opening
+    assert book.stats()["entries"] == 0
+    book.store(rules, opening(rules), cell(1, 1), 100)
+    book.store(rules, opening(rules, (0, 0)), cell(1, 1), 100)
+    book.lookup(rules, opening(rules), 100)
+    book.store(rules, opening(rules, (0, 1)), cell(1, 1), 100)
+    assert book.stats()["evictions"] == 1
+    assert book.lookup(rules, opening(rules), 100) == cell(1, 1)
+    assert book.lookup(rules, opening(rules, (0, 0)), 100) == 0
+
+def test_opening_book_save_and_load(tmp_path):
+    rules = Rules({"Evolve Tic-Tac-Toe": True}, 4, 4, 3)
+    path = str(tmp_path / "book.jsonl")
+    book = OpeningBook(path=path, save_every=2)
+    cell = rules.geometry.cell_bit
+    book.store(rules, opening(rules), cell(1, 1), 100)
+    book.store(rules, opening(rules, (1, 1)), cell(2, 2), 100) # Second new entry: saved
+    loaded = OpeningBook(path=path)
+    loaded.load()
+    assert loaded.stats()["entries"] == 2
+    assert loaded.lookup(rules, opening(rules, (1, 1)), 100) == cell(2, 2)
+    OpeningBook(path=str(tmp_path / "missing.jsonl")).load() # A missing file is ignored
+
+@pytest.fixture(scope="module")
+def search_pool():
+    pool = get_search_pool(workers=2)
+    if pool is None:
+        pytest.skip("the parallel search pool cannot run here")
+    return pool
+
+@pytest.mark.parametrize("cells", [(), ((1, 1),), ((0, 0), (1, 1), (0, 1)), ((1, 1), (2, 2), (1, 2), (0, 0))])
+def test_parallel_search_matches_serial_search(search_pool, cells):
+    rules = Rules({}, 4, 4, 3)
+    state = opening(rules, *cells)
+    position = (state.x_mask, state.o_mask, state.levels, state.current_player == PLAYER_O)
+    # Depth-capped with a generous budget, so both searches complete the same iterations
+    serial = SmartBotSearch(rules, TranspositionTable(), 60000, max_depth=3).best_move(*position)
+    moves = [ParallelSmartBotSearch(rules, TranspositionTable(), 60000, max_depth=3, pool=search_pool).best_move(*position)
+             for _ in range(2)]
+    assert moves == [serial, serial]
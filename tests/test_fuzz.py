@@ -0,0 +1,25 @@
+import random
+
+from fuzz import fuzz_batch, run_sequence, twist_flags
+from engine import TWIST_NAMES, Rules
+from gamerecord import GameRecord
+from simulate import twist_combinations
+
+def test_short_seeded_fuzz_run_finds_no_failures():
+    combinations = list(twist_combinations())
+    for index, twists in enumerate(combinations[::16] + [tuple(TWIST_NAMES)]):
+        count, actions, failure_counts, failures = fuzz_batch((twists, (3, 3, 3), f"test:{index}", 15, 40, 0.2, 6))
+        assert count == 15 and actions > 0
+        assert failure_counts == {} and failures == [], failures
+
+def test_fuzz_batches_are_reproducible():
+    task = (tuple(TWIST_NAMES), (4, 4, 3), "repeat", 10, 30, 0.0, 6)
+    assert fuzz_batch(task) == fuzz_batch(task)
+
+def test_replayed_sequence_passes_the_checks():
+    flags = twist_flags(tuple(TWIST_NAMES))
+    record = GameRecord(flags, 3, 3, 3, seed=99, started=0)
+    played, failure = run_sequence(Rules(flags, 3, 3, 3), record, random.Random(5), 30)
+    assert failure is None and played == record.turn_count()
+    replay = GameRecord.from_bytes(record.to_bytes())
+    assert run_sequence(replay.rules(), replay, max_turns=30) == (played, None)
@@ -0,0 +1,53 @@
+import json
+import threading
+
+from metrics import NO_TIMING, Metrics, SessionMetrics, timed
+
+THREADS = 8
+RERUNS_PER_THREAD = 200
+
+def test_concurrent_flushes_write_one_complete_file(tmp_path):
+    path = tmp_path / "metrics.json"
+    metrics = Metrics(str(path), flush_interval=0) # Every maybe_flush finds a write due
+    errors = []
+
+    def rerun():
+        try:
+            for _ in range(RERUNS_PER_THREAD):
+                metrics.add_rerun()
+                metrics.maybe_flush()
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=rerun) for _ in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    metrics.flush()
+    assert errors == []
+    assert json.loads(path.read_text())["reruns"] == THREADS * RERUNS_PER_THREAD
+    assert [file.name for file in tmp_path.iterdir()] == ["metrics.json"] # No temporary file left behind
+
+def test_maybe_flush_waits_for_the_interval(tmp_path):
+    path = tmp_path / "metrics.json"
+    metrics = Metrics(str(path), flush_interval=3600)
+    metrics.maybe_flush()
+    assert not path.exists()
+    metrics.flush()
+    assert path.exists()
+
+def test_timed_records_into_both_aggregates():
+    session, metrics = SessionMetrics(), Metrics()
+    with timed("render_board", session, metrics):
+        pass
+    assert session.phases["render_board"].count == 1 and metrics.phases["render_board"].count == 1
+    assert timed("render_board", None, None) is NO_TIMING
+
+def test_search_totals():
+    metrics = Metrics()
+    metrics.add_search({"source": "search", "nodes": 100, "seconds": 0.5, "cache_hits": 3, "cache_misses": 1, "depth": 4})
+    metrics.add_search({"source": "tablebase"})
+    search = metrics.summary()["search"]
+    assert search["count"] == 2 and search["nodes_per_s"] == 200 and search["cache_hit_rate"] == 0.75
+    assert search["sources"] == {"search": 1, "tablebase": 1} and search["max_depth"] == 4
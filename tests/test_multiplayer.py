@@ -0,0 +1,51 @@
+import threading
+
+from engine import PLAYER_X, PLAYER_O, MoveLog, Rules
+from multiplayer import GAME_EXPIRED_MESSAGE, GameStore
+
+def new_game(store, session_id="host"):
+    rules = Rules({})
+    return store.create(session_id, {}, rules, rules.new_state(), MoveLog(16))
+
+def test_join_takes_the_free_seat_once():
+    store = GameStore()
+    game = new_game(store)
+    assert store.join(game.code.lower(), "guest") == (game, PLAYER_O)
+    assert store.join(game.code, "guest") == (game, PLAYER_O) # Rejoining keeps the seat
+    assert store.join(game.code, "stranger") == (None, None) # Full
+    assert store.join("NOSUCH", "guest") == (None, None)
+    assert game.players == {PLAYER_X: "host", PLAYER_O: "guest"}
+
+def test_leave_frees_the_seat_and_removes_empty_games():
+    store = GameStore()
+    game = new_game(store)
+    store.join(game.code, "guest")
+    version = game.version
+    store.leave(game.code, "guest")
+    assert game.players[PLAYER_O] is None and game.version > version
+    assert store.join(game.code, "other") == (game, PLAYER_O)
+    store.leave(game.code, "other")
+    store.leave(game.code, "host")
+    assert store.get(game.code) is None and len(store) == 0
+
+def test_evict_idle_ends_and_removes_only_idle_games():
+    store = GameStore(idle_timeout=60)
+    idle, busy = new_game(store), new_game(store, "other host")
+    now = idle.last_activity + 61
+    busy.last_activity = now
+    assert store.evict_idle(now=now) == 1
+    assert store.get(idle.code) is None and store.get(busy.code) is busy
+    assert not idle.active and idle.message == GAME_EXPIRED_MESSAGE
+    assert busy.active and store.evictions == 1
+
+def test_concurrent_joins_seat_one_player():
+    store = GameStore()
+    game = new_game(store)
+    results = []
+    threads = [threading.Thread(target=lambda index=index: results.append(store.join(game.code, f"guest{index}")))
+               for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sum(1 for joined, _ in results if joined is not None) == 1
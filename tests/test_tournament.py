@@ -0,0 +1,39 @@
+import math
+
+import pytest
+
+from tournament import ELO_PRIOR_DRAWS, BotConfig, fit_elo
+
+def test_identical_records_get_equal_ratings():
+    configs = ["a", "b", "c"]
+    # a and b each beat c 6-2 and draw each other
+    ratings = fit_elo(configs, {("a", "b"): (4.0, 8), ("a", "c"): (6.0, 8), ("b", "c"): (6.0, 8)})
+    assert ratings["a"] == 0.0
+    assert ratings["b"] == pytest.approx(ratings["a"], abs=1e-6)
+    assert ratings["c"] < ratings["a"]
+
+def test_all_wins_give_a_finite_rating_with_the_prior_gap():
+    games = 10
+    ratings = fit_elo(["weak", "strong"], {("weak", "strong"): (0.0, games)})
+    # With the virtual draws, strong scored games + prior/2 of games + prior
+    strong_score = games + ELO_PRIOR_DRAWS / 2
+    expected = 400 * math.log10(strong_score / (ELO_PRIOR_DRAWS / 2))
+    assert math.isfinite(ratings["strong"])
+    assert ratings["strong"] == pytest.approx(expected, rel=1e-6)
+
+def test_bot_config_specs():
+    assert BotConfig("smart@d3").max_depth == 3
+    assert BotConfig("smart@100ms").time_budget_ms == 100
+    assert BotConfig("mcts@500").iterations == 500
+    with pytest.raises(ValueError):
+        BotConfig("smart@fast")
+
+def test_prior_counts_as_one_real_draw_per_pair(monkeypatch):
+    configs = ["a", "b", "c"]
+    scores = {("a", "b"): (7.0, 8), ("a", "c"): (3.0, 4), ("b", "c"): (1.0, 6)}
+    with_prior = fit_elo(configs, scores)
+    monkeypatch.setattr("tournament.ELO_PRIOR_DRAWS", 0)
+    with_draws = fit_elo(configs, {pair: (score + ELO_PRIOR_DRAWS / 2, played + ELO_PRIOR_DRAWS)
+                                   for pair, (score, played) in scores.items()})
+    for config in configs:
+        assert with_prior[config] == pytest.approx(with_draws[config], abs=1e-6)
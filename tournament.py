@@ -0,0 +1,235 @@
+"""
+Round-robin bot tournament with strength-versus-cost reports.
+
+Every pair of bot configurations plays under every twist combination, each side taking X (who
+always moves first) in turn, across a process pool. The report rates each configuration by Elo
+(fitted to all results at once, relative to the first configuration) next to its score, mean
+and p99 move latency and nodes searched per move, and names the cheapest configuration that
+reaches a target rating:
+
+    python tournament.py --configs basic,smart@d2,smart@d4,smart,mcts@200 --target-elo 200
+
+Configurations are a bot name with an optional setting after '@': a depth cap ("smart@d3"), a
+time budget ("smart@100ms", "mcts@50ms") or an MCTS iteration count ("mcts@500"). Depth caps
+and iteration counts make moves independent of machine speed.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from engine import (
+    PLAYER_X, PLAYER_O, TWIST_NAMES, BOARD_SIZE,
+    Rules, TranspositionTable, choose_basic_move, choose_smart_move,
+)
+from bench import percentile
+from mcts import MCTSBot, play_move
+from simulate import DEFAULT_SMART_BUDGET_MS, DEFAULT_MAX_TURNS, twist_combinations
+
+DEFAULT_CONFIGS = ("basic", "smart@d2", "smart@d4", "smart", "mcts@200")
+DEFAULT_DEPTH_CAP_BUDGET_MS = 60000 # Budget given to depth-capped searches, so the cap is what stops them
+ELO_PRIOR_DRAWS = 1 # Virtual draws against every opponent, keeping ratings finite for all-win or all-loss records
+ELO_ITERATIONS = 200
+
+class BotConfig:
+    """A bot and its setting, parsed from a spec such as "smart@d4", "smart@100ms" or "mcts@500"."""
+    __slots__ = ("spec", "kind", "max_depth", "time_budget_ms", "iterations")
+
+    def __init__(self, spec, default_budget_ms=DEFAULT_SMART_BUDGET_MS):
+        self.spec = spec
+        self.kind, _, setting = spec.partition("@")
+        self.max_depth = self.iterations = None
+        self.time_budget_ms = default_budget_ms
+        if self.kind not in ("basic", "smart", "mcts"):
+            raise ValueError(f"unknown bot {self.kind!r}")
+        if not setting:
+            return
+        if setting.endswith("ms") and setting[:-2].isdigit():
+            self.time_budget_ms = int(setting[:-2])
+        elif self.kind == "smart" and setting.startswith("d") and setting[1:].isdigit():
+            self.max_depth = int(setting[1:])
+            self.time_budget_ms = DEFAULT_DEPTH_CAP_BUDGET_MS
+        elif self.kind == "mcts" and setting.isdigit():
+            self.iterations = int(setting)
+            self.time_budget_ms = None
+        else:
+            raise ValueError(f"unknown setting {setting!r} for bot {self.kind!r}")
+
+    def player(self, rng):
+        """Returns a move function (rules, state) -> (bit, nodes searched) with its own caches, as in one session."""
+        if self.kind == "basic":
+            return lambda rules, state: (choose_basic_move(rules, state, rng), 0)
+        if self.kind == "mcts":
+            bot = MCTSBot(self.time_budget_ms, self.iterations, rng=rng)
+            return lambda rules, state: (bot.best_move(rules, state), bot.iterations)
+        table = TranspositionTable()
+
+        def smart_move(rules, state):
+            stats = {}
+            bit = choose_smart_move(rules, state, table, self.time_budget_ms, self.max_depth, stats=stats)
+            return bit, stats.get("nodes", 0)
+        return smart_move
+
+def play_game(task):
+    """
+    Pool worker: plays one game between two configurations in the app's turn order and returns
+    the result with each side's move latencies (ms) and nodes searched.
+    """
+    x_spec, o_spec, twists, board, seed, default_budget_ms, max_turns = task
+    rng = random.Random(seed)
+    rules = Rules({twist_name: twist_name in twists for twist_name in TWIST_NAMES}, *board)
+    state = rules.new_state()
+    players = {PLAYER_X: BotConfig(x_spec, default_budget_ms).player(rng),
+               PLAYER_O: BotConfig(o_spec, default_budget_ms).player(rng)}
+    latencies = {PLAYER_X: [], PLAYER_O: []}
+    nodes = {PLAYER_X: 0, PLAYER_O: 0}
+    outcome = None
+    for _ in range(max_turns):
+        player = state.current_player
+        start = time.perf_counter()
+        bit, searched = players[player](rules, state)
+        latencies[player].append((time.perf_counter() - start) * 1000)
+        nodes[player] += searched
+        if not bit:
+            break # No legal move: scored as a draw, like a game cut off by the turn limit
+        outcome = play_move(rules, state, bit)
+        if outcome is not None:
+            break
+    return {"x": x_spec, "o": o_spec, "twists": list(twists), "seed": seed,
+            "winner": outcome if outcome in (PLAYER_X, PLAYER_O) else None,
+            "x_ms": latencies[PLAYER_X], "o_ms": latencies[PLAYER_O], "x_nodes": nodes[PLAYER_X], "o_nodes": nodes[PLAYER_O]}
+
+def schedule(configs, combinations, games, board, seed, default_budget_ms, max_turns):
+    """Yields a task for every pairing, twist combination and game, each configuration taking X in every other game."""
+    for first_index, first in enumerate(configs):
+        for second in configs[first_index + 1:]:
+            for twists in combinations:
+                for game_index in range(games):
+                    x_spec, o_spec = (first, second) if game_index % 2 == 0 else (second, first)
+                    game_seed = f"{seed}:{first}:{second}:{'+'.join(twists)}:{game_index}"
+                    yield x_spec, o_spec, twists, board, game_seed, default_budget_ms, max_turns
+
+def fit_elo(configs, pair_scores):
+    """
+    Fits Bradley-Terry strengths to the results (draws count half) by minorization-maximization
+    and returns Elo ratings relative to the first configuration. `pair_scores` maps (a, b) to
+    (a's score, games played).
+    """
+    wins = {config: 0.0 for config in configs}
+    games = {}
+    for (a, b), (score, played) in pair_scores.items():
+        wins[a] += score
+        wins[b] += played - score
+        games[a, b] = games[b, a] = games.get((a, b), 0) + played
+    # Virtual draws against every opponent keep every strength above zero: each is one more game
+    # between the pair (counted in both games[a, b] and games[b, a]) and half a point for each side
+    for a in configs:
+        for b in configs:
+            if a != b:
+                wins[a] += ELO_PRIOR_DRAWS / 2
+                games[a, b] = games.get((a, b), 0) + ELO_PRIOR_DRAWS
+    strength = {config: 1.0 for config in configs}
+    for _ in range(ELO_ITERATIONS):
+        strength = {a: wins[a] / sum(games[a, b] / (strength[a] + strength[b]) for b in configs if b != a)
+                    for a in configs}
+    base = strength[configs[0]]
+    return {config: 400 * math.log10(strength[config] / base) for config in configs}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Round-robin tournament between bot configurations.")
+    parser.add_argument("--configs", default=",".join(DEFAULT_CONFIGS),
+                        help="comma-separated bot configurations (bot[@dN|@Nms|@N]); ratings are relative to the first")
+    parser.add_argument("--games", type=int, default=2,
+                        help="games per pairing and twist combination (each side takes X in every other game)")
+    parser.add_argument("--twists", default=None,
+                        help="only this comma-separated twist combination (default: all 128 combinations)")
+    parser.add_argument("--rows", type=int, default=BOARD_SIZE)
+    parser.add_argument("--cols", type=int, default=BOARD_SIZE)
+    parser.add_argument("--win-length", type=int, default=BOARD_SIZE)
+    parser.add_argument("--budget-ms", type=int, default=DEFAULT_SMART_BUDGET_MS,
+                        help="time budget of configurations without their own setting")
+    parser.add_argument("--max-turns", type=int, default=DEFAULT_MAX_TURNS)
+    parser.add_argument("--seed", default="0")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--target-elo", type=float, default=None,
+                        help="report the cheapest configuration (by mean move latency) rated at least this")
+    parser.add_argument("--output", default=None, help="write the report as JSON to this file")
+    args = parser.parse_args(argv)
+
+    configs = [spec.strip() for spec in args.configs.split(",") if spec.strip()]
+    for spec in configs:
+        try:
+            BotConfig(spec)
+        except ValueError as error:
+            parser.error(str(error))
+    if len(configs) < 2:
+        parser.error("a tournament needs at least two configurations")
+    if args.twists is None:
+        combinations = list(twist_combinations())
+    else:
+        twists = [twist.strip() for twist in args.twists.split(",") if twist.strip()]
+        unknown = [twist for twist in twists if twist not in TWIST_NAMES]
+        if unknown:
+            parser.error(f"unknown twist(s): {', '.join(unknown)}")
+        combinations = [tuple(twist for twist in TWIST_NAMES if twist in twists)]
+
+    pair_scores = {} # (config, config) -> (first's score, games)
+    totals = {config: {"wins": 0, "draws": 0, "losses": 0, "latencies": [], "nodes": 0} for config in configs}
+    start = time.perf_counter()
+    tasks = schedule(configs, combinations, args.games, (args.rows, args.cols, args.win_length), args.seed,
+                     args.budget_ms, args.max_turns)
+    with Pool(args.workers) as pool:
+        for game in pool.imap_unordered(play_game, tasks, chunksize=8):
+            for side, player in (("x", PLAYER_X), ("o", PLAYER_O)):
+                row = totals[game[side]]
+                row["latencies"].extend(game[f"{side}_ms"])
+                row["nodes"] += game[f"{side}_nodes"]
+                if game["winner"] is None:
+                    row["draws"] += 1
+                elif game["winner"] == player:
+                    row["wins"] += 1
+                else:
+                    row["losses"] += 1
+            first, second = sorted((game["x"], game["o"]), key=configs.index)
+            x_score = 1.0 if game["winner"] == PLAYER_X else 0.5 if game["winner"] is None else 0.0
+            first_score = x_score if game["x"] == first else 1.0 - x_score
+            score, played = pair_scores.get((first, second), (0.0, 0))
+            pair_scores[first, second] = (score + first_score, played + 1)
+
+    ratings = fit_elo(configs, pair_scores)
+    report = []
+    for config in configs:
+        row = totals[config]
+        games = row["wins"] + row["draws"] + row["losses"]
+        moves = len(row["latencies"])
+        report.append({
+            "config": config, "elo": round(ratings[config], 1), "games": games,
+            "wins": row["wins"], "draws": row["draws"], "losses": row["losses"],
+            "score": round((row["wins"] + row["draws"] / 2) / games, 4) if games else None,
+            "mean_ms": round(sum(row["latencies"]) / moves, 3) if moves else 0.0,
+            "p99_ms": round(percentile(row["latencies"], 0.99), 3) if moves else 0.0,
+            "nodes_per_move": round(row["nodes"] / moves, 1) if moves else 0.0,
+        })
+    report.sort(key=lambda entry: -entry["elo"])
+
+    print(f"{'config':<14} {'Elo':>7} {'score':>6} {'W':>6} {'D':>6} {'L':>6} {'mean ms':>8} {'p99 ms':>8} {'nodes/move':>11}")
+    for entry in report:
+        print(f"{entry['config']:<14} {entry['elo']:>7.0f} {entry['score']:>6.1%} {entry['wins']:>6} {entry['draws']:>6} "
+              f"{entry['losses']:>6} {entry['mean_ms']:>8.2f} {entry['p99_ms']:>8.2f} {entry['nodes_per_move']:>11.1f}")
+    print(f"{sum(played for _, played in pair_scores.values())} games in {time.perf_counter() - start:.1f}s")
+    cheapest = None
+    if args.target_elo is not None:
+        qualified = [entry for entry in report if entry["elo"] >= args.target_elo]
+        cheapest = min(qualified, key=lambda entry: entry["mean_ms"])["config"] if qualified else None
+        print(f"Cheapest configuration rated {args.target_elo:.0f}+: {cheapest or 'none'}")
+    if args.output:
+        with open(args.output, "w") as report_file:
+            json.dump({"configs": configs, "board": [args.rows, args.cols, args.win_length], "games": args.games,
+                       "seed": args.seed, "target_elo": args.target_elo, "cheapest": cheapest, "results": report},
+                      report_file, indent=1)
+
+if __name__ == "__main__":
+    main()